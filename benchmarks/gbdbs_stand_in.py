@@ -0,0 +1,363 @@
+"""Synthetic GBDBS stand-in server for plot owner benchmarks.
+
+Serves generated GetParcelsByIdResponse documents for a configurable
+ownership scenario:
+
+* alleineigentum: plot in Alleineigentum, with <size> additional
+  unrelated Grundstuecke in the response
+* gemeinschaft: plot in Gesamteigentum of a Gemeinschaft with <size>
+  Mitglieder on each of <depth> nested levels
+* stockwerkeigentum: plot with <size> StockwerksEinheiten, each requested
+  separately
+* miteigentum: plot in Miteigentum of <size> GewoehnlichesMiteigentum
+  Grundstuecke, which are in turn owned by Personen or Liegenschaften
+
+Usage:
+
+    python benchmarks/gbdbs_stand_in.py --scenario stockwerkeigentum \\
+        --size 100 --port 8089
+
+The EGRID of the plot is BASE_EGRID.
+"""
+
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import re
+from threading import Lock, Thread
+import time
+import uuid
+
+
+SCENARIOS = ['alleineigentum', 'gemeinschaft', 'stockwerkeigentum',
+             'miteigentum']
+
+# EGRID of plot
+BASE_EGRID = 'CH100000000000'
+
+# BFS number of all Grundstuecke
+BFSNR = '2407'
+
+GBDBS_NS = 'http://schemas.geo.admin.ch/BJ/TGBV/GBDBS/2.1'
+
+RESPONSE_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<soapenv:Envelope
+    xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"
+    xmlns:ns="%s">
+<soapenv:Body>
+<ns:GetParcelsByIdResponse>
+<ns:transactionId>%s</ns:transactionId>
+%s
+</ns:GetParcelsByIdResponse>
+</soapenv:Body>
+</soapenv:Envelope>
+"""
+
+ID_RE = re.compile(r'<ns:Id>([^:<]*)[^<]*</ns:Id>')
+
+
+def sub_egrid(index):
+    """Return EGRID of generated sub Grundstueck.
+
+    :param int index: Index of sub Grundstueck
+    """
+    return 'CH2%011d' % index
+
+
+def grundstueck_nummer(egrid, nummer, nummer_zusatz=''):
+    """Return GBDBS Nummer of Grundstueck.
+
+    :param str egrid: EGRID
+    :param int nummer: Grundstueck number
+    :param str nummer_zusatz: Optional number suffix
+    """
+    return '%s:%s:%s:%s:' % (egrid, nummer, nummer_zusatz, BFSNR)
+
+
+def grundstueck(nummer, art, beschreibung=None):
+    """Return Grundstueck record.
+
+    :param str nummer: GBDBS Nummer
+    :param str art: Type of Grundstueck
+    :param str beschreibung: Optional Beschreibung of StockwerksEinheit
+    """
+    xml = (
+        '<ns:Grundstueck><ns:%s><ns:Nummer>%s</ns:Nummer>'
+        '<ns:municipalityName>Solothurn</ns:municipalityName>'
+    ) % (art, nummer)
+    if beschreibung is not None:
+        xml += '<ns:Beschreibung>%s</ns:Beschreibung>' % beschreibung
+    return xml + '</ns:%s></ns:Grundstueck>' % art
+
+
+def person(nummer, index):
+    """Return Person record of a natural person with address.
+
+    :param str nummer: GBDBS Nummer
+    :param int index: Index for generated names
+    """
+    return (
+        '<ns:Person><ns:NatuerlichePersonGB>'
+        '<ns:Nummer>%s</ns:Nummer>'
+        '<ns:InhaltNatuerlichePersonGB>'
+        '<ns:Name>Muster %d</ns:Name><ns:Vornamen>Vorname %d</ns:Vornamen>'
+        '<ns:Adresse><ns:Adresse>'
+        '<ns:Strasse>Hauptstrasse</ns:Strasse>'
+        '<ns:Hausnummer>%d</ns:Hausnummer>'
+        '<ns:PLZ>4500</ns:PLZ><ns:Ort>Solothurn</ns:Ort>'
+        '<ns:Land>Schweiz</ns:Land>'
+        '</ns:Adresse></ns:Adresse>'
+        '</ns:InhaltNatuerlichePersonGB>'
+        '</ns:NatuerlichePersonGB></ns:Person>'
+    ) % (nummer, index, index, index)
+
+
+def gemeinschaft(nummer, name, mitglieder):
+    """Return Person record of a Gemeinschaft.
+
+    :param str nummer: GBDBS Nummer
+    :param str name: Name of Gemeinschaft
+    :param list[str] mitglieder: GBDBS Nummern of Mitglieder
+    """
+    return (
+        '<ns:Person><ns:Gemeinschaft>'
+        '<ns:Nummer>%s</ns:Nummer><ns:Name>%s</ns:Name>'
+        '<ns:Art>Erbengemeinschaft</ns:Art>%s'
+        '</ns:Gemeinschaft></ns:Person>'
+    ) % (nummer, name, ''.join([
+        '<ns:Mitglieder><ns:ref>%s</ns:ref></ns:Mitglieder>' % mitglied
+        for mitglied in mitglieder
+    ]))
+
+
+def recht(nummer, belastet, berechtigte, eigentumsform,
+          zaehler=1, nenner=1):
+    """Return Recht record for EigentumAnteil.
+
+    :param str nummer: GBDBS Nummer
+    :param str belastet: GBDBS Nummer of belastetes Grundstueck
+    :param str berechtigte: GBDBS Nummer of Berechtigte
+    :param str eigentumsform: Eigentumsform
+    :param int zaehler: Numerator of Anteil
+    :param int nenner: Denominator of Anteil
+    """
+    return (
+        '<ns:Recht><ns:EigentumAnteil>'
+        '<ns:Nummer>%s</ns:Nummer>'
+        '<ns:belastetesGrundstueck>%s</ns:belastetesGrundstueck>'
+        '<ns:InhaltEigentumAnteil>'
+        '<ns:Eigentumsform>%s</ns:Eigentumsform>'
+        '<ns:AnteilZaehler>%d</ns:AnteilZaehler>'
+        '<ns:AnteilNenner>%d</ns:AnteilNenner>'
+        '</ns:InhaltEigentumAnteil>'
+        '<ns:Berechtigte>%s</ns:Berechtigte>'
+        '</ns:EigentumAnteil></ns:Recht>'
+    ) % (nummer, belastet, eigentumsform, zaehler, nenner, berechtigte)
+
+
+def base_records(scenario, size, depth):
+    """Return records of plot with BASE_EGRID for scenario.
+
+    :param str scenario: Ownership scenario
+    :param int size: Scenario size
+    :param int depth: Nesting depth of Gemeinschaften
+    """
+    base = grundstueck_nummer(BASE_EGRID, 1000)
+    records = [grundstueck(base, 'Liegenschaft')]
+
+    if scenario == 'alleineigentum':
+        records.append(person('P0', 0))
+        records.append(recht('R0', base, 'P0', 'AlleinEigentum'))
+        for i in range(1, size + 1):
+            # unrelated Grundstuecke in same response
+            nummer = grundstueck_nummer(sub_egrid(i), 1000 + i)
+            records.append(grundstueck(nummer, 'Liegenschaft'))
+            records.append(person('P%d' % i, i))
+            records.append(recht('R%d' % i, nummer, 'P%d' % i,
+                                 'AlleinEigentum'))
+    elif scenario == 'gemeinschaft':
+        index = 0
+        for level in range(depth):
+            mitglieder = []
+            for i in range(size):
+                index += 1
+                mitglieder.append('P%d' % index)
+                records.append(person('P%d' % index, index))
+            if level < depth - 1:
+                # nested Gemeinschaft
+                mitglieder.append('G%d' % (level + 1))
+            records.append(gemeinschaft(
+                'G%d' % level, 'Erben Muster %d' % level, mitglieder
+            ))
+        records.append(recht('R0', base, 'G0', 'GesamtEigentum'))
+    elif scenario == 'stockwerkeigentum':
+        for i in range(1, size + 1):
+            nummer = grundstueck_nummer(sub_egrid(i), 1000, str(i))
+            records.append(grundstueck(
+                nummer, 'StockwerksEinheit', 'Wohnung %d' % i
+            ))
+            records.append(recht('R%d' % i, base, nummer, 'MitEigentum',
+                                 1, size))
+    elif scenario == 'miteigentum':
+        for i in range(1, size + 1):
+            nummer = grundstueck_nummer(sub_egrid(i), 1000 + i)
+            records.append(grundstueck(nummer, 'GewoehnlichesMiteigentum'))
+            records.append(recht('R%d' % i, base, nummer, 'MitEigentum',
+                                 1, size))
+
+    return records
+
+
+def sub_records(scenario, index):
+    """Return records of generated sub Grundstueck for scenario.
+
+    :param str scenario: Ownership scenario
+    :param int index: Index of sub Grundstueck
+    """
+    egrid = sub_egrid(index)
+    if scenario == 'stockwerkeigentum':
+        nummer = grundstueck_nummer(egrid, 1000, str(index))
+        records = [grundstueck(nummer, 'StockwerksEinheit',
+                               'Wohnung %d' % index)]
+    else:
+        nummer = grundstueck_nummer(egrid, 1000 + index)
+        records = [grundstueck(nummer, 'GewoehnlichesMiteigentum')]
+
+    if scenario == 'miteigentum' and index % 2 == 0:
+        # owned by a Liegenschaft
+        owner = grundstueck_nummer('CH3%011d' % index, 5000 + index)
+        records.append(grundstueck(owner, 'Liegenschaft'))
+    else:
+        owner = 'P%d' % index
+        records.append(person(owner, index))
+    records.append(recht('R%d' % index, nummer, owner, 'AlleinEigentum'))
+
+    return records
+
+
+def response_xml(scenario, egrids, size, depth):
+    """Return GetParcelsByIdResponse XML for requested EGRIDs.
+
+    The records are preceded by a non-record transactionId element.
+
+    :param str scenario: Ownership scenario
+    :param list[str] egrids: Requested EGRIDs
+    :param int size: Scenario size
+    :param int depth: Nesting depth of Gemeinschaften
+    """
+    records = []
+    for egrid in egrids:
+        if egrid == BASE_EGRID:
+            records += base_records(scenario, size, depth)
+        elif egrid.startswith('CH2'):
+            records += sub_records(scenario, int(egrid[3:]))
+
+    return RESPONSE_TEMPLATE % (
+        GBDBS_NS, uuid.uuid4(), '\n'.join(records)
+    )
+
+
+class GbdbsStandIn:
+    """GbdbsStandIn class
+
+    Local HTTP server answering GetParcelsByIdRequests with generated
+    responses, which counts the received requests and requested EGRIDs.
+    """
+
+    def __init__(self, scenario, size, depth=1, latency=0, port=0):
+        """Constructor
+
+        :param str scenario: Ownership scenario
+        :param int size: Scenario size
+        :param int depth: Nesting depth of Gemeinschaften
+        :param float latency: Delay in seconds for each response
+        :param int port: Server port (0 for any free port)
+        """
+        self.scenario = scenario
+        self.size = size
+        self.depth = depth
+        self.latency = latency
+        self.lock = Lock()
+        self.requests = 0
+        self.ids = 0
+
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                egrids = ID_RE.findall(
+                    self.rfile.read(length).decode('utf-8')
+                )
+                stand_in.count(egrids)
+                if stand_in.latency > 0:
+                    time.sleep(stand_in.latency)
+
+                body = response_xml(
+                    stand_in.scenario, egrids, stand_in.size,
+                    stand_in.depth
+                ).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/xml; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        """Return GBDBS service URL of stand-in server."""
+        return 'http://127.0.0.1:%d/gbdbs' % self.server.server_port
+
+    def count(self, egrids):
+        """Count request for EGRIDs.
+
+        :param list[str] egrids: Requested EGRIDs
+        """
+        with self.lock:
+            self.requests += 1
+            self.ids += len(egrids)
+
+    def reset(self):
+        """Reset request counters."""
+        with self.lock:
+            self.requests = 0
+            self.ids = 0
+
+    def start(self):
+        """Serve requests in a background thread."""
+        Thread(
+            target=self.server.serve_forever, name='gbdbs_stand_in',
+            daemon=True
+        ).start()
+
+    def stop(self):
+        """Stop server."""
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scenario', choices=SCENARIOS,
+                        default='alleineigentum')
+    parser.add_argument('--size', type=int, default=10)
+    parser.add_argument('--depth', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--port', type=int, default=8089)
+    args = parser.parse_args()
+
+    stand_in = GbdbsStandIn(
+        args.scenario, args.size, args.depth, args.latency, args.port
+    )
+    print("GBDBS stand-in for %s at %s (EGRID %s)" % (
+        args.scenario, stand_in.url, BASE_EGRID
+    ))
+    try:
+        stand_in.server.serve_forever()
+    except KeyboardInterrupt:
+        stand_in.server.server_close()
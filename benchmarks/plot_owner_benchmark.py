@@ -0,0 +1,162 @@
+"""Benchmarks for plot owner info queries against a GBDBS stand-in.
+
+Measures wall time, peak memory (tracemalloc) and GBDBS calls for parsing
+a GBDBS response (collect_* methods), get_owner_info and
+collect_eigentuemer for each ownership scenario and size.
+
+Usage:
+
+    python benchmarks/plot_owner_benchmark.py \\
+        --scenarios stockwerkeigentum --sizes 10,100 --latency 0.02
+"""
+
+import argparse
+import io
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+)
+
+from gbdbs_stand_in import (  # noqa: E402
+    BASE_EGRID, SCENARIOS, GbdbsStandIn, response_xml
+)
+from lru_cache import LRUCache  # noqa: E402
+from plot_owner import PlotOwner, PlotOwnerConfig  # noqa: E402
+from tenant_registry import TenantRegistry  # noqa: E402
+from upstream_client import UpstreamClient  # noqa: E402
+
+
+def measure(func, repeat):
+    """Return (min wall time in s, peak memory in bytes, result) of func.
+
+    Peak memory is measured in an additional run with tracemalloc.
+
+    :param func func: Function to benchmark
+    :param int repeat: Number of timed runs
+    """
+    wall_time = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        duration = time.perf_counter() - start
+        if wall_time is None or duration < wall_time:
+            wall_time = duration
+
+    tracemalloc.start()
+    try:
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return wall_time, peak, result
+
+
+def benchmark_scenario(plot_owner, config, stand_in, repeat):
+    """Run benchmarks for scenario of GBDBS stand-in and return rows of
+    (step, wall time, peak memory, GBDBS requests, requested EGRIDs).
+
+    :param PlotOwner plot_owner: PlotOwner
+    :param PlotOwnerConfig config: Compiled PlotOwner config
+    :param GbdbsStandIn stand_in: GBDBS stand-in server
+    :param int repeat: Number of timed runs
+    """
+    rows = []
+
+    def add_row(step, func):
+        stand_in.reset()
+        wall_time, peak, result = measure(func, repeat)
+        runs = repeat + 1
+        rows.append((
+            step, wall_time, peak, stand_in.requests / runs,
+            stand_in.ids / runs
+        ))
+        return result
+
+    # parse response without upstream requests
+    xml = response_xml(
+        stand_in.scenario, [BASE_EGRID], stand_in.size, stand_in.depth
+    ).encode('utf-8')
+    add_row('collect_*', lambda: plot_owner.parse_response(
+        config, io.BytesIO(xml), [BASE_EGRID]
+    ))
+
+    owner_info = add_row('get_owner_info', lambda: plot_owner.get_owner_info(
+        config, BASE_EGRID
+    ))
+    if 'error' in owner_info:
+        raise Exception(owner_info['error'])
+
+    grundstueck = None
+    for g in owner_info['grundstuecke'].values():
+        if g.egrid == BASE_EGRID:
+            grundstueck = g
+            break
+
+    def collect_eigentuemer():
+        memo = config.gbdbs_memo
+        if memo is None:
+            memo = LRUCache(config.gbdbs_memo_size, config.gbdbs_memo_ttl)
+        return plot_owner.collect_eigentuemer(
+            config, grundstueck, owner_info['rechte'],
+            owner_info['personen'], owner_info['grundstuecke'], True, memo
+        )
+
+    add_row('collect_eigentuemer', collect_eigentuemer)
+
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help="Comma separated list of scenarios")
+    parser.add_argument('--sizes', default='10,100,1000',
+                        help="Comma separated list of scenario sizes")
+    parser.add_argument('--depth', type=int, default=3,
+                        help="Nesting depth of Gemeinschaften")
+    parser.add_argument('--latency', type=float, default=0,
+                        help="Delay in seconds for each GBDBS response")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Number of timed runs")
+    parser.add_argument('--gbdbs-batch-size', type=int, default=1)
+    parser.add_argument('--gbdbs-concurrency', type=int, default=1)
+    parser.add_argument('--gbdbs-memo-size', type=int, default=100)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger('benchmark')
+    upstream_client = UpstreamClient()
+    plot_owner = PlotOwner(None, None, upstream_client, logger)
+
+    print("%-18s %6s %-20s %10s %10s %9s %9s" % (
+        'scenario', 'size', 'step', 'time [ms]', 'peak [KB]', 'requests',
+        'egrids'
+    ))
+    for scenario in args.scenarios.split(','):
+        for size in [int(size) for size in args.sizes.split(',')]:
+            stand_in = GbdbsStandIn(scenario, size, args.depth, args.latency)
+            stand_in.start()
+            try:
+                config = PlotOwnerConfig({
+                    'gbdbs_service_url': stand_in.url,
+                    'gbdbs_batch_size': args.gbdbs_batch_size,
+                    'gbdbs_concurrency': args.gbdbs_concurrency,
+                    'gbdbs_memo_size': args.gbdbs_memo_size
+                }, 'benchmark', TenantRegistry(), upstream_client)
+                rows = benchmark_scenario(
+                    plot_owner, config, stand_in, args.repeat
+                )
+            finally:
+                stand_in.stop()
+
+            for step, wall_time, peak, requests, ids in rows:
+                print("%-18s %6d %-20s %10.1f %10.1f %9.1f %9.1f" % (
+                    scenario, size, step, wall_time * 1000, peak / 1024,
+                    requests, ids
+                ))
@@ -0,0 +1,314 @@
+import hashlib
+import json
+import os
+from threading import Lock
+import time
+import uuid
+
+
+class DiskCache:
+    """DiskCache class
+
+    Cache of files in a directory with a max total size, where each entry
+    will expire after some time. The least recently used entries are
+    evicted if the cache is full.
+
+    The data of each entry is stored unchanged in its own file, so it can
+    be sent directly from offset 0. A JSON metadata file named by the hash
+    of the key points to the current data file and is replaced atomically,
+    so the cache can be shared by multiple processes.
+    """
+
+    # time in seconds between scans of the cache directory
+    SCAN_INTERVAL = 60
+    # time in seconds until unfinished temporary files and unreferenced
+    # data files are removed
+    STALE_TMP_AGE = 3600
+
+    def __init__(self, cache_dir, max_size, max_stale=0):
+        """Constructor
+
+        :param str cache_dir: Cache directory
+        :param int max_size: Max total size of cached files in bytes
+        :param float max_stale: Time in seconds after expiry until removal
+                                of an entry, during which it is still
+                                returned as stale entry
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.max_stale = max_stale
+        self.lock = Lock()
+        # total size of cached data files as of last scan and own changes
+        self.size = 0
+        self.scanned_at = None
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get(self, key):
+        """Return (open data file, metadata) for key or None if not present
+        or expired.
+
+        The data file is unbuffered and positioned at the start of the data.
+
+        Stale entries are returned until max_stale after their expiry,
+        with the expiry time in metadata as 'expires'.
+
+        :param str key: Key for entry
+        """
+        meta_path = self.path(key)
+        meta = self.read_meta(meta_path)
+        if meta is None or meta['key'] != key:
+            return None
+
+        if time.time() >= meta['expires'] + self.max_stale:
+            # remove expired entry
+            self.remove(key)
+            return None
+
+        try:
+            data = open(self.data_path(meta), 'rb', buffering=0)
+        except OSError:
+            return None
+
+        try:
+            # mark as most recently used
+            os.utime(meta_path)
+        except OSError:
+            pass
+
+        return data, meta
+
+    def read_meta(self, meta_path):
+        """Return metadata from metadata file or None if not readable.
+
+        :param str meta_path: Path of metadata file
+        """
+        try:
+            with open(meta_path, 'rb') as f:
+                meta = json.load(f)
+            if not all(k in meta for k in ('key', 'expires', 'data', 'size')):
+                raise ValueError("Incomplete cache metadata")
+            return meta
+        except (OSError, ValueError):
+            return None
+
+    def writer(self, key, ttl, meta):
+        """Return DiskCacheWriter for storing a new entry under key.
+
+        The entry expires ttl seconds after the writer has been created.
+
+        :param str key: Key for entry
+        :param float ttl: Time in seconds until expiry of entry
+        :param obj meta: Additional metadata to store with entry
+        """
+        return DiskCacheWriter(
+            self, key, dict(meta, key=key, expires=time.time() + ttl)
+        )
+
+    def add(self, key, tmp_path, meta):
+        """Store temporary data file as entry under key, replacing any
+        previous entry at once.
+
+        :param str key: Key for entry
+        :param str tmp_path: Path to temporary data file in cache directory
+        :param obj meta: Metadata of entry
+        """
+        size = os.path.getsize(tmp_path)
+        if size > self.max_size:
+            self.remove_paths(tmp_path)
+            return
+
+        name = "%s.data" % uuid.uuid4().hex
+        meta = dict(meta, data=name, size=size)
+        os.replace(tmp_path, os.path.join(self.cache_dir, name))
+
+        meta_path = self.path(key)
+        previous = self.read_meta(meta_path)
+        try:
+            self.write_meta(meta_path, meta)
+        except OSError:
+            self.remove_paths(os.path.join(self.cache_dir, name))
+            raise
+
+        with self.lock:
+            self.size += size
+        if previous is not None:
+            # open files of readers remain valid after removal
+            self.remove_data(previous)
+        self.evict()
+
+    def write_meta(self, meta_path, meta):
+        """Write metadata file atomically.
+
+        :param str meta_path: Path of metadata file
+        :param obj meta: Metadata of entry
+        """
+        tmp_path = os.path.join(self.cache_dir, "%s.tmp" % uuid.uuid4().hex)
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, meta_path)
+        except OSError:
+            self.remove_paths(tmp_path)
+            raise
+
+    def remove(self, key):
+        """Remove entry for key if present.
+
+        :param str key: Key for entry
+        """
+        meta_path = self.path(key)
+        meta = self.read_meta(meta_path)
+        self.remove_paths(meta_path)
+        if meta is not None:
+            self.remove_data(meta)
+
+    def remove_data(self, meta):
+        """Remove data file of entry and subtract its size from total size.
+
+        :param obj meta: Metadata of entry
+        """
+        if self.remove_paths(self.data_path(meta)):
+            with self.lock:
+                self.size = max(self.size - meta['size'], 0)
+
+    def evict(self):
+        """Remove expired and least recently used entries until the total
+        size is below the max size.
+
+        The cache directory is rescanned if the max size is exceeded or
+        after SCAN_INTERVAL, to account for entries of other processes.
+        """
+        with self.lock:
+            now = time.time()
+            if (
+                self.size <= self.max_size and self.scanned_at is not None
+                and now - self.scanned_at < self.SCAN_INTERVAL
+            ):
+                return
+
+            names = os.listdir(self.cache_dir)
+            entries = []
+            referenced = set()
+            total_size = 0
+            for name in names:
+                path = os.path.join(self.cache_dir, name)
+                if name.endswith('.json'):
+                    # remove separate metadata file of previous versions
+                    self.remove_paths(path)
+                    continue
+                if not name.endswith('.meta'):
+                    continue
+                meta = self.read_meta(path)
+                try:
+                    if meta is None:
+                        raise OSError("Invalid cache metadata")
+                    mtime = os.stat(path).st_mtime
+                    os.stat(self.data_path(meta))
+                except OSError:
+                    # remove incomplete entry
+                    self.remove_paths(path)
+                    continue
+
+                if meta['expires'] + self.max_stale <= now:
+                    # remove expired entry
+                    self.remove_paths(path, self.data_path(meta))
+                    continue
+
+                referenced.add(meta['data'])
+                entries.append((mtime, meta['size'], path, meta))
+                total_size += meta['size']
+
+            for name in names:
+                if (
+                    not name.endswith(('.tmp', '.data'))
+                    or name in referenced
+                ):
+                    continue
+                # remove stale temporary files and data files without
+                # metadata, e.g. of replaced entries or previous versions
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    if now - os.stat(path).st_mtime > self.STALE_TMP_AGE:
+                        self.remove_paths(path)
+                except OSError:
+                    pass
+
+            # remove least recently used entries
+            entries.sort(key=lambda entry: entry[0])
+            for mtime, size, path, meta in entries:
+                if total_size <= self.max_size:
+                    break
+                self.remove_paths(path, self.data_path(meta))
+                total_size -= size
+
+            self.size = total_size
+            self.scanned_at = now
+
+    def remove_paths(self, *paths):
+        """Remove files and return whether all could be removed.
+
+        :param str paths: Paths of metadata, data or temporary files
+        """
+        removed = True
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                removed = False
+        return removed
+
+    def path(self, key):
+        """Return path of metadata file for key.
+
+        :param str key: Key for entry
+        """
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, name + '.meta')
+
+    def data_path(self, meta):
+        """Return path of data file of entry.
+
+        :param obj meta: Metadata of entry
+        """
+        return os.path.join(self.cache_dir, os.path.basename(meta['data']))
+
+
+class DiskCacheWriter:
+    """DiskCacheWriter class
+
+    Write a new cache entry to a temporary file, which is added to the cache
+    only if it is committed.
+    """
+
+    def __init__(self, cache, key, meta):
+        """Constructor
+
+        :param DiskCache cache: Disk cache
+        :param str key: Key for entry
+        :param obj meta: Metadata of entry
+        """
+        self.cache = cache
+        self.key = key
+        self.meta = meta
+        self.tmp_path = os.path.join(
+            cache.cache_dir, "%s.tmp" % uuid.uuid4().hex
+        )
+        self.file = open(self.tmp_path, 'wb')
+
+    def write(self, data):
+        """Append data to temporary file.
+
+        :param bytes data: Data chunk
+        """
+        self.file.write(data)
+
+    def commit(self):
+        """Add temporary file to cache."""
+        self.file.close()
+        self.cache.add(self.key, self.tmp_path, self.meta)
+
+    def discard(self):
+        """Remove temporary file."""
+        self.file.close()
+        self.cache.remove_paths(self.tmp_path)
@@ -0,0 +1,108 @@
+class ElementIndex:
+    """ElementIndex class
+
+    Index of the elements of an XML subtree by their local names, which is
+    built while parsing. Child and descendant elements are looked up in
+    constant time instead of scanning the subtree.
+    """
+
+    def __init__(self):
+        """Constructor"""
+        # lookup for local name and parent of each element
+        self.names = {}
+        self.parents = {}
+        # lookup for first child element by local name for each element
+        self.children = {}
+        # lookup for first descendant element by local name for each
+        # element
+        self.descendants = {}
+
+    def add(self, elem, name, parent):
+        """Add element on start of its parsing.
+
+        Elements have to be added in document order.
+
+        :param Element elem: Element
+        :param str name: Local name of element
+        :param Element parent: Indexed parent element or None for root
+        """
+        self.names[elem] = name
+        self.parents[elem] = parent
+        self.children[elem] = {}
+        self.descendants[elem] = {}
+        if parent is None:
+            return
+
+        self.children[parent].setdefault(name, elem)
+        ancestor = parent
+        while ancestor is not None:
+            first = self.descendants[ancestor]
+            if name in first:
+                # ancestors further up already have an earlier descendant
+                break
+            first[name] = elem
+            ancestor = self.parents[ancestor]
+
+    def clear(self):
+        """Remove all elements from index."""
+        self.names.clear()
+        self.parents.clear()
+        self.children.clear()
+        self.descendants.clear()
+
+    def find(self, parent, path):
+        """Find first subnode of parent node matching path.
+
+        XML namespaces are ignored.
+
+        :param Element parent: Indexed parent node
+        :param str path: Path to subnode (use `//` for any sublevel)
+        """
+        match = parent
+        any_level = False
+        for part in path.split("/"):
+            if part == '':
+                # mark as any level
+                any_level = True
+                continue
+
+            if any_level:
+                # find child on any sublevel
+                any_level = False
+                match = self.descendants[match].get(part)
+                if match is None:
+                    # no match
+                    return None
+            else:
+                # find child node
+                match = self.children[match].get(part)
+                if match is None:
+                    # no match
+                    return None
+
+        return match
+
+    def find_all(self, parent, name):
+        """Find all subnodes of parent node on any sublevel with local name.
+
+        :param Element parent: Indexed parent node
+        :param str name: Local name of subnodes
+        """
+        return [
+            node for node in parent.iter()
+            if node is not parent and self.names.get(node) == name
+        ]
+
+    def node_value(self, parent, path):
+        """Get value of first subnode of parent node matching path.
+
+        XML namespaces are ignored.
+
+        :param Element parent: Indexed parent node
+        :param str path: Path to subnode (use `//` for any sublevel)
+        """
+        value = None
+        node = self.find(parent, path)
+        if node is not None:
+            value = node.text
+        return value
@@ -0,0 +1,466 @@
+import math
+import re
+
+
+# regex for coordinate lists of polygon rings in WKT
+RING_RE = re.compile(r'\(([^()]+)\)')
+
+
+def parse_polygon_wkt(wkt):
+    """Return rings of a Polygon or MultiPolygon WKT as lists of (x, y)
+    tuples, or None if the WKT could not be parsed.
+
+    :param str wkt: Polygon or MultiPolygon WKT
+    """
+    if not isinstance(wkt, str):
+        return None
+
+    geom_type = wkt.lstrip().split('(', 1)[0].strip().upper()
+    if geom_type not in ('POLYGON', 'MULTIPOLYGON'):
+        return None
+
+    rings = []
+    try:
+        for ring in RING_RE.findall(wkt):
+            coords = []
+            for coord in ring.split(','):
+                values = coord.split()
+                coords.append((float(values[0]), float(values[1])))
+            rings.append(coords)
+    except (IndexError, ValueError):
+        return None
+
+    return rings
+
+
+def point_in_rings(rings, x, y):
+    """Return whether point is inside polygon rings (even-odd rule).
+
+    :param list rings: Polygon rings as lists of (x, y) tuples
+    :param float x: X coordinate
+    :param float y: Y coordinate
+    """
+    inside = False
+    for ring in rings:
+        x1, y1 = ring[-1]
+        for x2, y2 in ring:
+            if (y1 > y) != (y2 > y):
+                if x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+                    inside = not inside
+            x1, y1 = x2, y2
+    return inside
+
+
+def distance_to_rings(rings, x, y):
+    """Return distance of point to polygon rings, or 0 if point is inside.
+
+    :param list rings: Polygon rings as lists of (x, y) tuples
+    :param float x: X coordinate
+    :param float y: Y coordinate
+    """
+    if point_in_rings(rings, x, y):
+        return 0.0
+
+    min_dist_sq = math.inf
+    for ring in rings:
+        x1, y1 = ring[0]
+        for x2, y2 in ring[1:]:
+            # squared distance to segment
+            dx = x2 - x1
+            dy = y2 - y1
+            length_sq = dx * dx + dy * dy
+            t = 0.0
+            if length_sq > 0:
+                t = max(
+                    0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / length_sq)
+                )
+            px = x1 + t * dx - x
+            py = y1 + t * dy - y
+            dist_sq = px * px + py * py
+            if dist_sq < min_dist_sq:
+                min_dist_sq = dist_sq
+            x1, y1 = x2, y2
+
+    return math.sqrt(min_dist_sq)
+
+
+# regex for polygons with their coordinate lists of rings in WKT
+POLYGON_RE = re.compile(r'\((\s*\([^()]+\)(?:\s*,\s*\([^()]+\))*\s*)\)')
+
+
+def parse_polygons_wkt(wkt):
+    """Return polygons of a Polygon or MultiPolygon WKT as lists of rings
+    of (x, y) tuples, or None if the WKT could not be parsed.
+
+    :param str wkt: Polygon or MultiPolygon WKT
+    """
+    if not isinstance(wkt, str):
+        return None
+
+    geom_type = wkt.lstrip().split('(', 1)[0].strip().upper()
+    if geom_type not in ('POLYGON', 'MULTIPOLYGON'):
+        return None
+
+    polygons = []
+    for polygon in POLYGON_RE.findall(wkt):
+        rings = parse_polygon_wkt('POLYGON(%s)' % polygon)
+        if rings is None:
+            return None
+        polygons.append(rings)
+
+    return polygons
+
+
+def ring_area(ring):
+    """Return signed area of closed ring.
+
+    :param list ring: Closed ring as list of (x, y) tuples
+    """
+    area = 0.0
+    x1, y1 = ring[-1]
+    for x2, y2 in ring:
+        area += x1 * y2 - x2 * y1
+        x1, y1 = x2, y2
+    return area / 2
+
+
+def segments_intersect(a, b, c, d):
+    """Return whether segments a-b and c-d intersect or touch.
+
+    :param tuple a: Start of first segment as (x, y)
+    :param tuple b: End of first segment as (x, y)
+    :param tuple c: Start of second segment as (x, y)
+    :param tuple d: End of second segment as (x, y)
+    """
+    def orientation(p, q, r):
+        value = (q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0])
+        return (value > 0) - (value < 0)
+
+    def on_segment(p, q, r):
+        # r is collinear with p-q
+        return (
+            min(p[0], q[0]) <= r[0] <= max(p[0], q[0]) and
+            min(p[1], q[1]) <= r[1] <= max(p[1], q[1])
+        )
+
+    o1 = orientation(a, b, c)
+    o2 = orientation(a, b, d)
+    o3 = orientation(c, d, a)
+    o4 = orientation(c, d, b)
+    if o1 != o2 and o3 != o4:
+        return True
+    return (
+        (o1 == 0 and on_segment(a, b, c)) or
+        (o2 == 0 and on_segment(a, b, d)) or
+        (o3 == 0 and on_segment(c, d, a)) or
+        (o4 == 0 and on_segment(c, d, b))
+    )
+
+
+def is_valid_ring(ring):
+    """Return whether closed ring has an area and does not intersect
+    itself.
+
+    :param list ring: Closed ring as list of (x, y) tuples
+    """
+    if len(ring) < 4 or ring_area(ring) == 0:
+        return False
+
+    count = len(ring) - 1
+    # sweep over segments sorted by min X, comparing each segment with
+    # the previous segments overlapping in X
+    segments = sorted(
+        (min(a[0], b[0]), max(a[0], b[0]), i, a, b)
+        for i, (a, b) in enumerate(zip(ring[:-1], ring[1:]))
+    )
+    active = []
+    for xmin, xmax, i, a, b in segments:
+        active = [segment for segment in active if segment[1] >= xmin]
+        for _, _, j, c, d in active:
+            if abs(i - j) in (1, count - 1):
+                # skip adjacent segments, which share a coordinate
+                continue
+            if (
+                max(a[1], b[1]) < min(c[1], d[1]) or
+                min(a[1], b[1]) > max(c[1], d[1])
+            ):
+                # no overlap in Y
+                continue
+            if segments_intersect(a, b, c, d):
+                return False
+        active.append((xmin, xmax, i, a, b))
+    return True
+
+
+def simplify_ring(ring, tolerance):
+    """Return ring simplified with the Douglas-Peucker algorithm.
+
+    The simplified ring may be collapsed or self-intersecting.
+
+    :param list ring: Closed ring as list of (x, y) tuples
+    :param float tolerance: Simplification tolerance
+    """
+    if len(ring) < 4:
+        return ring
+
+    keep = [False] * len(ring)
+    keep[0] = keep[-1] = True
+    tolerance_sq = tolerance * tolerance
+    stack = [(0, len(ring) - 1)]
+    while stack:
+        first, last = stack.pop()
+        x1, y1 = ring[first]
+        x2, y2 = ring[last]
+        dx = x2 - x1
+        dy = y2 - y1
+        length_sq = dx * dx + dy * dy
+
+        # find point with max squared distance to segment
+        max_dist_sq = -1.0
+        index = None
+        for i in range(first + 1, last):
+            x, y = ring[i]
+            t = 0.0
+            if length_sq > 0:
+                t = max(
+                    0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / length_sq)
+                )
+            px = x1 + t * dx - x
+            py = y1 + t * dy - y
+            dist_sq = px * px + py * py
+            if dist_sq > max_dist_sq:
+                max_dist_sq = dist_sq
+                index = i
+
+        if index is not None and max_dist_sq > tolerance_sq:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [coord for coord, kept in zip(ring, keep) if kept]
+
+
+def encode_polyline(coords, precision):
+    """Return coordinates as encoded polyline string, with X before Y.
+
+    :param list coords: Coordinates as list of (x, y) tuples
+    :param int precision: Number of decimal places
+    """
+    factor = 10 ** precision
+    chunks = []
+    prev_x = prev_y = 0
+    for x, y in coords:
+        x = int(round(x * factor))
+        y = int(round(y * factor))
+        for delta in (x - prev_x, y - prev_y):
+            # zigzag encode sign
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        prev_x, prev_y = x, y
+    return ''.join(chunks)
+
+
+class GeometryFormat:
+    """GeometryFormat class
+
+    Output encoding, coordinate precision and simplification of plot
+    geometries.
+    """
+
+    # supported output encodings
+    FORMATS = ['wkt', 'geojson', 'polyline']
+
+    # default number of decimal places for encoded polylines
+    DEFAULT_POLYLINE_PRECISION = 2
+    # max number of decimal places
+    MAX_PRECISION = 15
+
+    def __init__(self, encoding='wkt', precision=None, tolerance=None):
+        """Constructor
+
+        :param str encoding: Output encoding (wkt, geojson or polyline)
+        :param int precision: Number of decimal places of coordinates
+                              (default: unchanged)
+        :param float tolerance: Simplification tolerance in map units
+                                (default: no simplification)
+        """
+        self.encoding = encoding or 'wkt'
+        self.precision = precision
+        if self.encoding == 'polyline' and self.precision is None:
+            self.precision = self.DEFAULT_POLYLINE_PRECISION
+        self.tolerance = tolerance
+
+    def is_default(self):
+        """Return whether geometries are returned unchanged."""
+        return (
+            self.encoding == 'wkt' and self.precision is None
+            and not self.tolerance
+        )
+
+    def encode(self, wkt):
+        """Return encoded geometry for Polygon or MultiPolygon WKT,
+        or the WKT unchanged if it could not be parsed.
+
+        :param str wkt: Polygon or MultiPolygon WKT
+        """
+        if self.is_default():
+            return wkt
+
+        polygons = parse_polygons_wkt(wkt)
+        if polygons is None:
+            return wkt
+        multi = wkt.lstrip().upper().startswith('MULTI')
+
+        # simplify and round coordinates
+        transformed = []
+        for rings in polygons:
+            rings = self.transform_polygon(rings, len(polygons) > 1)
+            if rings is not None:
+                transformed.append(rings)
+        if polygons and not transformed:
+            # keep all polygons if all of them collapse
+            transformed = [
+                self.transform_polygon(rings, False) for rings in polygons
+            ]
+        polygons = transformed
+
+        if self.encoding == 'geojson':
+            coordinates = [
+                [[list(coord) for coord in ring] for ring in rings]
+                for rings in polygons
+            ]
+            if multi:
+                return {'type': 'MultiPolygon', 'coordinates': coordinates}
+            return {
+                'type': 'Polygon',
+                'coordinates': coordinates[0] if coordinates else []
+            }
+        elif self.encoding == 'polyline':
+            coordinates = [
+                [encode_polyline(ring, self.precision) for ring in rings]
+                for rings in polygons
+            ]
+            if multi:
+                geom = {'type': 'MultiPolygon', 'coordinates': coordinates}
+            else:
+                geom = {
+                    'type': 'Polygon',
+                    'coordinates': coordinates[0] if coordinates else []
+                }
+            geom['precision'] = self.precision
+            return geom
+        else:
+            wkt_polygons = [
+                "(%s)" % ",".join(
+                    "(%s)" % ",".join(
+                        "%s %s" % (self.format_number(x), self.format_number(y))
+                        for x, y in ring
+                    )
+                    for ring in rings
+                )
+                for rings in polygons
+            ]
+            if multi:
+                return "MULTIPOLYGON(%s)" % ",".join(wkt_polygons)
+            if not wkt_polygons:
+                return "POLYGON EMPTY"
+            return "POLYGON%s" % wkt_polygons[0]
+
+    def transform_polygon(self, rings, droppable):
+        """Return polygon rings simplified by tolerance and rounded to
+        precision, or None if the polygon collapses and is dropped.
+
+        Rings which would intersect themselves are only rounded. Collapsed
+        holes are dropped, and the shell is only rounded if a hole would
+        be outside of the simplified shell.
+
+        :param list rings: Shell and holes as lists of (x, y) tuples
+        :param bool droppable: Whether a collapsed polygon may be dropped
+        """
+        shell = self.transform_ring(rings[0])
+        if droppable and self.collapses(shell):
+            # drop polygon which collapses, e.g. if smaller than tolerance
+            return None
+        rounded_shell = self.round_ring(rings[0])
+        if not is_valid_ring(shell):
+            shell = rounded_shell
+
+        holes = []
+        for hole in rings[1:]:
+            transformed = self.transform_ring(hole)
+            if self.collapses(transformed):
+                # drop collapsed hole
+                continue
+            if not is_valid_ring(transformed):
+                transformed = self.round_ring(hole)
+            holes.append(transformed)
+
+        if not all(self.ring_inside(hole, shell) for hole in holes):
+            shell = rounded_shell
+            # drop any holes still outside of shell
+            holes = [hole for hole in holes if self.ring_inside(hole, shell)]
+
+        return [shell] + holes
+
+    def transform_ring(self, ring):
+        """Return ring simplified by tolerance and rounded to precision.
+
+        :param list ring: Closed ring as list of (x, y) tuples
+        """
+        if self.tolerance:
+            ring = simplify_ring(ring, self.tolerance)
+        return self.rounded(ring)
+
+    def round_ring(self, ring):
+        """Return ring rounded to precision without simplification, or the
+        original ring if it would be invalid after rounding.
+
+        :param list ring: Closed ring as list of (x, y) tuples
+        """
+        rounded = self.rounded(ring)
+        if not is_valid_ring(rounded):
+            return ring
+        return rounded
+
+    def rounded(self, ring):
+        """Return ring rounded to precision, without duplicate coordinates.
+
+        :param list ring: Closed ring as list of (x, y) tuples
+        """
+        if self.precision is None:
+            return ring
+
+        rounded = []
+        for x, y in ring:
+            coord = (round(x, self.precision), round(y, self.precision))
+            if not rounded or rounded[-1] != coord:
+                # skip duplicate coords after rounding
+                rounded.append(coord)
+        return rounded
+
+    def collapses(self, ring):
+        """Return whether a transformed ring has collapsed.
+
+        :param list ring: Closed ring as list of (x, y) tuples
+        """
+        return len(ring) < 4 or ring_area(ring) == 0
+
+    def ring_inside(self, ring, shell):
+        """Return whether all coordinates of ring are inside or on shell.
+
+        :param list ring: Closed ring as list of (x, y) tuples
+        :param list shell: Closed shell as list of (x, y) tuples
+        """
+        return all(distance_to_rings([shell], x, y) == 0 for x, y in ring)
+
+    def format_number(self, value):
+        """Return coordinate as WKT number.
+
+        :param float value: Coordinate value
+        """
+        if self.precision is not None and self.precision <= 0:
+            return "%d" % value
+        return repr(value)
@@ -1,10 +1,9 @@
 from xml.dom.minidom import parseString
 
-from flask import Response, stream_with_context
-import requests
 from sqlalchemy.sql import text as sql_text
 from qwc_services_core.tenant_handler import TenantHandler
 from plot_info import PlotInfo
+from upstream_client import UpstreamUnavailable
 
 
 class LandRegExtract:
@@ -13,27 +12,43 @@ class LandRegExtract:
     Land registrer extract as a PDF.
     """
 
-    def __init__(self, config_handler, db_engine, logger):
+    def __init__(self, config_handler, db_engine, upstream_client, logger):
         """Constructor
 
         :param DatabaseEngine db_engine: Database engine with DB connections
+        :param UpstreamClient upstream_client: Shared upstream HTTP sessions
         :param Logger logger: Application logger
         """
         self.config_handler = config_handler
         self.db_engine = db_engine
+        self.upstream_client = upstream_client
         self.logger = logger
+        self.tenant_handler = TenantHandler(logger)
+
+    def load_config(self):
+        """Return compiled land register config for current tenant.
+
+        The compiled config is cached per tenant and rebuilt if the tenant
+        config file has changed.
+        """
+        tenant = self.tenant_handler.tenant()
+        config = self.tenant_handler.handler('plotinfo', 'land_reg', tenant)
+        if config is None:
+            config = self.tenant_handler.register_handler(
+                'land_reg', tenant, LandRegExtractConfig(
+                    self.config_handler.tenant_config(tenant), self.db_engine,
+                    self.upstream_client
+                )
+            )
+        return config
 
     def pdf(self, egrid):
         """Submit query
 
         Return map print
         """
-        tenant_handler = TenantHandler(self.logger)
-        tenant = tenant_handler.tenant()
-        config = self.config_handler.tenant_config(tenant)
-
-        project = config.get("landreg_project", "grundbuch")
-        qgis_server_url = config.get('qgis_server_url')
+        config = self.load_config()
+        project = config.project
 
         # Available print templates and sizes
         params = {
@@ -42,11 +57,14 @@ class LandRegExtract:
             "REQUEST": "GetProjectSettings",
         }
 
-        url = qgis_server_url.rstrip("/") + "/" + project
-        req = requests.get(url, params=params)
+        url = config.project_url
 
         layouts = {}
         try:
+            req = config.session.get(
+                url, params=params, timeout=config.timeout,
+                latency_key='landreg_project_settings'
+            )
             capabilities = parseString(req.text)
             templates = capabilities.getElementsByTagName("WMS_Capabilities")[0]\
                                     .getElementsByTagName("Capability")[0]\
@@ -66,8 +84,7 @@ class LandRegExtract:
             }
 
         # Specified print template
-        template = config.get("landreg_print_template")
-        crs = config.get("landreg_srs", "EPSG:2056")
+        template = config.print_template
         try:
             layout = layouts[template]
         except:
@@ -77,34 +94,15 @@ class LandRegExtract:
             }
 
         # Prapare params for print
-        params = {
-            "SERVICE": "WMS",
-            "VERSION": "1.3.0",
-            "REQUEST": "GetPrint",
-            "FORMAT": "PDF",
-            "TEMPLATE": template,
-            "DPI": str(config.get("landreg_dpi", "300")),
-            "SRS": crs,
-            "map0:GRID_INTERVAL_X": str(config.get("landreg_grid_x", "")),
-            "map0:GRID_INTERVAL_Y": str(config.get("landreg_grid_y", "")),
-            "LAYERS": config.get("landreg_print_layer", ""),
-            "OPACITIES": config.get("landreg_print_layer_opacities", "")
-        }
-        if not params["OPACITIES"]:
-            params["OPACITIES"] = ",".join( map(lambda item: "255", params["LAYERS"].split(",")))
+        params = dict(config.print_params)
 
         # Determine extent and scale
-        basic_info_by_egrid_sql = config.get(
-            'basic_info_by_egrid_sql', PlotInfo.DEFAULT_BASIC_INFO_BY_EGRID_SQL
-        )
-
         conn = None
         try:
-            db = self.db_engine.db_engine(config.get('db_url'))
-            sql = sql_text(basic_info_by_egrid_sql)
-            conn = db.connect()
+            conn = config.db.connect()
             result = conn.execute(
-                sql, {"egrid": egrid, "srid": int(crs.replace("EPSG:", "")), "buffer": 1}
+                config.basic_info_by_egrid_sql,
+                {"egrid": egrid, "srid": config.srid, "buffer": 1}
             )
             row = result.fetchone()
             if row is None:
@@ -132,7 +130,7 @@ class LandRegExtract:
         scaleden = 1. / min(scale_w, scale_h)
 
         # Fit to allowed scales
-        allowed_scale_denoms = config.get("landreg_allowed_scale_denoms", [])
+        allowed_scale_denoms = config.allowed_scale_denoms
         if allowed_scale_denoms:
             # Minimal allowed scale greater or equal scaleden
             try:
@@ -160,17 +158,14 @@ class LandRegExtract:
         params[layout["mapname"] + ":SCALE"] = str(round(fitscaleden))
 
         # Determine extra print params
-        extra_labels = config.get("landreg_extra_labels", {})
-        if extra_labels:
+        if config.extra_labels_sql is not None:
             conn = None
             try:
-                db = self.db_engine.db_engine(config.get('db_url'))
-                sql = sql_text(extra_labels["query"])
-                conn = db.connect()
+                conn = config.db.connect()
                 result = conn.execute(
-                    sql, {
+                    config.extra_labels_sql, {
                         "egrid": egrid,
-                        "srid": int(crs.replace("EPSG:", "")),
+                        "srid": config.srid,
                         "x": (0.5 * (bbox[0] + bbox[2])),
                         "y": (0.5 * (bbox[1] + bbox[3])),
                         "xmin": bbox[0],
@@ -181,7 +176,7 @@ class LandRegExtract:
                 )
                 row = result.fetchone()
                 if row is not None:
-                    for label in extra_labels["fields"]:
+                    for label in config.extra_labels_fields:
                         params[label.upper()] = getattr(row, label)
             except Exception as e:
                 return {
@@ -193,19 +188,102 @@ class LandRegExtract:
                     conn.close()
 
         # Forward to QGIS server
-        url = qgis_server_url.rstrip("/") + "/" + project
-        req = requests.post(url, timeout=120, data=params)
+        url = config.project_url
+        try:
+            req = config.session.post(
+                url, timeout=config.timeout, data=params, stream=True
+            )
+        except UpstreamUnavailable as e:
+            return {
+                'error': 'QGIS Server unavailable: ' + str(e),
+                'success': False
+            }, 503
+        except Exception as e:
+            return {
+                'error': 'Failed to print extract: ' + str(e),
+                'success': False
+            }, 502
         self.logger.info("Forwarding request to %s\n%s" % (req.url, params))
 
-        response = Response(
-            stream_with_context(
-                req.iter_content(chunk_size=1024)
-            ), status=req.status_code
-        )
-        response.headers['content-type'] = req.headers['content-type']
-        if req.headers['content-type'] == 'application/pdf':
+        content_type = req.headers.get('content-type', '')
+        response = self.upstream_client.proxy_response(req, [])
+        if content_type:
+            response.headers['content-type'] = content_type
+        if content_type == 'application/pdf':
             response.headers['content-disposition'] = \
                 'attachment; filename=' + project + '.' + params['FORMAT'].lower()
 
         return response
 
+
+class LandRegExtractConfig:
+    """LandRegExtractConfig class
+
+    Compiled land register extract config for a tenant.
+    """
+
+    def __init__(self, config, db_engine, upstream_client):
+        """Constructor
+
+        :param RuntimeConfig config: Tenant config
+        :param DatabaseEngine db_engine: Database engine with DB connections
+        :param UpstreamClient upstream_client: Shared upstream HTTP sessions
+        """
+        self.session = upstream_client.session(config)
+        self.project = config.get("landreg_project", "grundbuch")
+        qgis_server_url = config.get('qgis_server_url')
+        if qgis_server_url is None:
+            raise Exception("Environment variable QGIS_SERVER_URL is not set")
+        self.project_url = qgis_server_url.rstrip("/") + "/" + self.project
+
+        self.timeout = float(config.get("landreg_timeout", 120))
+
+        self.print_template = config.get("landreg_print_template")
+        crs = config.get("landreg_srs", "EPSG:2056")
+        self.srid = int(crs.replace("EPSG:", ""))
+
+        # static params for print
+        self.print_params = {
+            "SERVICE": "WMS",
+            "VERSION": "1.3.0",
+            "REQUEST": "GetPrint",
+            "FORMAT": "PDF",
+            "TEMPLATE": self.print_template,
+            "DPI": str(config.get("landreg_dpi", "300")),
+            "SRS": crs,
+            "map0:GRID_INTERVAL_X": str(config.get("landreg_grid_x", "")),
+            "map0:GRID_INTERVAL_Y": str(config.get("landreg_grid_y", "")),
+            "LAYERS": config.get("landreg_print_layer", ""),
+            "OPACITIES": config.get("landreg_print_layer_opacities", "")
+        }
+        if not self.print_params["OPACITIES"]:
+            self.print_params["OPACITIES"] = ",".join(
+                map(lambda item: "255", self.print_params["LAYERS"].split(","))
+            )
+
+        self.allowed_scale_denoms = config.get(
+            "landreg_allowed_scale_denoms", []
+        )
+
+        # DB engine is created on first use
+        self.db_engine = db_engine
+        self.db_url = config.get('db_url')
+        self._db = None
+        self.basic_info_by_egrid_sql = sql_text(config.get(
+            'basic_info_by_egrid_sql', PlotInfo.DEFAULT_BASIC_INFO_BY_EGRID_SQL
+        ))
+
+        # extra print labels
+        extra_labels = config.get("landreg_extra_labels", {})
+        self.extra_labels_sql = None
+        self.extra_labels_fields = []
+        if extra_labels:
+            self.extra_labels_sql = sql_text(extra_labels["query"])
+            self.extra_labels_fields = extra_labels["fields"]
+
+    @property
+    def db(self):
+        """Return DB engine for db_url."""
+        if self._db is None:
+            self._db = self.db_engine.db_engine(self.db_url)
+        return self._db
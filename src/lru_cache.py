@@ -0,0 +1,101 @@
+from collections import OrderedDict
+from threading import Lock
+import time
+
+
+class LRUCache:
+    """LRUCache class
+
+    Thread-safe cache with a max total size of entries, where each entry
+    will expire after some time. The least recently used entries are
+    evicted if the cache is full.
+
+    The size of an entry is 1, unless a function for the size of values
+    is set.
+    """
+
+    def __init__(self, max_size, ttl, weigh=None):
+        """Constructor
+
+        :param int max_size: Max total size of entries
+        :param float ttl: Time in seconds until expiry of an entry
+        :param func weigh: Optional function returning the size of a value
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.weigh = weigh
+        # entries as {<key>: (value, expiry time, size)}
+        self.entries = OrderedDict()
+        # total size of entries
+        self.size = 0
+        self.lock = Lock()
+
+    def get(self, key):
+        """Return value for key or None if not present or expired.
+
+        :param obj key: Key for value
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires, size = entry
+            if time.monotonic() >= expires:
+                # remove expired value
+                del self.entries[key]
+                self.size -= size
+                return None
+
+            # mark as most recently used
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store value under key until expiry.
+
+        :param obj key: Key for value
+        :param obj value: Value to store
+        """
+        if self.max_size <= 0:
+            return
+
+        size = self.weigh(value) if self.weigh is not None else 1
+        with self.lock:
+            self.remove_entry(key)
+            if size > self.max_size:
+                return
+
+            self.entries[key] = (value, time.monotonic() + self.ttl, size)
+            self.size += size
+            while self.size > self.max_size:
+                # evict least recently used entry
+                key, entry = self.entries.popitem(last=False)
+                self.size -= entry[2]
+
+    def remove(self, key):
+        """Remove value for key if present.
+
+        :param obj key: Key for value
+        """
+        with self.lock:
+            self.remove_entry(key)
+
+    def remove_entry(self, key):
+        """Remove entry for key if present, while holding the lock.
+
+        :param obj key: Key for value
+        """
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self):
+        """Remove all values."""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
@@ -1,9 +1,14 @@
+from concurrent.futures import Future, TimeoutError
 import os
+from threading import Lock, Thread
+import time
 
-from flask import make_response, Response, stream_with_context
-import requests
+from flask import make_response, request, Response, send_file
 from qwc_services_core.tenant_handler import TenantHandler
 
+from disk_cache import DiskCache
+from tenant_registry import TenantRegistry
+
 
 class OerebInfo:
     """OerebInfo class
@@ -12,49 +17,67 @@ class OerebInfo:
 
     Uses an ÖREB-Webservice to get XMLs and an ÖREB PDF-Service
     to generate PDFs from these XMLs.
+
+    Successful responses are optionally cached on disk per tenant, format
+    and EGRID. Uncached documents are fetched into the cache in the
+    background, and concurrent requests for the same document share this
+    single ÖREB service request.
     """
 
-    def __init__(self, config_handler, logger):
+    # time in seconds in addition to the ÖREB service timeout until
+    # a concurrent ÖREB service request is abandoned
+    FETCH_TIMEOUT_MARGIN = 10
+    # max size in bytes of unsuccessful ÖREB service responses shared with
+    # concurrent requests
+    MAX_SHARED_ERROR_SIZE = 64 * 1024
+
+    def __init__(self, config_handler, upstream_client, logger):
         """Constructor
 
+        :param UpstreamClient upstream_client: Shared upstream HTTP sessions
         :param Logger logger: Application logger
         """
         self.config_handler = config_handler
+        self.upstream_client = upstream_client
         self.logger = logger
+        self.tenant_handler = TenantHandler(logger)
+
+        # pending ÖREB service requests as {<cache key>: (Future, deadline)}
+        self.fetches = {}
+        self.fetches_lock = Lock()
+
+        # disk caches of tenants, kept across config rebuilds
+        self.registry = TenantRegistry()
 
     def load_config(self):
-        tenant_handler = TenantHandler(self.logger)
-        tenant = tenant_handler.tenant()
-        config = self.config_handler.tenant_config(tenant)
+        """Return compiled ÖREB config for current tenant.
 
-        # ÖREB-Webservice config
-        self.oereb_json_url = config.get('oereb_json_url')
-        self.oereb_xml_url = config.get('oereb_xml_url')
-        self.oereb_pdf_url = config.get('oereb_pdf_url')
-        if self.oereb_json_url is None:
-            raise Exception("Environment variable OEREB_JSON_URL is not set")
-        if self.oereb_xml_url is None:
-            raise Exception("Environment variable OEREB_XML_URL is not set")
-        if self.oereb_pdf_url is None:
-            raise Exception("Environment variable OEREB_PDF_URL is not set")
+        The compiled config is cached per tenant and rebuilt if the tenant
+        config file has changed.
+        """
+        tenant = self.tenant_handler.tenant()
+        config = self.tenant_handler.handler('plotinfo', 'oereb_info', tenant)
+        if config is None:
+            config = self.tenant_handler.register_handler(
+                'oereb_info', tenant, OerebInfoConfig(
+                    self.config_handler.tenant_config(tenant), tenant,
+                    self.registry, self.upstream_client
+                )
+            )
+        return config
 
     def xml(self, egrid):
         """Return ÖREB XML for EGRID.
 
         :param str egrid: EGRID
         """
-        self.load_config()
+        config = self.load_config()
         egrid = os.getenv('__OEREB_TEST_EGRID', egrid)
         try:
             # forward to ÖREB XML service
-            req = self.xml_response(egrid)
-
-            response = Response(
-                stream_with_context(req.iter_content(chunk_size=1024)),
-                status=req.status_code
+            response = self.document_response(
+                config, 'xml', egrid, ['content-type']
             )
-            if 'content-type' in req.headers:
-                response.headers['content-type'] = req.headers['content-type']
         except Exception as e:
             self.logger.error(e)
             response = make_response(
@@ -69,18 +92,13 @@ class OerebInfo:
 
         :param str egrid: EGRID
         """
-        self.load_config()
+        config = self.load_config()
         egrid = os.getenv('__OEREB_TEST_EGRID', egrid)
         try:
             # forward to ÖREB JSON service
-            req = self.json_response(egrid)
-
-            response = Response(
-                stream_with_context(req.iter_content(chunk_size=1024)),
-                status=req.status_code
+            response = self.document_response(
+                config, 'json', egrid, ['content-type']
             )
-            if 'content-type' in req.headers:
-                response.headers['content-type'] = req.headers['content-type']
         except Exception as e:
             self.logger.error(e)
             response = {
@@ -97,21 +115,13 @@ class OerebInfo:
 
         :param str egrid: EGRID
         """
-        self.load_config()
+        config = self.load_config()
         egrid = os.getenv('__OEREB_TEST_EGRID', egrid)
         try:
             # forward to ÖREB PDF service
-            req = self.pdf_response(egrid)
-
-            response = Response(
-                stream_with_context(req.iter_content(chunk_size=1024)),
-                status=req.status_code
+            response = self.document_response(
+                config, 'pdf', egrid, ['content-type', 'content-disposition']
             )
-            if 'content-type' in req.headers:
-                response.headers['content-type'] = req.headers['content-type']
-            if 'content-disposition' in req.headers:
-                response.headers['content-disposition'] = req.headers[
-                    'content-disposition']
         except Exception as e:
             self.logger.error(e)
             response = Response(
@@ -122,38 +132,380 @@ class OerebInfo:
 
         return response
 
-    def xml_response(self, egrid):
+    def document_response(self, config, format, egrid, header_names):
+        """Return response for ÖREB document from cache or ÖREB service.
+
+        Uncached documents are fetched into the cache in the background,
+        and all concurrent requests for the same document wait for this
+        single ÖREB service request and are then served from cache, so
+        they do not depend on the speed of another client.
+        Stale cached documents are returned immediately while they are
+        refreshed in the background.
+
+        :param OerebInfoConfig config: Compiled ÖREB config
+        :param str format: Document format (xml, json or pdf)
+        :param str egrid: EGRID
+        :param list header_names: Names of headers to forward
+        """
+        ttl = config.cache_ttl.get(format, 0)
+        if config.cache is None or ttl <= 0:
+            req = self.upstream_request(config, format, egrid)
+            return self.upstream_client.proxy_response(req, header_names)
+
+        entry, failed = self.cached_document(
+            config, format, egrid, header_names
+        )
+        if entry is not None:
+            return self.file_response(*entry)
+
+        if failed is not None:
+            # forward shared unsuccessful response of ÖREB service
+            status, headers, body = failed
+            return Response(body, status=status, headers=headers)
+
+        # document could not be cached, forward without cache
+        req = self.upstream_request(config, format, egrid)
+        return self.upstream_client.proxy_response(req, header_names)
+
+    def cached_document(self, config, format, egrid, header_names):
+        """Return ((open file, metadata) of cached ÖREB document, None),
+        which is fetched from ÖREB service if not cached,
+        or (None, (status, headers, body) of unsuccessful response of
+        ÖREB service), or (None, None) if it could not be fetched.
+
+        :param OerebInfoConfig config: Compiled ÖREB config
+        :param str format: Document format (xml, json or pdf)
+        :param str egrid: EGRID
+        :param list header_names: Names of headers to store
+        """
+        key = config.cache_key(format, egrid)
+        entry = self.cache_entry(config, format, egrid, header_names)
+        if entry is not None:
+            return entry, None
+
+        fetch, deadline, leader = self.start_fetch(config, key)
+        if leader:
+            # fetch document in background, independent of this request
+            Thread(
+                target=self.refresh_document,
+                args=(config, format, egrid, header_names, fetch),
+                name='oereb_fetch', daemon=True
+            ).start()
+
+        # wait for pending request for document
+        try:
+            failed = fetch.result(max(deadline - time.monotonic(), 0))
+        except TimeoutError:
+            return None, None
+        if failed is not None:
+            return None, failed
+        return config.cache.get(key), None
+
+    def cache_entry(self, config, format, egrid, header_names):
+        """Return (open file, metadata) of cached ÖREB document or None if
+        not cached.
+
+        Stale documents are refreshed in the background.
+
+        :param OerebInfoConfig config: Compiled ÖREB config
+        :param str format: Document format (xml, json or pdf)
+        :param str egrid: EGRID
+        :param list header_names: Names of headers to store on refresh
+        """
+        key = config.cache_key(format, egrid)
+        entry = config.cache.get(key)
+        if entry is not None and time.time() >= entry[1]['expires']:
+            fetch, deadline, leader = self.start_fetch(config, key)
+            if leader:
+                # refresh stale document in background
+                Thread(
+                    target=self.refresh_document,
+                    args=(config, format, egrid, header_names, fetch),
+                    name='oereb_refresh', daemon=True
+                ).start()
+        return entry
+
+    def refresh_document(self, config, format, egrid, header_names, fetch):
+        """Store or replace cached ÖREB document with document from ÖREB
+        service, and finish pending ÖREB service request.
+
+        :param OerebInfoConfig config: Compiled ÖREB config
+        :param str format: Document format (xml, json or pdf)
+        :param str egrid: EGRID
+        :param list header_names: Names of headers to store
+        :param Future fetch: Future of pending ÖREB service request
+        """
+        failed = None
+        try:
+            failed = self.store_document(config, format, egrid, header_names)
+        finally:
+            self.finish_fetch(config.cache_key(format, egrid), fetch, failed)
+
+    def store_document(self, config, format, egrid, header_names):
+        """Store document from ÖREB service in cache.
+
+        Return (status, headers, body) of an unsuccessful response of
+        ÖREB service, to be shared with waiting requests, or None.
+
+        :param OerebInfoConfig config: Compiled ÖREB config
+        :param str format: Document format (xml, json or pdf)
+        :param str egrid: EGRID
+        :param list header_names: Names of headers to store
+        """
+        try:
+            req = self.upstream_request(config, format, egrid)
+            if req.status_code != 200:
+                self.logger.warning(
+                    "Could not cache ÖREB %s for %s: "
+                    "ÖREB service returned status %s",
+                    format, egrid, req.status_code
+                )
+                return self.shared_error(req, header_names)
+
+            writer = config.cache.writer(
+                config.cache_key(format, egrid), config.cache_ttl[format],
+                {
+                    'headers': self.upstream_client.proxy_headers(
+                        req, header_names
+                    )
+                }
+            )
+            for chunk in self.cache_chunks(
+                writer,
+                req.iter_content(chunk_size=self.upstream_client.CHUNK_SIZE)
+            ):
+                pass
+            return None
+        except Exception as e:
+            self.logger.error(
+                "Could not cache ÖREB %s for %s:\n%s" % (format, egrid, e)
+            )
+            return None
+
+    def shared_error(self, req, header_names):
+        """Read unsuccessful response of ÖREB service and return
+        (status, headers, body), or None if its body exceeds
+        MAX_SHARED_ERROR_SIZE.
+
+        :param Response req: Upstream response with stream=True
+        :param list header_names: Names of headers to forward
+        """
+        try:
+            body = b''
+            for chunk in req.iter_content(
+                chunk_size=self.upstream_client.CHUNK_SIZE
+            ):
+                body += chunk
+                if len(body) > self.MAX_SHARED_ERROR_SIZE:
+                    return None
+            return (
+                req.status_code,
+                self.upstream_client.proxy_headers(req, header_names),
+                body
+            )
+        finally:
+            req.close()
+
+    def start_fetch(self, config, key):
+        """Register pending ÖREB service request for cache key.
+
+        Return (Future, deadline, True) if the caller should send the
+        request, or (Future, deadline, False) of an already pending request.
+        The Future is resolved with the result of refresh_document.
+
+        :param OerebInfoConfig config: Compiled ÖREB config
+        :param str key: Cache key
+        """
+        now = time.monotonic()
+        with self.fetches_lock:
+            fetch = self.fetches.get(key)
+            if fetch is not None and now < fetch[1]:
+                return fetch[0], fetch[1], False
+
+            deadline = now + config.timeout + self.FETCH_TIMEOUT_MARGIN
+            self.fetches[key] = (Future(), deadline)
+            return self.fetches[key][0], deadline, True
+
+    def finish_fetch(self, key, fetch, failed=None):
+        """Unregister pending ÖREB service request and notify waiting
+        requests.
+
+        :param str key: Cache key
+        :param Future fetch: Future of pending ÖREB service request
+        :param tuple failed: Optional (status, headers, body) of
+                             unsuccessful response of ÖREB service
+        """
+        with self.fetches_lock:
+            pending = self.fetches.get(key)
+            if pending is not None and pending[0] is fetch:
+                del self.fetches[key]
+        fetch.set_result(failed)
+
+    def file_response(self, data, meta):
+        """Return response for cached ÖREB document.
+
+        The cached file is sent directly, so that the server can use
+        sendfile if supported.
+
+        :param file data: Open file of cached document
+        :param obj meta: Metadata of cached document
+        """
+        headers = meta.get('headers', {})
+        response = send_file(
+            data,
+            mimetype=headers.get('content-type', 'application/octet-stream'),
+            conditional=False, etag=False
+        )
+        response.content_length = os.fstat(data.fileno()).st_size
+        for name in ['content-disposition', 'etag', 'last-modified']:
+            if name in headers:
+                response.headers[name] = headers[name]
+        return response.make_conditional(request)
+
+    def cache_chunks(self, writer, chunks):
+        """Yield chunks while writing them to a new cache entry, which is
+        only stored if all chunks have been sent.
+
+        :param DiskCacheWriter writer: Writer for cache entry
+        :param iter chunks: Response content chunks
+        """
+        completed = False
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+                yield chunk
+            completed = True
+        finally:
+            if completed:
+                try:
+                    writer.commit()
+                except Exception as e:
+                    self.logger.error(
+                        "Could not store ÖREB document in cache:\n%s" % e
+                    )
+                    writer.discard()
+            else:
+                writer.discard()
+
+    def upstream_request(self, config, format, egrid):
+        """Send request to ÖREB service for document format and return
+        response.
+
+        :param OerebInfoConfig config: Compiled ÖREB config
+        :param str format: Document format (xml, json or pdf)
+        :param str egrid: EGRID
+        """
+        if format == 'xml':
+            return self.xml_response(config, egrid)
+        elif format == 'json':
+            return self.json_response(config, egrid)
+        else:
+            return self.pdf_response(config, egrid)
+
+    def xml_response(self, config, egrid):
         """Send XML request to ÖREB XML service and return response.
 
+        :param OerebInfoConfig config: Compiled ÖREB config
         :param str egrid: EGRID
         """
-        url = self.oereb_xml_url.format(egrid=egrid)
+        url = config.oereb_xml_url.format(egrid=egrid)
         headers = {
             'accept': 'application/xml'
         }
         self.logger.info("Forward XML request to %s", url)
-        return requests.get(url, headers=headers, timeout=120, stream=True)
+        return config.session.get(
+            url, headers=headers, timeout=config.timeout, stream=True,
+            latency_key='oereb_xml'
+        )
 
-    def json_response(self, egrid):
+    def json_response(self, config, egrid):
         """Send JSON request to ÖREB JSON service and return response.
 
+        :param OerebInfoConfig config: Compiled ÖREB config
         :param str egrid: EGRID
         """
-        url = self.oereb_json_url.format(egrid=egrid)
+        url = config.oereb_json_url.format(egrid=egrid)
         headers = {
             'accept': 'application/json'
         }
         self.logger.info("Forward JSON request to %s", url)
-        return requests.get(url, headers=headers, timeout=120, stream=True)
+        return config.session.get(
+            url, headers=headers, timeout=config.timeout, stream=True,
+            latency_key='oereb_json'
+        )
 
-    def pdf_response(self, egrid):
+    def pdf_response(self, config, egrid):
         """Send PDF request to ÖREB PDF service and return response.
 
+        :param OerebInfoConfig config: Compiled ÖREB config
         :param str egrid: EGRID
         """
-        url = self.oereb_pdf_url.format(egrid=egrid)
+        url = config.oereb_pdf_url.format(egrid=egrid)
         headers = {
             'accept': 'application/pdf'
         }
         self.logger.info("Forward PDF request to %s", url)
-        return requests.get(url, headers=headers, timeout=120, stream=True)
+        return config.session.get(
+            url, headers=headers, timeout=config.timeout, stream=True,
+            latency_key='oereb_pdf'
+        )
+
+
+class OerebInfoConfig:
+    """OerebInfoConfig class
+
+    Compiled ÖREB config for a tenant, with validated service URLs.
+    """
+
+    def __init__(self, config, tenant, registry, upstream_client):
+        """Constructor
+
+        :param RuntimeConfig config: Tenant config
+        :param str tenant: Tenant name
+        :param TenantRegistry registry: Registry for disk caches
+        :param UpstreamClient upstream_client: Shared upstream HTTP sessions
+        """
+        self.tenant = tenant
+        self.session = upstream_client.session(config)
+
+        # ÖREB-Webservice config
+        self.oereb_json_url = config.get('oereb_json_url')
+        self.oereb_xml_url = config.get('oereb_xml_url')
+        self.oereb_pdf_url = config.get('oereb_pdf_url')
+
+        # timeout in seconds for ÖREB-Webservice requests
+        self.timeout = float(config.get('oereb_timeout', 120))
+
+        if self.oereb_json_url is None:
+            raise Exception("Environment variable OEREB_JSON_URL is not set")
+        if self.oereb_xml_url is None:
+            raise Exception("Environment variable OEREB_XML_URL is not set")
+        if self.oereb_pdf_url is None:
+            raise Exception("Environment variable OEREB_PDF_URL is not set")
+
+        # disk cache for ÖREB documents
+        self.cache = None
+        cache_dir = config.get('oereb_cache_dir')
+        if cache_dir:
+            cache_dir = os.path.join(cache_dir, tenant)
+            max_size = int(
+                float(config.get('oereb_cache_max_size', 1024)) * 1048576
+            )
+            stale_ttl = float(config.get('oereb_cache_stale_ttl', 0))
+            self.cache = registry.get(
+                tenant, 'oereb_cache', [cache_dir, max_size, stale_ttl],
+                lambda: DiskCache(cache_dir, max_size, stale_ttl)
+            )
+        self.cache_ttl = {
+            'xml': float(config.get('oereb_cache_xml_ttl', 3600)),
+            'json': float(config.get('oereb_cache_json_ttl', 3600)),
+            'pdf': float(config.get('oereb_cache_pdf_ttl', 3600))
+        }
+
+    def cache_key(self, format, egrid):
+        """Return cache key for ÖREB document.
+
+        :param str format: Document format (xml, json or pdf)
+        :param str egrid: EGRID
+        """
+        return "%s/%s/%s" % (self.tenant, format, egrid)
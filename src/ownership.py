@@ -0,0 +1,165 @@
+class Record:
+    """Record class
+
+    Base class of compact ownership records collected from GBDBS responses.
+    """
+
+    __slots__ = ()
+
+    # data attributes, in addition to links to other records
+    FIELDS = ()
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, ", ".join([
+            "%s=%r" % (field, getattr(self, field)) for field in self.FIELDS
+        ]))
+
+
+class Grundstueck(Record):
+    """Grundstueck class
+
+    Grundstueck by its GBDBS Nummer.
+    """
+
+    FIELDS = (
+        'egrid', 'art', 'nummer', 'nummer_zusatz', 'bfsnr',
+        'municipality_name', 'beschreibung'
+    )
+    __slots__ = FIELDS
+
+    def __init__(self, egrid, art, nummer, nummer_zusatz, bfsnr,
+                 municipality_name, beschreibung):
+        """Constructor
+
+        :param str egrid: EGRID
+        :param str art: Type of Grundstueck
+        :param str nummer: Grundstueck number
+        :param str nummer_zusatz: Grundstueck number suffix
+        :param str bfsnr: BFS number of municipality
+        :param str municipality_name: Municipality name
+        :param str beschreibung: Beschreibung of StockwerksEinheit
+        """
+        self.egrid = egrid
+        self.art = art
+        self.nummer = nummer
+        self.nummer_zusatz = nummer_zusatz
+        self.bfsnr = bfsnr
+        self.municipality_name = municipality_name
+        self.beschreibung = beschreibung
+
+
+class Person(Record):
+    """Person class
+
+    Natural or legal Person with optional address.
+    """
+
+    FIELDS = (
+        'name', 'vornamen', 'strasse', 'hausnummer', 'plz', 'ort', 'land'
+    )
+    # formatted address is memoized in 'adresse'
+    __slots__ = FIELDS + ('adresse',)
+
+    def __init__(self, name, vornamen, strasse=None, hausnummer=None,
+                 plz=None, ort=None, land=None):
+        """Constructor
+
+        :param str name: Name or company name
+        :param str vornamen: First names
+        :param str strasse: Street
+        :param str hausnummer: House number
+        :param str plz: Postal code
+        :param str ort: Place
+        :param str land: Country
+        """
+        self.name = name
+        self.vornamen = vornamen
+        self.strasse = strasse
+        self.hausnummer = hausnummer
+        self.plz = plz
+        self.ort = ort
+        self.land = land
+        self.adresse = None
+
+
+class Gemeinschaft(Record):
+    """Gemeinschaft class
+
+    Community of Personen or further Gemeinschaften.
+    """
+
+    FIELDS = ('name', 'art', 'teilhaber')
+    # Person and Gemeinschaft records of Teilhaber are linked in 'mitglieder'
+    __slots__ = FIELDS + ('mitglieder',)
+
+    def __init__(self, name, art, teilhaber):
+        """Constructor
+
+        :param str name: Name
+        :param str art: Type of Gemeinschaft
+        :param list[str] teilhaber: GBDBS Nummern of Mitglieder
+        """
+        self.name = name
+        self.art = art
+        self.teilhaber = teilhaber
+        self.mitglieder = []
+
+
+class Recht(Record):
+    """Recht class
+
+    Current EigentumAnteil of a Berechtigte on a Grundstueck.
+    """
+
+    FIELDS = (
+        'nummer', 'eigentumsform', 'anteil_zaehler', 'anteil_nenner',
+        'berechtigte'
+    )
+    # Person, Gemeinschaft or Grundstueck record of Berechtigte is linked in
+    # 'berechtigter'
+    __slots__ = FIELDS + ('berechtigter',)
+
+    def __init__(self, nummer, eigentumsform, anteil_zaehler, anteil_nenner,
+                 berechtigte):
+        """Constructor
+
+        :param str nummer: GBDBS Nummer
+        :param str eigentumsform: Eigentumsform
+        :param str anteil_zaehler: Numerator of Anteil
+        :param str anteil_nenner: Denominator of Anteil
+        :param str berechtigte: GBDBS Nummer of Berechtigte
+        """
+        self.nummer = nummer
+        self.eigentumsform = eigentumsform
+        self.anteil_zaehler = anteil_zaehler
+        self.anteil_nenner = anteil_nenner
+        self.berechtigte = berechtigte
+        self.berechtigter = None
+
+
+def link_records(grundstuecke, personen, rechte, logger):
+    """Link Berechtigte of Rechte and Mitglieder of Gemeinschaften to their
+    records.
+
+    Berechtigte are looked up in Personen first, then in Grundstuecke.
+
+    :param obj grundstuecke: Lookup for Grundstueck by Nummer
+    :param obj personen: Lookup for Person or Gemeinschaft by Nummer
+    :param list[Recht] rechte: List of Recht
+    :param Logger logger: Application logger
+    """
+    for recht in rechte:
+        recht.berechtigter = (
+            personen.get(recht.berechtigte) or
+            grundstuecke.get(recht.berechtigte)
+        )
+
+    for person in personen.values():
+        if isinstance(person, Gemeinschaft):
+            person.mitglieder = []
+            for teilhaber_id in person.teilhaber:
+                mitglied = personen.get(teilhaber_id)
+                if mitglied is not None:
+                    person.mitglieder.append(mitglied)
+                else:
+                    logger.error("Could not find Mitglied %s" % teilhaber_id)
@@ -1,7 +1,27 @@
-from flask import json, render_template, Response
+import hashlib
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+
+from flask import (
+    json, render_template, request, Response, stream_with_context
+)
 from sqlalchemy.sql import text as sql_text
 from qwc_services_core.tenant_handler import TenantHandler
 
+from geometry import distance_to_rings, parse_polygon_wkt
+from lru_cache import LRUCache
+from spatial_index import PlotIndex
+from tenant_registry import TenantRegistry, config_values
+
+
+# max number of pooled DB connections used concurrently by detailed info
+# sub-queries (per process)
+DETAILED_INFO_MAX_WORKERS = int(
+    os.environ.get('DETAILED_INFO_MAX_WORKERS', 4)
+)
+
 
 class PlotInfo:
     """PlotInfo class
@@ -59,6 +79,76 @@ class PlotInfo:
         WHERE g.egrid = :egrid
     """
 
+    """SQL for basic info query for multiple plots
+    input: egrids, srid, buffer
+    output: egrid, custom fields (see BASIC_INFO_FIELDS)
+    """
+    DEFAULT_BASIC_INFO_BY_EGRIDS_SQL = """
+        SELECT
+            g.egrid, g.nummer, g.art_txt, g.flaechenmass,
+            ST_AsText(ST_Simplify(g.geometrie, 0.01)) AS geom,
+            gem.gemeindename || ' (' || gem.bfs_nr || ')' AS gemeinde,
+            'TODO' as grundbuch,
+            ST_XMin(g.geometrie) as xmin,
+            ST_YMin(g.geometrie) as ymin,
+            ST_XMax(g.geometrie) as xmax,
+            ST_YMax(g.geometrie) as ymax
+        FROM
+            agi_mopublic_pub.mopublic_grundstueck g
+            JOIN agi_mopublic_pub.mopublic_gemeindegrenze gem
+                ON gem.bfs_nr = g.bfs_nr
+        WHERE g.egrid = ANY(:egrids)
+    """
+
+    """SQL for basic info query for multiple positions
+    input: xs, ys, srid, buffer
+    output: idx (1-based position in xs, ys), egrid,
+            custom fields (see BASIC_INFO_FIELDS)
+    """
+    DEFAULT_BASIC_INFO_BATCH_SQL = """
+        SELECT
+            p.idx,
+            g.egrid, g.nummer, g.art_txt, g.flaechenmass,
+            ST_AsText(ST_Simplify(g.geometrie, 0.01)) AS geom,
+            gem.gemeindename || ' (' || gem.bfs_nr || ')' AS gemeinde,
+            'TODO' as grundbuch,
+            ST_XMin(g.geometrie) as xmin,
+            ST_YMin(g.geometrie) as ymin,
+            ST_XMax(g.geometrie) as xmax,
+            ST_YMax(g.geometrie) as ymax
+        FROM
+            unnest(
+                CAST(:xs AS double precision[]),
+                CAST(:ys AS double precision[])
+            ) WITH ORDINALITY AS p(x, y, idx)
+            JOIN agi_mopublic_pub.mopublic_grundstueck g
+                ON ST_Intersects(
+                    g.geometrie,
+                    ST_Buffer(
+                        ST_SetSRID(ST_Point(p.x, p.y), :srid),
+                        :buffer
+                    )
+                )
+            JOIN agi_mopublic_pub.mopublic_gemeindegrenze gem
+                ON gem.bfs_nr = g.bfs_nr
+        ORDER BY p.idx;
+    """
+
+    """SQL for spatial plot index query
+    input: -
+    output: egrid, xmin, ymin, xmax, ymax, optional geom
+    """
+    DEFAULT_SPATIAL_INDEX_SQL = """
+        SELECT
+            g.egrid,
+            ST_XMin(g.geometrie) as xmin,
+            ST_YMin(g.geometrie) as ymin,
+            ST_XMax(g.geometrie) as xmax,
+            ST_YMax(g.geometrie) as ymax
+        FROM
+            agi_mopublic_pub.mopublic_grundstueck g;
+    """
+
     # custom info fields as [{<query field>: <label>}]
     DEFAULT_BASIC_INFO_FIELDS = [
         {'gemeinde': 'Gemeinde'},
@@ -85,6 +175,22 @@ class PlotInfo:
         ORDER BY f.flurname;
     """
 
+    """SQL for Flurnamen query for multiple plots
+    input: egrids
+    output: egrid, flurname
+    """
+    DEFAULT_FLURNAMEN_BULK_SQL = """
+        SELECT
+            g.egrid, f.flurname
+        FROM
+            agi_mopublic_pub.mopublic_flurname f
+            JOIN agi_mopublic_pub.mopublic_grundstueck g
+                ON ST_Intersects(f.geometrie, g.geometrie)
+                AND NOT ST_Touches(f.geometrie, g.geometrie)
+        WHERE g.egrid = ANY(:egrids)
+        ORDER BY g.egrid, f.flurname;
+    """
+
     """SQL for additional plot information query
     input: egrid
     output: flaechenmass, art, art_txt, grundbuchamt, nfgeometer
@@ -176,6 +282,81 @@ class PlotInfo:
             ST_Area(ST_Intersection(sdr.geometrie, g.geometrie)) DESC;
     """
 
+    """SQL for combined additional plot information query
+    Resolves the plot geometry once and returns land cover fractions,
+    Flurnamen, building addresses and SDR infos as aggregated JSON columns.
+    input: egrid
+    output: flaechenmass, art, grundbuchamt, nfgeometer,
+            landcover [{area, area_percent, art, art_txt}],
+            flurnamen [flurname],
+            addresses [{strassenname, hausnummer, plz, ortschaft}],
+            sdr [{nummer, art, art_txt, area}]
+    """
+    DEFAULT_DETAILED_INFO_COMBINED_SQL = """
+        WITH grundstueck AS (
+            SELECT
+                g.flaechenmass, g.art, g.geometrie
+            FROM
+                agi_mopublic_pub.mopublic_grundstueck g
+            WHERE g.egrid = :egrid LIMIT 1
+        )
+        SELECT
+            g.flaechenmass, g.art, 'TODO' AS grundbuchamt, 'TODO' AS nfgeometer,
+            (
+                SELECT json_agg(lc ORDER BY lc.area DESC)
+                FROM (
+                    SELECT
+                        SUM(ST_Area(ST_Intersection(b.geometrie, g.geometrie)))
+                            AS area,
+                        SUM(
+                            ST_Area(ST_Intersection(b.geometrie, g.geometrie))
+                            / ST_Area(g.geometrie)
+                        ) * 100 AS area_percent,
+                        b.art, b.art_txt
+                    FROM
+                        agi_mopublic_pub.mopublic_bodenbedeckung b
+                    WHERE ST_Intersects(b.geometrie, g.geometrie)
+                        AND NOT ST_Touches(b.geometrie, g.geometrie)
+                    GROUP BY b.art, b.art_txt
+                ) lc
+            ) AS landcover,
+            (
+                SELECT json_agg(f.flurname ORDER BY f.flurname)
+                FROM
+                    agi_mopublic_pub.mopublic_flurname f
+                WHERE ST_Intersects(f.geometrie, g.geometrie)
+                    AND NOT ST_Touches(f.geometrie, g.geometrie)
+            ) AS flurnamen,
+            (
+                SELECT json_agg(a ORDER BY a.strassenname, a.hausnummer)
+                FROM (
+                    SELECT
+                        a.strassenname, a.hausnummer, a.plz, a.ortschaft
+                    FROM
+                        agi_mopublic_pub.mopublic_gebaeudeadresse a
+                    WHERE ST_Contains(g.geometrie, a.lage)
+                ) a
+            ) AS addresses,
+            (
+                SELECT json_agg(s ORDER BY s.area DESC)
+                FROM (
+                    SELECT
+                        sdr.nummer, sdr.art, sdr.art_txt,
+                        ST_Area(ST_Intersection(sdr.geometrie, g.geometrie))
+                            AS area
+                    FROM
+                        agi_mopublic_pub.mopublic_grundstueck sdr
+                    WHERE ST_Intersects(sdr.geometrie, g.geometrie)
+                        AND NOT ST_Touches(sdr.geometrie, g.geometrie)
+                        AND CASE
+                            WHEN g.art = 0 THEN sdr.art != 0
+                            ELSE sdr.art = 0
+                        END
+                ) s
+            ) AS sdr
+        FROM grundstueck g;
+    """
+
     # lookup for land cover colors
     DEFAULT_LCSFC_COLORS = {
         'Gebaeude': '#ffc8c8',
@@ -237,89 +418,65 @@ class PlotInfo:
         self.config_handler = config_handler
         self.db_engine = db_engine
         self.logger = logger
+        self.tenant_handler = TenantHandler(logger)
 
-    def load_config(self):
-        tenant_handler = TenantHandler(self.logger)
-        tenant = tenant_handler.tenant()
-        config = self.config_handler.tenant_config(tenant)
-
-        db_url = config.get('db_url', 'postgresql:///?service=sogis_services')
-        self.db = self.db_engine.db_engine(db_url)
-
-        # BASIC_INFO_SQL
-        self.basic_info_sql = config.get(
-            'basic_info_sql', self.DEFAULT_BASIC_INFO_SQL)
-        self.basic_info_by_egrid_sql = config.get(
-            'basic_info_by_egrid_sql', self.DEFAULT_BASIC_INFO_BY_EGRID_SQL
+        # thread pool for concurrent detailed info sub-queries
+        self.executor = ThreadPoolExecutor(
+            max_workers=DETAILED_INFO_MAX_WORKERS,
+            thread_name_prefix='detailed_info'
         )
+        # guard for available worker slots, to avoid queueing sub-queries
+        # behind other requests and exhausting the DB connection pool
+        self.worker_slots = BoundedSemaphore(DETAILED_INFO_MAX_WORKERS)
 
-        # BASIC_INFO_FIELDS
-        basic_info_fields = config.get(
-            'basic_info_fields', self.DEFAULT_BASIC_INFO_FIELDS)
-        self.basic_info_fields = []
-        for field in basic_info_fields:
-            try:
-                (name, label), = field.items()
-                self.basic_info_fields.append((name, label))
-            except Exception as e:
-                self.logger.error(
-                    "Could not get custom info field from '%s':\n%s"
-                    % (field, e)
-                )
-
-        # FLURNAMEN_SQL
-        self.flurnamen_sql = config.get(
-            'flurnamen_sql', self.DEFAULT_FLURNAMEN_SQL
-        )
-
-        # DETAILED_INFO_SQL
-        self.detailed_info_sql = config.get(
-            'detailed_info_sql', self.DEFAULT_DETAILED_INFO_SQL
-        )
+        # caches and spatial indexes of tenants, kept across config rebuilds
+        self.registry = TenantRegistry()
 
-        # LAND_COVER_FRACTIONS_SQL
-        self.land_cover_fractions_sql = config.get(
-            'land_cover_fractions_sql', self.DEFAULT_LAND_COVER_FRACTIONS_SQL
-        )
-
-        # BUILDING_ADDRESSES_SQL
-        self.building_addresses_sql = config.get(
-            'building_addresses_sql', self.DEFAULT_BUILDING_ADDRESSES_SQL
-        )
-
-        # SDR_INFOS_LIEGENSCHAFT_SQL
-        self.sdr_infos_liegenschaft_sql = config.get(
-            'sdr_infos_liegenschaft_sql',
-            self.DEFAULT_SDR_INFOS_LIEGENSCHAFT_SQL
-        )
-
-        # SDR_INFOS_SDR_SQL
-        self.sdr_infos_sdr_sql = config.get(
-            'sdr_infos_sdr_sql', self.DEFAULT_SDR_INFOS_SDR_SQL
-        )
+    def load_config(self):
+        """Return compiled PlotInfo config for current tenant.
 
-        # LCSFC_COLORS
-        self.lcsfc = config.get(
-            'lcsfc_colors', self.DEFAULT_LCSFC_COLORS
-        )
+        The compiled config is cached per tenant and rebuilt if the tenant
+        config file has changed.
+        """
+        tenant = self.tenant_handler.tenant()
+        config = self.tenant_handler.handler('plotinfo', 'plot_info', tenant)
+        if config is None:
+            config = self.tenant_handler.register_handler(
+                'plot_info', tenant, PlotInfoConfig(
+                    self.config_handler.tenant_config(tenant), tenant,
+                    self.registry, self.db_engine, self.logger
+                )
+            )
+        return config
 
-    def basic_info(self, x, y):
+    def basic_info(self, x, y, geom_format=None):
         """Return basic plot information at coordinates as JSON.
 
         :param float x: X coordinate in LV95
         :param float y: Y coordinate in LV95
+        :param GeometryFormat geom_format: Optional geometry output format
         """
-        self.load_config()
+        config = self.load_config()
         try:
-            sql = sql_text(self.basic_info_sql)
-
-            conn = self.db.connect()
-
-            result = conn.execute(
-                sql, {"x": x, "y": y, "srid": self.QUERY_SRID, "buffer": self.QUERY_BUFFER}
-            )
-            plots = self.format_basic_info(result, conn)
-            conn.close()
+            plots = None
+            if config.spatial_index is not None:
+                plots = self.get_basic_info_indexed(config, x, y)
+            if plots is None and config.basic_info_cache is not None:
+                plots = self.get_basic_info_cached(config, x, y)
+
+            if plots is not None:
+                # encode cached plot geometries
+                plots = self.encode_geometries(plots, geom_format)
+            else:
+                conn = config.db.connect()
+
+                result = conn.execute(
+                    config.basic_info_sql, {"x": x, "y": y, "srid": self.QUERY_SRID, "buffer": self.QUERY_BUFFER}
+                )
+                plots = self.format_basic_info(
+                    config, result, conn, geom_format
+                )
+                conn.close()
 
             return {
                 'plots': plots,
@@ -332,21 +489,196 @@ class PlotInfo:
                 'success': False
             }
 
-    def basic_info_egrid(self, egrid):
+    def get_basic_info_indexed(self, config, x, y):
+        """Return basic plot information at coordinates using the spatial
+        plot index.
+
+        Candidate plots are resolved locally from the index, and their
+        attributes are queried by EGRID, unless cached.
+
+        Return None if the spatial index is not yet loaded.
+
+        :param PlotInfoConfig config: Compiled PlotInfo config
+        :param float x: X coordinate in LV95
+        :param float y: Y coordinate in LV95
+        """
+        buffer = self.QUERY_BUFFER
+        candidates = config.spatial_index.candidates(
+            x - buffer, y - buffer, x + buffer, y + buffer
+        )
+        if candidates is None:
+            return None
+
+        # filter by optional index geometries
+        egrids = []
+        for egrid, geom in candidates:
+            if geom is not None:
+                rings = parse_polygon_wkt(geom)
+                if rings and distance_to_rings(rings, x, y) > buffer:
+                    continue
+            egrids.append(egrid)
+
+        # get plot attributes
+        plots = {}
+        missing_egrids = []
+        for egrid in egrids:
+            cached = config.plot_attributes_cache.get(egrid)
+            if cached is not None:
+                plots[egrid] = cached
+            else:
+                missing_egrids.append(egrid)
+
+        if missing_egrids:
+            conn = config.db.connect()
+            try:
+                result = self.query_basic_info_by_egrids(
+                    config, missing_egrids, conn
+                )
+                for plot in self.format_basic_info(config, result, conn):
+                    cached = (plot, parse_polygon_wkt(plot['geom']))
+                    config.plot_attributes_cache.set(plot['egrid'], cached)
+                    plots[plot['egrid']] = cached
+            finally:
+                conn.close()
+
+        # filter plots within buffer around position
+        result = []
+        for egrid in egrids:
+            if egrid not in plots:
+                continue
+            plot, rings = plots[egrid]
+            if rings and distance_to_rings(rings, x, y) > buffer:
+                continue
+            result.append(plot)
+
+        return result
+
+    def get_basic_info_cached(self, config, x, y):
+        """Return basic plot information at coordinates from spatial cache.
+
+        Coordinates are quantized to grid cells. The plots for a cell are
+        queried once with a buffer covering the whole cell, and are then
+        filtered for each position by their distance to the plot geometry.
+
+        Grid cells only hold the EGRIDs of their plots, while the plots
+        with their parsed geometries are cached once per EGRID. Plots which
+        have been evicted from the plot cache are queried by EGRID.
+
+        :param PlotInfoConfig config: Compiled PlotInfo config
+        :param float x: X coordinate in LV95
+        :param float y: Y coordinate in LV95
+        """
+        cell_size = config.basic_info_cache_cell_size
+        cell = (math.floor(x / cell_size), math.floor(y / cell_size))
+
+        egrids = config.basic_info_cache.get(cell)
+        if egrids is None:
+            # query plots for cell center, with buffer covering whole cell
+            conn = config.db.connect()
+            try:
+                result = conn.execute(
+                    config.basic_info_sql, {
+                        "x": (cell[0] + 0.5) * cell_size,
+                        "y": (cell[1] + 0.5) * cell_size,
+                        "srid": self.QUERY_SRID,
+                        "buffer": (
+                            self.QUERY_BUFFER + cell_size * math.sqrt(0.5)
+                        )
+                    }
+                )
+                plots = self.format_basic_info(config, result, conn)
+            finally:
+                conn.close()
+
+            candidates = self.cache_plots(config, plots)
+            if all(rings for plot, rings in candidates):
+                config.basic_info_cache.set(
+                    cell, tuple(plot['egrid'] for plot, rings in candidates)
+                )
+        else:
+            cached_plots = {}
+            missing_egrids = []
+            for egrid in egrids:
+                cached = config.basic_info_plot_cache.get(egrid)
+                if cached is not None:
+                    cached_plots[egrid] = cached
+                else:
+                    missing_egrids.append(egrid)
+
+            if missing_egrids:
+                conn = config.db.connect()
+                try:
+                    result = self.query_basic_info_by_egrids(
+                        config, missing_egrids, conn
+                    )
+                    for cached in self.cache_plots(
+                        config, self.format_basic_info(config, result, conn)
+                    ):
+                        cached_plots[cached[0]['egrid']] = cached
+                finally:
+                    conn.close()
+
+            candidates = [
+                cached_plots[egrid] for egrid in egrids
+                if egrid in cached_plots
+            ]
+
+        # filter plots within buffer around position
+        plots = []
+        for plot, rings in candidates:
+            xmin, ymin, xmax, ymax = plot['bbox']
+            if (
+                x < xmin - self.QUERY_BUFFER or x > xmax + self.QUERY_BUFFER
+                or y < ymin - self.QUERY_BUFFER
+                or y > ymax + self.QUERY_BUFFER
+            ):
+                # outside bbox
+                continue
+            if rings and distance_to_rings(rings, x, y) > self.QUERY_BUFFER:
+                continue
+            plots.append(plot)
+
+        return plots
+
+    def cache_plots(self, config, plots):
+        """Parse plot geometries, store plots with parsed geometries in
+        plot cache of spatial cache, and return list of (plot, rings).
+
+        Plots whose geometry could not be parsed are not cached and are
+        returned with rings None, to be matched by their bbox only.
+
+        :param PlotInfoConfig config: Compiled PlotInfo config
+        :param list plots: Formatted basic plot infos
+        """
+        candidates = []
+        for plot in plots:
+            rings = parse_polygon_wkt(plot['geom'])
+            if rings:
+                config.basic_info_plot_cache.set(plot['egrid'], (plot, rings))
+            else:
+                rings = None
+                self.logger.warning(
+                    "Could not parse geometry of plot %s, "
+                    "matching it by its bbox" % plot['egrid']
+                )
+            candidates.append((plot, rings))
+
+        return candidates
+
+    def basic_info_egrid(self, egrid, geom_format=None):
         """Return basic plot information given the plot EGRID.
 
         :param string egrid: The plot EGRID
+        :param GeometryFormat geom_format: Optional geometry output format
         """
-        self.load_config()
+        config = self.load_config()
         try:
-            sql = sql_text(self.basic_info_by_egrid_sql)
-
-            conn = self.db.connect()
+            conn = config.db.connect()
 
             result = conn.execute(
-                sql, {"egrid": egrid, "srid": self.QUERY_SRID, "buffer": self.QUERY_BUFFER}
+                config.basic_info_by_egrid_sql, {"egrid": egrid, "srid": self.QUERY_SRID, "buffer": self.QUERY_BUFFER}
             )
-            plots = self.format_basic_info(result, conn)
+            plots = self.format_basic_info(config, result, conn, geom_format)
             conn.close()
 
             return {
@@ -360,18 +692,276 @@ class PlotInfo:
                 'success': False
             }
 
-    def format_basic_info(self, result, conn):
-        """ Format the basic info results. """
+    def basic_info_batch(self, positions, geom_format=None):
+        """Return basic plot information for multiple coordinates as
+        streamed NDJSON, in input order.
+
+        Positions are resolved in chunks with a single set-based query per
+        chunk.
+
+        :param iter positions: Positions as [x, y] or {"x": x, "y": y}
+                               in LV95
+        :param GeometryFormat geom_format: Optional geometry output format
+        """
+        config = self.load_config()
+
+        def generate():
+            conn = None
+            try:
+                chunk = []
+                for position in positions:
+                    chunk.append(self.parse_position(position))
+                    if len(chunk) >= config.batch_chunk_size:
+                        if conn is None:
+                            conn = config.db.connect()
+                        yield from self.basic_info_batch_chunk(
+                            config, chunk, conn, geom_format
+                        )
+                        chunk = []
+                if chunk:
+                    if conn is None:
+                        conn = config.db.connect()
+                    yield from self.basic_info_batch_chunk(
+                        config, chunk, conn, geom_format
+                    )
+            except Exception as e:
+                self.logger.error(e)
+                yield json.dumps({
+                    'error': str(e),
+                    'success': False
+                }) + "\n"
+            finally:
+                if conn is not None:
+                    conn.close()
+
+        return Response(
+            stream_with_context(generate()),
+            content_type='application/x-ndjson; charset=utf-8'
+        )
+
+    def basic_info_egrid_batch(self, egrids, geom_format=None):
+        """Return basic plot information for multiple EGRIDs as streamed
+        NDJSON, in input order.
+
+        EGRIDs are resolved in chunks with a single set-based query per
+        chunk.
+
+        :param iter egrids: Plot EGRIDs
+        :param GeometryFormat geom_format: Optional geometry output format
+        """
+        config = self.load_config()
+
+        def generate():
+            conn = None
+            try:
+                chunk = []
+                for egrid in egrids:
+                    chunk.append(egrid if isinstance(egrid, str) else None)
+                    if len(chunk) >= config.batch_chunk_size:
+                        if conn is None:
+                            conn = config.db.connect()
+                        yield from self.basic_info_egrid_batch_chunk(
+                            config, chunk, conn, geom_format
+                        )
+                        chunk = []
+                if chunk:
+                    if conn is None:
+                        conn = config.db.connect()
+                    yield from self.basic_info_egrid_batch_chunk(
+                        config, chunk, conn, geom_format
+                    )
+            except Exception as e:
+                self.logger.error(e)
+                yield json.dumps({
+                    'error': str(e),
+                    'success': False
+                }) + "\n"
+            finally:
+                if conn is not None:
+                    conn.close()
+
+        return Response(
+            stream_with_context(generate()),
+            content_type='application/x-ndjson; charset=utf-8'
+        )
+
+    def basic_info_egrid_batch_chunk(self, config, chunk, conn,
+                                     geom_format=None):
+        """Query basic plot information for a chunk of EGRIDs and yield
+        NDJSON lines in input order.
+
+        :param PlotInfoConfig config: Compiled PlotInfo config
+        :param list chunk: EGRIDs or None if invalid
+        :param Connection conn: DB connection
+        :param GeometryFormat geom_format: Optional geometry output format
+        """
+        # unique valid EGRIDs in chunk
+        egrids = list(dict.fromkeys(
+            egrid for egrid in chunk if egrid is not None
+        ))
+
+        plots = {}
+        if egrids:
+            result = self.query_basic_info_by_egrids(config, egrids, conn)
+            for plot in self.format_basic_info(
+                config, result, conn, geom_format
+            ):
+                plots.setdefault(plot['egrid'], []).append(plot)
+
+        for egrid in chunk:
+            if egrid is None:
+                line = {
+                    'error': "Invalid EGRID",
+                    'success': False
+                }
+            else:
+                line = {
+                    'egrid': egrid,
+                    'plots': plots.get(egrid, []),
+                    'success': True
+                }
+            yield json.dumps(line) + "\n"
+
+    def query_basic_info_by_egrids(self, config, egrids, conn):
+        """Query basic plot information for multiple EGRIDs and return
+        result rows.
+
+        Uses a single set-based query if basic_info_by_egrids_sql is
+        available, or else a query per EGRID with basic_info_by_egrid_sql.
+
+        :param PlotInfoConfig config: Compiled PlotInfo config
+        :param list[str] egrids: EGRIDs
+        :param Connection conn: DB connection
+        """
+        params = {
+            "srid": self.QUERY_SRID,
+            "buffer": self.QUERY_BUFFER
+        }
+        if config.basic_info_by_egrids_sql is not None:
+            return list(conn.execute(
+                config.basic_info_by_egrids_sql, dict(params, egrids=egrids)
+            ))
+
+        rows = []
+        for egrid in egrids:
+            rows += conn.execute(
+                config.basic_info_by_egrid_sql, dict(params, egrid=egrid)
+            )
+        return rows
+
+    def parse_position(self, position):
+        """Return position as (x, y) or None if invalid.
+
+        :param obj position: Position as [x, y] or {"x": x, "y": y}
+        """
+        try:
+            if isinstance(position, dict):
+                return (float(position['x']), float(position['y']))
+            x, y = position
+            return (float(x), float(y))
+        except Exception:
+            return None
+
+    def basic_info_batch_chunk(self, config, chunk, conn, geom_format=None):
+        """Query basic plot information for a chunk of positions and yield
+        NDJSON lines in input order.
+
+        :param PlotInfoConfig config: Compiled PlotInfo config
+        :param list chunk: Positions as (x, y) or None if invalid
+        :param Connection conn: DB connection
+        :param GeometryFormat geom_format: Optional geometry output format
+        """
+        # 1-based indices of valid positions in chunk
+        indices = [i + 1 for i, pos in enumerate(chunk) if pos is not None]
+
+        plots = {}
+        if indices and config.basic_info_batch_sql is None:
+            # query each position with customized basic_info_sql
+            for i in indices:
+                x, y = chunk[i - 1]
+                result = conn.execute(
+                    config.basic_info_sql, {
+                        "x": x,
+                        "y": y,
+                        "srid": self.QUERY_SRID,
+                        "buffer": self.QUERY_BUFFER
+                    }
+                )
+                plots[i - 1] = self.format_basic_info(
+                    config, result, conn, geom_format
+                )
+        elif indices:
+            result = conn.execute(
+                config.basic_info_batch_sql, {
+                    "xs": [chunk[i - 1][0] for i in indices],
+                    "ys": [chunk[i - 1][1] for i in indices],
+                    "srid": self.QUERY_SRID,
+                    "buffer": self.QUERY_BUFFER
+                }
+            )
+            rows = list(result)
+            for row, plot in zip(
+                rows, self.format_basic_info(config, rows, conn, geom_format)
+            ):
+                # map position in query input to index in chunk
+                idx = indices[row.idx - 1] - 1
+                plots.setdefault(idx, []).append(plot)
+
+        for idx, pos in enumerate(chunk):
+            if pos is None:
+                line = {
+                    'error': "Invalid position",
+                    'success': False
+                }
+            else:
+                line = {
+                    'x': pos[0],
+                    'y': pos[1],
+                    'plots': plots.get(idx, []),
+                    'success': True
+                }
+            yield json.dumps(line) + "\n"
+
+    def format_basic_info(self, config, result, conn, geom_format=None):
+        """ Format the basic info results.
+
+        :param PlotInfoConfig config: Compiled PlotInfo config
+        :param iter result: Basic info query result rows
+        :param Connection conn: DB connection
+        :param GeometryFormat geom_format: Optional geometry output format
+        """
+        rows = list(result)
+
+        # get Flurnamen for all plots
+        flurnamen_lookup = None
+        field_names = [name for name, label in config.basic_info_fields]
+        if (
+            '_flurnamen_' in field_names and rows
+            and 'flurnamen' not in rows[0]._mapping
+            and config.flurnamen_bulk_sql is not None
+        ):
+            flurnamen_lookup = self.get_flurnamen_bulk(
+                config, [row.egrid for row in rows], conn
+            )
+
         plots = []
-        for row in result:
+        for row in rows:
             # get values for custom fields
             fields = []
-            for name, label in self.basic_info_fields:
+            for name, label in config.basic_info_fields:
                 if name == '_flurnamen_':
-                    # custom query for Flurnamen
-                    value = ", ".join(
-                        self.get_flurnamen(row.egrid, conn)
-                    )
+                    if 'flurnamen' in row._mapping:
+                        # aggregated Flurnamen from basic info query
+                        flurnamen = row.flurnamen or []
+                        if isinstance(flurnamen, str):
+                            flurnamen = [flurnamen]
+                    elif flurnamen_lookup is not None:
+                        # Flurnamen from bulk query
+                        flurnamen = flurnamen_lookup.get(row.egrid, [])
+                    else:
+                        # custom query for Flurnamen
+                        flurnamen = self.get_flurnamen(config, row.egrid, conn)
+                    value = ", ".join(flurnamen)
                 elif name == 'flaechenmass':
                     # custom format for area
                     value = "%s m<sup>2</sup>" % self.format_number(row.flaechenmass)
@@ -393,48 +983,55 @@ class PlotInfo:
                 'egrid': row.egrid,
                 'label': "%s Nr. %s" % (row.art_txt, row.nummer),
                 'fields': fields,
-                'geom': row.geom,
+                'geom': self.encode_geometry(row.geom, geom_format),
                 'bbox': [row.xmin, row.ymin, row.xmax, row.ymax]
             })
         return plots
 
-    def detailed_info(self, egrid):
-        """Return additional plot information for EGRID as HTML.
+    def encode_geometries(self, plots, geom_format):
+        """Return copies of formatted plots with encoded geometries.
 
-        :param str egrid: EGRID
+        :param list plots: Formatted plots
+        :param GeometryFormat geom_format: Optional geometry output format
         """
-        self.load_config()
-        try:
-            info = {}
+        if geom_format is None or geom_format.is_default():
+            return plots
 
-            sql = sql_text(self.detailed_info_sql)
+        return [
+            dict(plot, geom=self.encode_geometry(plot['geom'], geom_format))
+            for plot in plots
+        ]
 
-            conn = self.db.connect()
+    def encode_geometry(self, wkt, geom_format):
+        """Return plot geometry in geometry output format.
 
-            result = conn.execute(sql, {"egrid": egrid})
-            for row in result:
-                land_cover = self.get_land_cover_fractions(egrid, conn)
-
-                # calculate rounding difference to flaechenmass
-                total_area = 0
-                for lc in land_cover:
-                    total_area += round(lc['area'])
-                rounding_difference = abs(
-                    round(row.flaechenmass) - total_area
-                )
+        :param str wkt: Plot geometry as WKT
+        :param GeometryFormat geom_format: Optional geometry output format
+        """
+        if geom_format is None:
+            return wkt
+        return geom_format.encode(wkt)
 
-                info = {
-                    'egrid': egrid,
-                    'area': row.flaechenmass,
-                    'landcover': land_cover,
-                    'rounding_difference': rounding_difference,
-                    'flurnamen': ", ".join(self.get_flurnamen(egrid, conn)),
-                    'addresses': self.get_building_addresses(egrid, conn),
-                    'sdr': self.get_sdr_infos(egrid, row.art, conn),
-                    'grundbuchamt': row.grundbuchamt,
-                    'nfgeometer': row.nfgeometer
-                }
+    def detailed_info(self, egrid):
+        """Return additional plot information for EGRID as HTML.
 
+        :param str egrid: EGRID
+        """
+        config = self.load_config()
+        try:
+            cached = config.detailed_info_cache.get(egrid)
+            if cached is not None:
+                # rendered HTML from cache
+                html, etag = cached
+                return self.detailed_info_response(html, etag)
+
+            conn = config.db.connect()
+            if config.detailed_info_combined_sql is not None:
+                # single combined query
+                info = self.get_detailed_info_combined(config, egrid, conn)
+            else:
+                # separate queries for each section
+                info = self.get_detailed_info(config, egrid, conn)
             conn.close()
 
             if not info:
@@ -449,13 +1046,12 @@ class PlotInfo:
 
             html = render_template(
                 'detailed_info.html', info=info, pie_chart=pie_chart,
-                lcsfc_colors=self.lcsfc, format_number=self.format_number
+                lcsfc_colors=config.lcsfc, format_number=self.format_number
             )
+            etag = hashlib.sha1(html.encode('utf-8')).hexdigest()
+            config.detailed_info_cache.set(egrid, (html, etag))
 
-            return Response(
-                html,
-                content_type='text/html; charset=utf-8',
-            )
+            return self.detailed_info_response(html, etag)
         except Exception as e:
             self.logger.error(e)
             return Response(
@@ -464,103 +1060,323 @@ class PlotInfo:
                 status=500
             )
 
-    def get_flurnamen(self, egrid, conn):
+    def detailed_info_response(self, html, etag):
+        """Return response for rendered additional plot information.
+
+        Returns 304 Not Modified if ETag matches If-None-Match of request.
+
+        :param str html: Rendered HTML
+        :param str etag: Strong ETag of HTML
+        """
+        response = Response(
+            html,
+            content_type='text/html; charset=utf-8',
+        )
+        response.set_etag(etag)
+        return response.make_conditional(request)
+
+    def get_detailed_info(self, config, egrid, conn):
+        """Get additional plot information for EGRID using separate queries
+        for each section.
+
+        Return empty dict if EGRID was not found.
+
+        :param PlotInfoConfig config: Compiled PlotInfo config
+        :param str egrid: EGRID
+        :param Connection conn: DB connection
+        """
+        info = {}
+
+        result = conn.execute(config.detailed_info_sql, {"egrid": egrid})
+        for row in result:
+            sections = self.get_detailed_info_sections(
+                config, egrid, row.art, conn
+            )
+            info = self.format_detailed_info(
+                egrid, row,
+                sections['landcover'],
+                sections['flurnamen'],
+                sections['addresses'],
+                sections['sdr']
+            )
+
+        return info
+
+    def get_detailed_info_sections(self, config, egrid, plot_type, conn):
+        """Run sub-queries for land cover fractions, Flurnamen, building
+        addresses and SDR infos of plot with EGRID.
+
+        Up to detailed_info_concurrency - 1 sub-queries are run concurrently
+        on their own pooled DB connections, if free worker slots are
+        available. The remaining sub-queries are run on the request
+        connection.
+
+        :param PlotInfoConfig config: Compiled PlotInfo config
+        :param str egrid: EGRID
+        :param int plot_type: Type of plot (0: Liegenschaft, else SDR)
+        :param Connection conn: DB connection
+        """
+        # sub-queries, ordered by expected query time
+        queries = [
+            ('landcover', lambda c: self.get_land_cover_fractions(
+                config, egrid, c
+            )),
+            ('sdr', lambda c: self.get_sdr_infos(
+                config, egrid, plot_type, c
+            )),
+            ('flurnamen', lambda c: self.get_flurnamen(config, egrid, c)),
+            ('addresses', lambda c: self.get_building_addresses(
+                config, egrid, c
+            ))
+        ]
+
+        # submit slowest sub-queries to thread pool
+        futures = {}
+        max_parallel = config.detailed_info_concurrency - 1
+        for key, query in queries:
+            if len(futures) >= max_parallel:
+                break
+            if not self.worker_slots.acquire(blocking=False):
+                # no free worker slots
+                break
+            try:
+                futures[key] = self.executor.submit(
+                    self.run_pooled_query, config, query
+                )
+            except Exception:
+                self.worker_slots.release()
+                raise
+
+        # run remaining sub-queries on request connection
+        sections = {}
+        for key, query in queries:
+            if key not in futures:
+                sections[key] = query(conn)
+
+        for key, future in futures.items():
+            sections[key] = future.result()
+
+        return sections
+
+    def run_pooled_query(self, config, query):
+        """Run query on its own pooled DB connection and release worker
+        slot afterwards.
+
+        :param PlotInfoConfig config: Compiled PlotInfo config
+        :param func query: Query function taking a DB connection
+        """
+        try:
+            with config.db.connect() as conn:
+                return query(conn)
+        finally:
+            self.worker_slots.release()
+
+    def get_detailed_info_combined(self, config, egrid, conn):
+        """Get additional plot information for EGRID from a single combined
+        query with aggregated JSON columns for each section.
+
+        Return empty dict if EGRID was not found.
+
+        :param PlotInfoConfig config: Compiled PlotInfo config
+        :param str egrid: EGRID
+        :param Connection conn: DB connection
+        """
+        info = {}
+
+        result = conn.execute(
+            config.detailed_info_combined_sql, {"egrid": egrid}
+        )
+        for row in result:
+            info = self.format_detailed_info(
+                egrid, row,
+                self.format_land_cover_fractions(
+                    config, self.json_rows(row.landcover)
+                ),
+                self.json_rows(row.flurnamen),
+                self.format_building_addresses(
+                    self.json_rows(row.addresses)
+                ),
+                self.format_sdr_infos(self.json_rows(row.sdr))
+            )
+
+        return info
+
+    def format_detailed_info(self, egrid, row, land_cover, flurnamen,
+                             addresses, sdr_infos):
+        """Return additional plot information for template.
+
+        :param str egrid: EGRID
+        :param Row row: Result row of detailed info query
+        :param list[obj] land_cover: Land cover fractions
+        :param list[str] flurnamen: Flurnamen
+        :param list[obj] addresses: Building addresses
+        :param list[obj] sdr_infos: SDR infos
+        """
+        # calculate rounding difference to flaechenmass
+        total_area = 0
+        for lc in land_cover:
+            total_area += round(lc['area'])
+        rounding_difference = abs(
+            round(row.flaechenmass) - total_area
+        )
+
+        return {
+            'egrid': egrid,
+            'area': row.flaechenmass,
+            'landcover': land_cover,
+            'rounding_difference': rounding_difference,
+            'flurnamen': ", ".join(flurnamen),
+            'addresses': addresses,
+            'sdr': sdr_infos,
+            'grundbuchamt': row.grundbuchamt,
+            'nfgeometer': row.nfgeometer
+        }
+
+    def json_rows(self, value):
+        """Return list of rows from an aggregated JSON column.
+
+        :param obj value: Decoded JSON list, JSON string or None
+        """
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return json.loads(value) or []
+        return value
+
+    def get_flurnamen(self, config, egrid, conn):
         """Get Flurnamen for plot with EGRID.
 
+        :param PlotInfoConfig config: Compiled PlotInfo config
         :param str egrid: EGRID
         :param Connection conn: DB connection
         """
         flurnamen = []
 
-        sql = sql_text(self.flurnamen_sql)
-
-        result = conn.execute(sql, {"egrid": egrid})
+        result = conn.execute(config.flurnamen_sql, {"egrid": egrid})
         for row in result:
             flurnamen.append(row.flurname)
 
         return flurnamen
 
-    def get_land_cover_fractions(self, egrid, conn):
+    def get_flurnamen_bulk(self, config, egrids, conn):
+        """Get Flurnamen for multiple plots with a single query.
+
+        Return lookup for Flurnamen by EGRID.
+
+        :param PlotInfoConfig config: Compiled PlotInfo config
+        :param list[str] egrids: EGRIDs
+        :param Connection conn: DB connection
+        """
+        flurnamen = {}
+
+        result = conn.execute(
+            config.flurnamen_bulk_sql, {"egrids": list(set(egrids))}
+        )
+        for row in result:
+            flurnamen.setdefault(row.egrid, []).append(row.flurname)
+
+        return flurnamen
+
+    def get_land_cover_fractions(self, config, egrid, conn):
         """Get land cover fractions inside plot with EGRID.
 
+        :param PlotInfoConfig config: Compiled PlotInfo config
         :param str egrid: EGRID
         :param Connection conn: DB connection
         """
-        land_cover = []
+        result = conn.execute(
+            config.land_cover_fractions_sql, {"egrid": egrid}
+        )
+        return self.format_land_cover_fractions(
+            config, [row._mapping for row in result]
+        )
 
-        sql = sql_text(self.land_cover_fractions_sql)
+    def format_land_cover_fractions(self, config, rows):
+        """Format land cover fractions.
 
-        result = conn.execute(sql, {"egrid": egrid})
-        for row in result:
+        :param PlotInfoConfig config: Compiled PlotInfo config
+        :param list[obj] rows: Land cover rows
+        """
+        land_cover = []
+
+        for row in rows:
             # lookup color
-            lcsfc = self.lcsfc.get(row.art_txt, '#ffffff')
+            lcsfc = config.lcsfc.get(row['art_txt'], '#ffffff')
 
-            if round(row.area, 0) == 0:
+            if round(row['area'], 0) == 0:
                 continue
 
             land_cover.append({
-                'type': row.art_txt,
-                'area': row.area,
-                'area_percent': row.area_percent,
+                'type': row['art_txt'],
+                'area': row['area'],
+                'area_percent': row['area_percent'],
                 'color': lcsfc
             })
 
         return land_cover
 
-    def get_building_addresses(self, egrid, conn):
+    def get_building_addresses(self, config, egrid, conn):
         """Get building addresses inside plot with EGRID.
 
+        :param PlotInfoConfig config: Compiled PlotInfo config
         :param str egrid: EGRID
         :param Connection conn: DB connection
         """
-        addresses = []
+        result = conn.execute(
+            config.building_addresses_sql, {"egrid": egrid}
+        )
+        return self.format_building_addresses(
+            [row._mapping for row in result]
+        )
 
-        sql = sql_text(self.building_addresses_sql)
+    def format_building_addresses(self, rows):
+        """Format building addresses.
 
-        result = conn.execute(sql, {"egrid": egrid})
-        for row in result:
+        :param list[obj] rows: Building address rows
+        """
+        addresses = []
+
+        for row in rows:
             addresses.append({
-                'street': row.strassenname,
-                'number': row.hausnummer,
-                'zip': row.plz,
-                'city': row.ortschaft
+                'street': row['strassenname'],
+                'number': row['hausnummer'],
+                'zip': row['plz'],
+                'city': row['ortschaft']
             })
 
         return addresses
 
-    def get_sdr_infos(self, egrid, plot_type, conn):
+    def get_sdr_infos(self, config, egrid, plot_type, conn):
         """Get any SDR infos for plot with EGRID.
 
+        :param PlotInfoConfig config: Compiled PlotInfo config
         :param str egrid: EGRID
         :param int plot_type: Type of plot (0: Liegenschaft, else SDR)
         :param Connection conn: DB connection
         """
-        sdr_infos = []
-
         if plot_type == 0:
             # Liegenschaft: get SDRs
-
-            sql = sql_text(self.sdr_infos_liegenschaft_sql)
-
-            result = conn.execute(sql, {"egrid": egrid})
-            for row in result:
-                sdr_infos.append({
-                    'number': row.nummer,
-                    'type': row.art_txt,
-                    'area': row.area
-                })
+            sql = config.sdr_infos_liegenschaft_sql
         else:
             # SDR: get Liegenschaften
+            sql = config.sdr_infos_sdr_sql
 
-            sql = sql_text(self.sdr_infos_sdr_sql)
+        result = conn.execute(sql, {"egrid": egrid})
+        return self.format_sdr_infos([row._mapping for row in result])
 
-            result = conn.execute(sql, {"egrid": egrid})
-            for row in result:
-                sdr_infos.append({
-                    'number': row.nummer,
-                    'type': row.art_txt,
-                    'area': row.area
-                })
+    def format_sdr_infos(self, rows):
+        """Format SDR infos.
+
+        :param list[obj] rows: SDR info rows
+        """
+        sdr_infos = []
+
+        for row in rows:
+            sdr_infos.append({
+                'number': row['nummer'],
+                'type': row['art_txt'],
+                'area': row['area']
+            })
 
         return sdr_infos
 
@@ -591,3 +1407,231 @@ class PlotInfo:
         :param float value: Number value
         """
         return '{0:,}'.format(value).replace(",", "'")
+
+
+class PlotInfoConfig:
+    """PlotInfoConfig class
+
+    Compiled PlotInfo config for a tenant, with parsed SQL and info fields.
+    """
+
+    # config keys affecting cached basic info results
+    BASIC_INFO_KEYS = [
+        'db_url', 'basic_info_sql', 'basic_info_by_egrid_sql',
+        'basic_info_by_egrids_sql', 'basic_info_fields', 'flurnamen_sql',
+        'flurnamen_bulk_sql'
+    ]
+
+    # config keys affecting cached detailed info HTML
+    DETAILED_INFO_KEYS = [
+        'db_url', 'detailed_info_sql', 'detailed_info_combined',
+        'detailed_info_combined_sql', 'land_cover_fractions_sql',
+        'building_addresses_sql', 'sdr_infos_liegenschaft_sql',
+        'sdr_infos_sdr_sql', 'lcsfc_colors'
+    ]
+
+    def __init__(self, config, tenant, registry, db_engine, logger):
+        """Constructor
+
+        :param RuntimeConfig config: Tenant config
+        :param str tenant: Tenant name
+        :param TenantRegistry registry: Registry for caches and indexes
+        :param DatabaseEngine db_engine: Database engine with DB connections
+        :param Logger logger: Application logger
+        """
+        db_url = config.get('db_url', 'postgresql:///?service=sogis_services')
+        self.db = db_engine.db_engine(db_url)
+
+        # BASIC_INFO_SQL
+        self.basic_info_sql = sql_text(config.get(
+            'basic_info_sql', PlotInfo.DEFAULT_BASIC_INFO_SQL
+        ))
+        self.basic_info_by_egrid_sql = sql_text(config.get(
+            'basic_info_by_egrid_sql', PlotInfo.DEFAULT_BASIC_INFO_BY_EGRID_SQL
+        ))
+
+        # BASIC_INFO_FIELDS
+        basic_info_fields = config.get(
+            'basic_info_fields', PlotInfo.DEFAULT_BASIC_INFO_FIELDS)
+        self.basic_info_fields = []
+        for field in basic_info_fields:
+            try:
+                (name, label), = field.items()
+                self.basic_info_fields.append((name, label))
+            except Exception as e:
+                logger.error(
+                    "Could not get custom info field from '%s':\n%s"
+                    % (field, e)
+                )
+
+        # BASIC_INFO_BY_EGRIDS_SQL
+        basic_info_by_egrids_sql = config.get('basic_info_by_egrids_sql')
+        if (
+            basic_info_by_egrids_sql is None and
+            config.get('basic_info_by_egrid_sql') is None
+        ):
+            # use default set-based query if query by EGRID is not
+            # customized
+            basic_info_by_egrids_sql = (
+                PlotInfo.DEFAULT_BASIC_INFO_BY_EGRIDS_SQL
+            )
+        self.basic_info_by_egrids_sql = None
+        if basic_info_by_egrids_sql is not None:
+            self.basic_info_by_egrids_sql = sql_text(basic_info_by_egrids_sql)
+
+        # BASIC_INFO_BATCH_SQL
+        basic_info_batch_sql = config.get('basic_info_batch_sql')
+        if (
+            basic_info_batch_sql is None and
+            config.get('basic_info_sql') is None
+        ):
+            # use default batch query if basic info query is not customized
+            basic_info_batch_sql = PlotInfo.DEFAULT_BASIC_INFO_BATCH_SQL
+        self.basic_info_batch_sql = None
+        if basic_info_batch_sql is not None:
+            self.basic_info_batch_sql = sql_text(basic_info_batch_sql)
+        self.batch_chunk_size = max(
+            int(config.get('batch_chunk_size', 500)), 1
+        )
+
+        basic_info_settings = config_values(config, self.BASIC_INFO_KEYS)
+
+        # spatial plot index for basic info at coordinates
+        self.spatial_index = None
+        if config.get('spatial_index', False):
+            spatial_index_sql = config.get(
+                'spatial_index_sql', PlotInfo.DEFAULT_SPATIAL_INDEX_SQL
+            )
+            refresh_interval = float(
+                config.get('spatial_index_refresh_interval', 86400)
+            )
+            self.spatial_index = registry.get(
+                tenant, 'spatial_index',
+                [db_url, spatial_index_sql, refresh_interval],
+                lambda: PlotIndex(
+                    self.db, sql_text(spatial_index_sql), refresh_interval,
+                    logger
+                )
+            )
+        plot_attributes_cache_size = int(
+            config.get('plot_attributes_cache_size', 0)
+        )
+        plot_attributes_cache_ttl = float(
+            config.get('plot_attributes_cache_ttl', 3600)
+        )
+        self.plot_attributes_cache = registry.get(
+            tenant, 'plot_attributes_cache', [
+                plot_attributes_cache_size, plot_attributes_cache_ttl,
+                basic_info_settings
+            ],
+            lambda: LRUCache(
+                plot_attributes_cache_size, plot_attributes_cache_ttl
+            )
+        )
+
+        # spatial cache for basic info at coordinates
+        self.basic_info_cache = None
+        self.basic_info_plot_cache = None
+        basic_info_cache_size = int(config.get('basic_info_cache_size', 0))
+        self.basic_info_cache_cell_size = float(
+            config.get('basic_info_cache_cell_size', 10)
+        )
+        if basic_info_cache_size > 0:
+            basic_info_cache_ttl = float(
+                config.get('basic_info_cache_ttl', 3600)
+            )
+            self.basic_info_cache = registry.get(
+                tenant, 'basic_info_cache', [
+                    basic_info_cache_size, basic_info_cache_ttl,
+                    self.basic_info_cache_cell_size, basic_info_settings
+                ],
+                lambda: LRUCache(basic_info_cache_size, basic_info_cache_ttl)
+            )
+            # plots with parsed geometries of cached grid cells, limited by
+            # their total number of vertices
+            basic_info_cache_max_vertices = int(
+                config.get('basic_info_cache_max_vertices', 1000000)
+            )
+            self.basic_info_plot_cache = registry.get(
+                tenant, 'basic_info_plot_cache', [
+                    basic_info_cache_max_vertices, basic_info_cache_ttl,
+                    basic_info_settings
+                ],
+                lambda: LRUCache(
+                    basic_info_cache_max_vertices, basic_info_cache_ttl,
+                    lambda cached: 1 + sum(len(ring) for ring in cached[1])
+                )
+            )
+
+        # FLURNAMEN_SQL
+        self.flurnamen_sql = sql_text(config.get(
+            'flurnamen_sql', PlotInfo.DEFAULT_FLURNAMEN_SQL
+        ))
+
+        # FLURNAMEN_BULK_SQL
+        flurnamen_bulk_sql = config.get('flurnamen_bulk_sql')
+        if flurnamen_bulk_sql is None and config.get('flurnamen_sql') is None:
+            # use default bulk query if Flurnamen query is not customized
+            flurnamen_bulk_sql = PlotInfo.DEFAULT_FLURNAMEN_BULK_SQL
+        self.flurnamen_bulk_sql = None
+        if flurnamen_bulk_sql is not None:
+            self.flurnamen_bulk_sql = sql_text(flurnamen_bulk_sql)
+
+        # DETAILED_INFO_SQL
+        self.detailed_info_sql = sql_text(config.get(
+            'detailed_info_sql', PlotInfo.DEFAULT_DETAILED_INFO_SQL
+        ))
+
+        # max number of concurrent detailed info sub-queries per request
+        self.detailed_info_concurrency = max(
+            int(config.get('detailed_info_concurrency', 1)), 1
+        )
+
+        # DETAILED_INFO_COMBINED_SQL
+        self.detailed_info_combined_sql = None
+        if config.get('detailed_info_combined', False):
+            self.detailed_info_combined_sql = sql_text(config.get(
+                'detailed_info_combined_sql',
+                PlotInfo.DEFAULT_DETAILED_INFO_COMBINED_SQL
+            ))
+
+        # LAND_COVER_FRACTIONS_SQL
+        self.land_cover_fractions_sql = sql_text(config.get(
+            'land_cover_fractions_sql', PlotInfo.DEFAULT_LAND_COVER_FRACTIONS_SQL
+        ))
+
+        # BUILDING_ADDRESSES_SQL
+        self.building_addresses_sql = sql_text(config.get(
+            'building_addresses_sql', PlotInfo.DEFAULT_BUILDING_ADDRESSES_SQL
+        ))
+
+        # SDR_INFOS_LIEGENSCHAFT_SQL
+        self.sdr_infos_liegenschaft_sql = sql_text(config.get(
+            'sdr_infos_liegenschaft_sql',
+            PlotInfo.DEFAULT_SDR_INFOS_LIEGENSCHAFT_SQL
+        ))
+
+        # SDR_INFOS_SDR_SQL
+        self.sdr_infos_sdr_sql = sql_text(config.get(
+            'sdr_infos_sdr_sql', PlotInfo.DEFAULT_SDR_INFOS_SDR_SQL
+        ))
+
+        # cache for rendered detailed info HTML
+        detailed_info_cache_size = int(
+            config.get('detailed_info_cache_size', 0)
+        )
+        detailed_info_cache_ttl = float(
+            config.get('detailed_info_cache_ttl', 3600)
+        )
+        self.detailed_info_cache = registry.get(
+            tenant, 'detailed_info_cache', [
+                detailed_info_cache_size, detailed_info_cache_ttl,
+                config_values(config, self.DETAILED_INFO_KEYS)
+            ],
+            lambda: LRUCache(detailed_info_cache_size, detailed_info_cache_ttl)
+        )
+
+        # LCSFC_COLORS
+        self.lcsfc = config.get(
+            'lcsfc_colors', PlotInfo.DEFAULT_LCSFC_COLORS
+        )
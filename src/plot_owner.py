@@ -1,14 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import hmac
 import os
 from datetime import datetime
-from xml.dom.minidom import parseString
-
-from flask import json, render_template, Response
+import sys
+from threading import BoundedSemaphore, Lock
+import time
+import uuid
+from xml.etree.ElementTree import iterparse
+
+from flask import (
+    json, jsonify, render_template, request, Response, stream_with_context
+)
 import requests
 from qwc_services_core.tenant_handler import TenantHandler
 
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+from element_index import ElementIndex
+from lru_cache import LRUCache
+from ownership import Gemeinschaft, Grundstueck, Person, Recht, link_records
+from tenant_registry import TenantRegistry
+
 
 GBDBS_VERSION = os.environ.get('GBDBS_VERSION', '2.1')
 
+# max number of GBDBS requests for berechtigte Grundstuecke run concurrently
+# by worker threads (per process)
+GBDBS_MAX_WORKERS = int(os.environ.get('GBDBS_MAX_WORKERS', 4))
+
+# max number of bytes of GBDBS error responses included in log messages
+GBDBS_ERROR_BODY_SIZE = 4096
+
+# name of cookie for captcha tickets
+CAPTCHA_TICKET_COOKIE = 'plot_owner_ticket'
+
 
 class PlotOwner:
     """PlotOwner class
@@ -16,6 +46,12 @@ class PlotOwner:
     Query plot owner information from a GBDBS service.
     """
 
+    # record elements collected from GBDBS response
+    RECORD_ELEMENTS = ('Grundstueck', 'Person', 'Recht')
+
+    # path of GetParcelsByIdResponse element
+    RESPONSE_PATH = ['Envelope', 'Body', 'GetParcelsByIdResponse']
+
     EIGENTUMSFORM_LOOKUP = {
         'AlleinEigentum': "Alleineigentum",
         'GesamtEigentum': "Gesamteigentum",
@@ -41,71 +77,108 @@ class PlotOwner:
                     <ns:transactionId>{transaction_id}</ns:transactionId>
                     <ns:BezugInhalt>{bezug_inhalt}</ns:BezugInhalt>
                     <ns:includeHistory>false</ns:includeHistory>
-                    <ns:Id>{egrid}::::</ns:Id>
+                    {ids}
                 </ns:GetParcelsByIdRequest>
             </soapenv:Body>
         </soapenv:Envelope>
     """
 
-    def __init__(self, config_handler, db_engine, logger):
+    def __init__(self, config_handler, db_engine, upstream_client, logger):
         """Constructor
 
         :param DatabaseEngine db_engine: Database engine with DB connections
+        :param UpstreamClient upstream_client: Shared upstream HTTP sessions
         :param Logger logger: Application logger
         """
         self.config_handler = config_handler
         self.db_engine = db_engine
+        self.upstream_client = upstream_client
         self.logger = logger
+        self.tenant_handler = TenantHandler(logger)
+
+        # thread pool for concurrent GBDBS requests
+        self.executor = ThreadPoolExecutor(
+            max_workers=GBDBS_MAX_WORKERS, thread_name_prefix='gbdbs'
+        )
+        # guard for available worker slots, to avoid queueing requests
+        # behind other requests
+        self.worker_slots = BoundedSemaphore(GBDBS_MAX_WORKERS)
+
+        # shared memos and captcha tickets of tenants, kept across config
+        # rebuilds
+        self.registry = TenantRegistry()
 
     def load_config(self):
-        tenant_handler = TenantHandler(self.logger)
-        tenant = tenant_handler.tenant()
-        config = self.config_handler.tenant_config(tenant)
+        """Return compiled PlotOwner config for current tenant.
 
-        self.gbdbs_service_url = config.get('gbdbs_service_url')
-        self.hide_owner_addresses = config.get('hide_owner_addresses', False)
-        self.site_key = config.get('recaptcha_site_key', '')
-        self.secret_key = config.get('recaptcha_secret_key', '')
-        self.min_score = config.get('recaptcha_min_score', 0.5)
-        self.bezug_inhalt = config.get('bezug_inhalt', 'IndexMitEigentum')
+        The compiled config is cached per tenant and rebuilt if the tenant
+        config file has changed.
+        """
+        tenant = self.tenant_handler.tenant()
+        config = self.tenant_handler.handler('plotinfo', 'plot_owner', tenant)
+        if config is None:
+            config = self.tenant_handler.register_handler(
+                'plot_owner', tenant, PlotOwnerConfig(
+                    self.config_handler.tenant_config(tenant), tenant,
+                    self.registry, self.upstream_client
+                )
+            )
+        return config
 
     def captcha(self, egrid):
         """Return HTML with embedded captcha for plot owner info request.
 
         :param str egrid: EGRID
         """
-        self.load_config()
+        config = self.load_config()
         return Response(
             render_template(
-                'plot_owner_captcha.html', egrid=egrid, site_key=self.site_key
+                'plot_owner_captcha.html', egrid=egrid,
+                site_key=config.site_key
             ),
             content_type='text/html; charset=utf-8',
         )
 
-    def verify_captcha(self, identity, captcha_token):
-        """Verify captcha response token.
+    def verify_captcha(self, config, identity, captcha_token):
+        """Verify captcha ticket or response token and return
+        (verified, new captcha ticket or None).
 
         Only enabled if RECAPTCHA_SITE_KEY is set.
 
+        If captcha tickets are enabled, a valid ticket from a previous
+        verification skips the verification of the response token, and a
+        new ticket is issued after a successful verification.
+
+        :param PlotOwnerConfig config: Compiled PlotOwner config
         :param obj identity: User identity
         :param str captcha_token: Captcha response token for verification
         """
-        if self.site_key == '':
+        if config.site_key == '':
             # skip validation if captcha is not enabled
             self.logger.info(
                 "RECAPTCHA_SITE_KEY is not set, skipping verification"
             )
-            return True
+            return True, None
+
+        tickets = config.captcha_tickets
+        if tickets is not None:
+            client = self.captcha_client()
+            ticket = request.cookies.get(CAPTCHA_TICKET_COOKIE)
+            if ticket and tickets.use(
+                ticket, client, None if identity else config.min_score
+            ):
+                self.logger.info("Captcha ticket verified")
+                return True, None
 
         # send request to reCAPTCHA API
         self.logger.info("Verifying captcha response token")
         url = 'https://www.google.com/recaptcha/api/siteverify'
         params = {
-            'secret': self.secret_key,
+            'secret': config.secret_key,
             'response': captcha_token
         }
-        response = requests.post(
-            url, data=params, timeout=60
+        response = config.session.post(
+            url, data=params, timeout=config.recaptcha_timeout
         )
 
         if response.status_code != requests.codes.ok:
@@ -114,33 +187,48 @@ class PlotOwner:
                 "Could not verify captcha response token:\n\n%s" %
                 response.text
             )
-            return False
+            return False, None
 
         # check response
         res = json.loads(response.text)
         self.logger.debug("Captcha verification response: %s" % res)
         if res['success']:
+            score = res.get('score', 0.0)
             if identity is None:
                 # check score if user is not signed in
-                score = res.get('score', 0.0)
-                if score < self.min_score:
+                if score < config.min_score:
                     # deny access if reCAPTCHA score is too low
                     self.logger.info(
                         "Captcha verified, but score is too low (%s < %s)" %
-                        (score, self.min_score)
+                        (score, config.min_score)
                     )
-                    return False
+                    return False, None
 
                 self.logger.info("Captcha verified")
             else:
                 # skip score check if user is signed in
                 self.logger.info("Captcha verified for signed in user")
 
-            return True
+            ticket = None
+            if tickets is not None:
+                ticket = tickets.issue(client, score)
+            return True, ticket
         else:
             self.logger.warning("Captcha verification failed: %s" % res)
 
-        return False
+        return False, None
+
+    def captcha_client(self):
+        """Return identifier of client of current request for binding
+        captcha tickets.
+
+        The client address is only taken from X-Forwarded-For headers of
+        trusted proxies, see TRUSTED_PROXIES.
+        """
+        return "%s|%s" % (
+            request.remote_addr or '',
+            request.headers.get('User-Agent', '')
+        )
 
     def info(self, identity, egrid, captcha_token):
         """Return flattened plot owner information for EGRID as JSON.
@@ -149,79 +237,325 @@ class PlotOwner:
         :param str egrid: EGRID
         :param str captcha_token: Captcha response token for verification
         """
-        self.load_config()
+        config = self.load_config()
         try:
-            if not self.verify_captcha(identity, captcha_token):
+            verified, ticket = self.verify_captcha(
+                config, identity, captcha_token
+            )
+            if not verified:
                 return {
                     'error': "Captcha verification failed",
                     'success': False
                 }
 
-            owner_info = self.get_owner_info(egrid)
+            memo = self.owner_memo(config)
+            owner_info = self.get_owner_info(config, egrid, memo)
             if 'error' in owner_info:
                 raise Exception(owner_info['error'])
 
-            grundstuecke = owner_info.get('grundstuecke')
-            personen = owner_info.get('personen')
-            rechte = owner_info.get('rechte')
+            result = self.format_owner_info(config, egrid, owner_info, memo)
+            if ticket is None or not result['success']:
+                return result
+
+            # set new captcha ticket
+            response = jsonify(result)
+            response.set_cookie(
+                CAPTCHA_TICKET_COOKIE, ticket,
+                max_age=int(config.captcha_tickets.ttl),
+                path=(request.script_root or '') + '/',
+                secure=request.is_secure, httponly=True, samesite='Strict'
+            )
+            return response
+        except Exception as e:
+            self.logger.error(e)
+            return {
+                'error': str(e),
+                'success': False
+            }
+
+    def info_batch(self, egrids):
+        """Return flattened plot owner information for multiple EGRIDs as
+        streamed NDJSON, in input order.
 
-            # get Grundstueck info for EGRID
-            grundstueck = None
-            for id, g in grundstuecke.items():
-                if g.get('egrid') == egrid:
-                    grundstueck = g
-                    break
+        EGRIDs are resolved in chunks. The owner infos of a chunk and of
+        their berechtigte Grundstuecke are requested together, so that
+        berechtigte Grundstuecke shared by plots of a chunk are requested
+        once.
 
-            if grundstueck is None:
-                return {
-                    'error': "EGRID %s not found" % egrid,
+        :param iter egrids: Plot EGRIDs
+        """
+        config = self.load_config()
+
+        def generate():
+            try:
+                memo = self.owner_memo(config)
+                chunk = []
+                for egrid in egrids:
+                    chunk.append(egrid if isinstance(egrid, str) else None)
+                    if len(chunk) >= config.owner_batch_chunk_size:
+                        yield from self.info_batch_chunk(config, chunk, memo)
+                        chunk = []
+                if chunk:
+                    yield from self.info_batch_chunk(config, chunk, memo)
+            except Exception as e:
+                self.logger.error(e)
+                yield json.dumps({
+                    'error': str(e),
                     'success': False
-                }
+                }) + "\n"
 
-            # collect eigentuemer info
-            eigentum = self.collect_eigentuemer(
-                grundstueck, rechte, personen, grundstuecke, True
-            )
+        return Response(
+            stream_with_context(generate()),
+            content_type='application/x-ndjson; charset=utf-8'
+        )
 
-            # update eigentumsform
-            eigentumsform = self.lookup_eigentumsform(
-                eigentum.get('eigentumsform')
-            )
-            if eigentum.get('eigentum_art') == 'StockwerksEinheit':
-                eigentumsform = (
-                    "%s (%s)" % (
-                        eigentumsform,
-                        self.lookup_eigentumsform(eigentum.get('eigentum_art'))
-                    )
-                )
+    def info_batch_chunk(self, config, chunk, memo):
+        """Get owner infos for a chunk of EGRIDs and yield NDJSON lines of
+        flattened plot owner information in input order.
 
-            # result
-            result = {
-                'grundstueck': eigentum.get('grundstueck'),
-                'eigentumsform': eigentumsform,
-                'eigentuemer': eigentum.get('eigentuemer'),
-            }
-            if 'beschreibung' in eigentum:
-                result['beschreibung'] = eigentum.get('beschreibung')
+        :param PlotOwnerConfig config: Compiled PlotOwner config
+        :param list chunk: EGRIDs or None if invalid
+        :param LRUCache memo: Memo of owner infos by EGRID
+        """
+        # unique valid EGRIDs in chunk
+        egrids = list(dict.fromkeys(
+            egrid for egrid in chunk if egrid is not None
+        ))
+        owner_infos = self.get_owner_infos(config, egrids, memo)
+
+        # get owner infos of berechtigte Grundstuecke of all plots together
+        sub_egrids = []
+        for owner_info in owner_infos.values():
+            for recht in owner_info.get('rechte', []):
+                if isinstance(recht.berechtigter, Grundstueck):
+                    sub_egrids.append(recht.berechtigter.egrid)
+        sub_egrids = [
+            egrid for egrid in dict.fromkeys(sub_egrids)
+            if egrid not in owner_infos
+        ]
+        owner_infos.update(self.get_owner_infos(config, sub_egrids, memo))
+
+        # keep owner infos of chunk regardless of memo size, including
+        # errors to avoid requesting failed Grundstuecke for each plot
+        chunk_memo = LRUCache(len(owner_infos), float('inf'))
+        for egrid, owner_info in owner_infos.items():
+            chunk_memo.set(egrid, owner_info)
+
+        for egrid in chunk:
+            if egrid is None:
+                line = {
+                    'error': "Invalid EGRID",
+                    'success': False
+                }
+            else:
+                owner_info = owner_infos[egrid]
+                if 'error' in owner_info:
+                    line = {
+                        'error': owner_info['error'],
+                        'success': False
+                    }
+                else:
+                    try:
+                        line = self.format_owner_info(
+                            config, egrid, owner_info, chunk_memo
+                        )
+                    except Exception as e:
+                        self.logger.error(e)
+                        line = {
+                            'error': str(e),
+                            'success': False
+                        }
+                line = dict(egrid=egrid, **line)
+            yield json.dumps(line) + "\n"
+
+    def owner_memo(self, config):
+        """Return memo of GBDBS owner infos, shared or for the current
+        request only.
+
+        :param PlotOwnerConfig config: Compiled PlotOwner config
+        """
+        memo = config.gbdbs_memo
+        if memo is None:
+            memo = LRUCache(config.gbdbs_memo_size, config.gbdbs_memo_ttl)
+        return memo
 
+    def format_owner_info(self, config, egrid, owner_info, memo=None):
+        """Return flattened plot owner information for EGRID from its
+        owner info.
+
+        :param PlotOwnerConfig config: Compiled PlotOwner config
+        :param str egrid: EGRID
+        :param obj owner_info: Owner info for EGRID
+        :param LRUCache memo: Optional memo of owner infos by EGRID
+        """
+        grundstuecke = owner_info.get('grundstuecke')
+        personen = owner_info.get('personen')
+        rechte = owner_info.get('rechte')
+
+        # get Grundstueck info for EGRID
+        grundstueck = None
+        for id, g in grundstuecke.items():
+            if g.egrid == egrid:
+                grundstueck = g
+                break
+
+        if grundstueck is None:
             return {
-                'eigentum': result,
-                'success': True
-            }
-        except Exception as e:
-            self.logger.error(e)
-            return {
-                'error': str(e),
+                'error': "EGRID %s not found" % egrid,
                 'success': False
             }
 
-    def get_owner_info(self, egrid):
+        # collect eigentuemer info
+        eigentum = self.collect_eigentuemer(
+            config, grundstueck, rechte, personen, grundstuecke, True, memo
+        )
+
+        # update eigentumsform
+        eigentumsform = self.lookup_eigentumsform(
+            eigentum.get('eigentumsform')
+        )
+        if eigentum.get('eigentum_art') == 'StockwerksEinheit':
+            eigentumsform = (
+                "%s (%s)" % (
+                    eigentumsform,
+                    self.lookup_eigentumsform(eigentum.get('eigentum_art'))
+                )
+            )
+
+        # result
+        result = {
+            'grundstueck': eigentum.get('grundstueck'),
+            'eigentumsform': eigentumsform,
+            'eigentuemer': eigentum.get('eigentuemer'),
+        }
+        if 'beschreibung' in eigentum:
+            result['beschreibung'] = eigentum.get('beschreibung')
+
+        return {
+            'eigentum': result,
+            'success': True
+        }
+
+    def get_owner_info(self, config, egrid, memo=None):
         """Get owner info for EGRID from GBDBS service response.
 
+        :param PlotOwnerConfig config: Compiled PlotOwner config
         :param str egrid: EGRID
+        :param LRUCache memo: Optional memo of owner infos by EGRID
+        """
+        return self.get_owner_infos(config, [egrid], memo)[egrid]
+
+    def get_owner_infos(self, config, egrids, memo=None):
+        """Get owner infos for multiple EGRIDs from GBDBS service responses
+        as lookup by EGRID.
+
+        EGRIDs are requested in batches of up to gbdbs_batch_size EGRIDs
+        per request. Up to gbdbs_concurrency requests are run concurrently,
+        if free worker slots are available.
+
+        Owner infos in the memo are not requested again. Successfully
+        loaded owner infos are added to the memo.
+
+        :param PlotOwnerConfig config: Compiled PlotOwner config
+        :param list[str] egrids: EGRIDs
+        :param LRUCache memo: Optional memo of owner infos by EGRID
+        """
+        owner_infos = {}
+        if memo is not None:
+            for egrid in egrids:
+                owner_info = memo.get(egrid)
+                if owner_info is not None:
+                    self.logger.debug(
+                        "Using memoized owner info for %s" % egrid
+                    )
+                    owner_infos[egrid] = owner_info
+            egrids = [egrid for egrid in egrids if egrid not in owner_infos]
+
+        batch_size = config.gbdbs_batch_size
+        batches = iter([
+            egrids[i:i + batch_size]
+            for i in range(0, len(egrids), batch_size)
+        ])
+        batches_lock = Lock()
+
+        def run_batches():
+            # request remaining batches
+            while True:
+                with batches_lock:
+                    batch = next(batches, None)
+                if batch is None:
+                    return
+                batch_owner_infos = self.request_batch_owner_infos(
+                    config, batch
+                )
+                owner_infos.update(batch_owner_infos)
+                if memo is not None:
+                    for egrid, owner_info in batch_owner_infos.items():
+                        if 'error' not in owner_info:
+                            memo.set(egrid, owner_info)
+
+        # run additional workers in thread pool
+        futures = []
+        num_batches = -(-len(egrids) // batch_size)
+        max_parallel = min(config.gbdbs_concurrency, num_batches) - 1
+        while len(futures) < max_parallel:
+            if not self.worker_slots.acquire(blocking=False):
+                # no free worker slots
+                break
+            try:
+                futures.append(
+                    self.executor.submit(self.run_worker, run_batches)
+                )
+            except Exception:
+                self.worker_slots.release()
+                raise
+
+        run_batches()
+        for future in futures:
+            future.result()
+
+        return owner_infos
+
+    def run_worker(self, func):
+        """Run function and release worker slot afterwards.
+
+        :param func func: Function
+        """
+        try:
+            func()
+        finally:
+            self.worker_slots.release()
+
+    def request_batch_owner_infos(self, config, egrids):
+        """Get owner infos for a batch of EGRIDs from a single GBDBS service
+        response as lookup by EGRID.
+
+        The EGRIDs are requested separately if the batch request fails.
+
+        :param PlotOwnerConfig config: Compiled PlotOwner config
+        :param list[str] egrids: EGRIDs
+        """
+        owner_infos = self.request_owner_infos(config, egrids)
+        if len(egrids) > 1 and 'error' in owner_infos[egrids[0]]:
+            self.logger.warning(
+                "GBDBS batch request failed, requesting EGRIDs separately"
+            )
+            for egrid in egrids:
+                owner_infos.update(self.request_owner_infos(config, [egrid]))
+
+        return owner_infos
+
+    def request_owner_infos(self, config, egrids):
+        """Get owner infos for EGRIDs from a single GBDBS service response
+        as lookup by EGRID.
+
+        Grundstuecke and Personen are shared by the owner infos.
+
+        :param PlotOwnerConfig config: Compiled PlotOwner config
+        :param list[str] egrids: EGRIDs
         """
         try:
-            if self.gbdbs_service_url is None:
+            if config.gbdbs_service_url is None:
                 raise Exception(
                     "Environment variable GBDBS_SERVICE_URL is not set"
                 )
@@ -230,221 +564,330 @@ class PlotOwner:
             transaction_id = (
                 "SOMAP-%s" % datetime.utcnow().strftime("%Y%m%d-%H%M%S-%f")
             )
+            ids = ("\n" + " " * 20).join([
+                "<ns:Id>%s::::</ns:Id>" % egrid for egrid in egrids
+            ])
             xml_data = self.GBDBS_REQUEST_TEMPLATE.format(
                 version=GBDBS_VERSION,
-                transaction_id=transaction_id, egrid=egrid,
-                bezug_inhalt=self.bezug_inhalt
+                transaction_id=transaction_id, ids=ids,
+                bezug_inhalt=config.bezug_inhalt
             ).strip()
 
             # get XML from GBDBS service
-            url = self.gbdbs_service_url
+            url = config.gbdbs_service_url
             self.logger.debug(
-                "POST GBDBS XML request to %s:\n%s" % (url, xml_data)
+                "POST GBDBS XML request to %s:\n%s", url, xml_data
             )
             headers = {
                 'content-type': 'text/xml; charset=utf-8',
                 'accept': 'application/xml'
             }
             self.logger.info(
-                "POST GBDBS XML request to %s (%s)" % (url, egrid)
+                "POST GBDBS XML request to %s (%s)" % (url, ', '.join(egrids))
             )
-            response = requests.post(
-                url, data=xml_data, headers=headers, timeout=60
+            rss_before = self.rss()
+            response = config.session.post(
+                url, data=xml_data, headers=headers,
+                timeout=config.gbdbs_timeout, stream=True
             )
 
-            if response.status_code != requests.codes.ok:
-                # handle server error
-                raise Exception("GBDBS Server Error:\n\n%s" % response.text)
-
-            self.logger.debug(response.text)
-            # parse XML
-            doc = parseString(response.text)
-            response_node = self.find(
-                doc, 'Envelope/Body/GetParcelsByIdResponse'
-            )
+            try:
+                if response.status_code != requests.codes.ok:
+                    # handle server error, with truncated response body
+                    body = next(
+                        response.iter_content(GBDBS_ERROR_BODY_SIZE), b''
+                    )
+                    raise Exception("GBDBS Server Error:\n\n%s" % body.decode(
+                        'utf-8', errors='replace'
+                    ))
 
-            # collect Grundstueck
-            grundstuecke = self.collect_grundstuecke(response_node)
+                content_length = response.headers.get('content-length', '')
+                if (
+                    config.gbdbs_max_response_size > 0 and
+                    content_length.isdigit() and
+                    int(content_length) > config.gbdbs_max_response_size
+                ):
+                    raise Exception(
+                        "GBDBS response size %s exceeds max size of %d bytes"
+                        % (content_length, config.gbdbs_max_response_size)
+                    )
 
-            # collect Person
-            personen = self.collect_personen(response_node)
+                # parse streamed XML
+                response.raw.decode_content = True
+                reader = GbdbsResponseReader(
+                    response.raw, config.gbdbs_max_response_size
+                )
+                grundstuecke, personen, rechte = self.parse_response(
+                    config, reader, egrids
+                )
+            finally:
+                response.close()
 
-            # collect Recht for EGRID
-            rechte = self.collect_rechte(response_node, egrid)
+            self.logger.info(
+                "GBDBS response for %s: %d bytes, %d Grundstuecke, "
+                "%d Personen, %d Rechte, RSS change %s, "
+                "process peak RSS %s" % (
+                    ', '.join(egrids), reader.size, len(grundstuecke),
+                    len(personen), sum([len(r) for r in rechte.values()]),
+                    self.rss_change(rss_before), self.max_rss()
+                )
+            )
 
-            self.logger.debug({
-                'egrid': egrid,
-                'grundstuecke': grundstuecke,
-                'personen': personen,
-                'rechte': rechte
-            })
-            return {
-                'egrid': egrid,
-                'grundstuecke': grundstuecke,
-                'personen': personen,
-                'rechte': rechte
-            }
+            owner_infos = {}
+            for egrid in egrids:
+                owner_infos[egrid] = {
+                    'egrid': egrid,
+                    'grundstuecke': grundstuecke,
+                    'personen': personen,
+                    'rechte': rechte[egrid]
+                }
+                self.logger.debug(owner_infos[egrid])
+            return owner_infos
 
         except Exception as e:
             self.logger.error(e)
             return {
-                'error': "Could not load XML for EGRID %s" % egrid
+                egrid: {
+                    'error': "Could not load XML for EGRID %s" % egrid
+                }
+                for egrid in egrids
             }
 
-    def collect_grundstuecke(self, response_node):
-        """Collect Grundstueck from response
+    def parse_response(self, config, source, egrids):
+        """Collect Grundstueck, Person and Recht for EGRIDs from GBDBS
+        response XML in a single pass.
+
+        Elements of records are indexed while parsing for lookups of
+        their values. The subtree of each record is discarded once it has
+        been collected.
 
-        :param obj response_node: Result node GetParcelsByIdResponse
+        :param PlotOwnerConfig config: Compiled PlotOwner config
+        :param file source: File-like object with GBDBS response XML
+        :param list[str] egrids: EGRIDs
         """
         grundstuecke = {}
-
-        for node in response_node.getElementsByTagNameNS('*', 'Grundstueck'):
-            nummer = self.node_value(node, '//Nummer')
-            if nummer is None:
-                # skip Grundstueck in Dienstbarkeit
+        personen = {}
+        rechte = {egrid: [] for egrid in egrids}
+
+        # open elements and their local names
+        stack = []
+        path = []
+        # lookup for local names of tags
+        names = {}
+        in_response = False
+        found_response = False
+        # number of open record elements
+        open_records = 0
+        # stack depth of outermost open record
+        record_depth = 0
+        # records of current subtree and index of their elements
+        records = []
+        index = ElementIndex()
+
+        for event, elem in iterparse(source, events=('start', 'end')):
+            name = names.get(elem.tag)
+            if name is None:
+                name = names[elem.tag] = self.local_name(elem.tag)
+            if event == 'start':
+                if in_response and name in self.RECORD_ELEMENTS:
+                    if open_records == 0:
+                        record_depth = len(stack)
+                    open_records += 1
+                    records.append((name, elem))
+                if open_records > 0:
+                    parent = None
+                    if len(stack) > record_depth:
+                        parent = stack[-1]
+                    index.add(elem, name, parent)
+                stack.append(elem)
+                path.append(name)
+                if (
+                    not found_response and
+                    len(path) == len(self.RESPONSE_PATH) and
+                    path == self.RESPONSE_PATH
+                ):
+                    in_response = True
                 continue
 
-            # get type from tag name of first child element
-            art = None
-            for child in node.childNodes:
-                if child.nodeType == child.ELEMENT_NODE:
-                    art = child.nodeName.split(':')[-1]
-                    break
-
-            """
-            parse Grundstueck Nummer:
-              '<egrid>:<nr>:<nummer_zusatz>:<bfsnr>:<?>'
-
-              e.g. CH207506973252:575::2407:
-              CH210678328270:1023:1:2581:
-              CH467822696305:803::1609:: (Abraxas)
-            """
-            egrid, nr, nummer_zusatz, bfsnr, b = nummer.split(':', 4)
-
-            grundstuecke[nummer] = {
-                'egrid': egrid,
-                'art': art,
-                'nummer': nr,
-                'nummer_zusatz': nummer_zusatz,
-                'bfsnr': bfsnr,
-                'municipality_name': self.node_value(
-                    node, '//municipalityName'
-                ),
-                # StockwerksEinheit
-                'beschreibung': self.node_value(
-                    node, '//Beschreibung'
-                )
-            }
+            stack.pop()
+            path.pop()
+            if in_response and name in self.RECORD_ELEMENTS:
+                open_records -= 1
+                if open_records == 0:
+                    # collect records of subtree in document order
+                    for node_name, node in records:
+                        if node_name == 'Grundstueck':
+                            self.collect_grundstueck(
+                                index, node, grundstuecke
+                            )
+                        elif node_name == 'Person':
+                            self.collect_person(
+                                config, index, node, personen
+                            )
+                        elif node_name == 'Recht':
+                            self.collect_recht(index, node, egrids, rechte)
+                    records = []
+                    index.clear()
+            elif (
+                in_response and name == self.RESPONSE_PATH[-1] and
+                len(path) == len(self.RESPONSE_PATH) - 1
+            ):
+                # end of GetParcelsByIdResponse
+                in_response = False
+                found_response = True
+
+            if open_records == 0:
+                # discard processed subtree
+                elem.clear()
+                if stack:
+                    stack[-1].remove(elem)
+
+        if not found_response:
+            raise Exception("GetParcelsByIdResponse not found")
+
+        link_records(
+            grundstuecke, personen,
+            [recht for egrid_rechte in rechte.values()
+             for recht in egrid_rechte],
+            self.logger
+        )
 
-        return grundstuecke
+        return grundstuecke, personen, rechte
 
-    def collect_personen(self, response_node):
-        """Collect Person from response
+    def collect_grundstueck(self, index, node, grundstuecke):
+        """Collect Grundstueck from response
 
-        :param obj response_node: Result node GetParcelsByIdResponse
+        :param ElementIndex index: Index of record elements
+        :param Element node: Grundstueck node
+        :param obj grundstuecke: Lookup for Grundstueck info by Nummer
         """
-        personen = {}
+        nummer = index.node_value(node, '//Nummer')
+        if nummer is None:
+            # skip Grundstueck in Dienstbarkeit
+            return
+
+        # get type from tag name of first child element
+        art = None
+        for child in node:
+            art = self.local_name(child.tag)
+            break
+
+        """
+        parse Grundstueck Nummer:
+          '<egrid>:<nr>:<nummer_zusatz>:<bfsnr>:<?>'
+
+          e.g. CH207506973252:575::2407:
+          CH210678328270:1023:1:2581:
+          CH467822696305:803::1609:: (Abraxas)
+        """
+        egrid, nr, nummer_zusatz, bfsnr, b = nummer.split(':', 4)
+
+        grundstuecke[nummer] = Grundstueck(
+            egrid, art, nr, nummer_zusatz, bfsnr,
+            index.node_value(node, '//municipalityName'),
+            # StockwerksEinheit
+            index.node_value(node, '//Beschreibung')
+        )
 
-        for node in response_node.getElementsByTagNameNS('*', 'Person'):
-            nummer = self.node_value(node, '//Nummer')
+    def collect_person(self, config, index, node, personen):
+        """Collect Person from response
 
-            person_info = (
-                self.find(node, '//InhaltNatuerlichePersonGB') or
-                self.find(node, '//InhaltJuristischePersonGB')
+        :param PlotOwnerConfig config: Compiled PlotOwner config
+        :param ElementIndex index: Index of record elements
+        :param Element node: Person node
+        :param obj personen: Lookup for Person info by Nummer
+        """
+        nummer = index.node_value(node, '//Nummer')
+
+        person_info = index.find(node, '//InhaltNatuerlichePersonGB')
+        if person_info is None:
+            person_info = index.find(node, '//InhaltJuristischePersonGB')
+        if person_info is not None and 'bisEGBTBID' not in person_info.attrib:
+            # Person
+            person = Person(
+                index.node_value(person_info, 'Name') or
+                index.node_value(person_info, 'Name_Firma'),
+                index.node_value(person_info, 'Vornamen') or
+                index.node_value(person_info, 'Vorname')
             )
-            if person_info and not person_info.hasAttribute('bisEGBTBID'):
-                # Person
-                person = {
-                    'name': self.node_value(person_info, 'Name') or
-                    self.node_value(person_info, 'Name_Firma'),
-                    'vornamen': self.node_value(person_info, 'Vornamen') or
-                    self.node_value(person_info, 'Vorname')
-                }
 
-                adresse = (
-                    self.find(node, '//Adresse/Adresse') or
-                    self.find(node, '//Adresse')
+            adresse = index.find(node, '//Adresse/Adresse')
+            if adresse is None:
+                adresse = index.find(node, '//Adresse')
+            if not config.hide_owner_addresses and adresse is not None:
+                person.strasse = index.node_value(adresse, 'Strasse')
+                person.hausnummer = index.node_value(adresse, 'Hausnummer')
+                person.plz = index.node_value(adresse, 'PLZ')
+                person.ort = index.node_value(adresse, 'Ort')
+                person.land = index.node_value(adresse, 'Land')
+
+            personen[nummer] = person
+        else:
+            # Gemeinschaft
+            gemeinschaft = index.find(node, '//Gemeinschaft')
+            if gemeinschaft is not None:
+                teilhaber = []
+                for mitglied in index.find_all(gemeinschaft, 'Mitglieder'):
+                    teilhaber.append(index.node_value(mitglied, 'ref') or
+                                     mitglied.text)
+
+                personen[nummer] = Gemeinschaft(
+                    index.node_value(gemeinschaft, '//Name'),
+                    index.node_value(gemeinschaft, '//Art'),
+                    teilhaber
                 )
-                if not self.hide_owner_addresses and adresse:
-                    person.update({
-                        'strasse': self.node_value(adresse, 'Strasse'),
-                        'hausnummer': self.node_value(adresse, 'Hausnummer'),
-                        'plz': self.node_value(adresse, 'PLZ'),
-                        'ort': self.node_value(adresse, 'Ort'),
-                        'land': self.node_value(adresse, 'Land')
-                    })
-
-                personen[nummer] = person
             else:
-                # Gemeinschaft
-                gemeinschaft = self.find(node, '//Gemeinschaft')
-                if gemeinschaft:
-                    teilhaber = []
-                    for mitglied in gemeinschaft.getElementsByTagNameNS(
-                        '*', 'Mitglieder'
-                    ):
-                        teilhaber.append(self.node_value(mitglied, 'ref') or
-                                         mitglied.firstChild.nodeValue)
-
-                    personen[nummer] = {
-                        'name': self.node_value(gemeinschaft, '//Name'),
-                        'art': self.node_value(gemeinschaft, '//Art'),
-                        'teilhaber': teilhaber
-                    }
-                else:
-                    self.logger.error(
-                        "Unknown Person type: %s" % node.childNodes
-                    )
-
-        return personen
+                self.logger.error(
+                    "Unknown Person type: %s" % [
+                        self.local_name(child.tag) for child in node
+                    ]
+                )
 
-    def collect_rechte(self, response_node, egrid):
-        """Collect current Recht for EGRID from response
+    def collect_recht(self, index, node, egrids, rechte):
+        """Collect current Recht for EGRIDs from response
 
-        :param obj response_node: Result node GetParcelsByIdResponse
-        :param str egrid: EGRID
+        :param ElementIndex index: Index of record elements
+        :param Element node: Recht node
+        :param list[str] egrids: EGRIDs
+        :param obj rechte: Lookup for list of Recht by EGRID
         """
-        rechte = []
-
-        for node in response_node.getElementsByTagNameNS('*', 'Recht'):
-            if self.find(node, 'EigentumAnteil') is None:
-                # skip if not EigentumAnteil
-                continue
+        if index.find(node, 'EigentumAnteil') is None:
+            # skip if not EigentumAnteil
+            return
 
-            belastetesGrundstueck = self.node_value(
-                node, '//belastetesGrundstueck'
-            )
+        belastetesGrundstueck = index.node_value(
+            node, '//belastetesGrundstueck'
+        )
+        for egrid in egrids:
             if belastetesGrundstueck.startswith(egrid):
                 # filter by currently valid Recht (bisEGBTBID not present)
-                anteil = self.find(node, '//InhaltEigentumAnteil')
-                if anteil and not anteil.hasAttribute('bisEGBTBID'):
-                    rechte.append({
-                        'nummer': self.node_value(node, '//Nummer'),
-                        'eigentumsform': self.node_value(
-                            anteil, '//Eigentumsform'
-                        ),
-                        'anteil_zaehler': self.node_value(
-                            anteil, '//AnteilZaehler'
-                        ),
-                        'anteil_nenner': self.node_value(
-                            anteil, '//AnteilNenner'
-                        ),
-                        'berechtigte': self.node_value(node, '//Berechtigte')
-                    })
+                anteil = index.find(node, '//InhaltEigentumAnteil')
+                if anteil is not None and 'bisEGBTBID' not in anteil.attrib:
+                    rechte[egrid].append(Recht(
+                        index.node_value(node, '//Nummer'),
+                        index.node_value(anteil, '//Eigentumsform'),
+                        index.node_value(anteil, '//AnteilZaehler'),
+                        index.node_value(anteil, '//AnteilNenner'),
+                        index.node_value(node, '//Berechtigte')
+                    ))
                 # else skip obsolete Recht
+                break
 
-        return rechte
-
-    def collect_eigentuemer(self, grundstueck_info, rechte, personen,
-                            grundstuecke, recursive):
+    def collect_eigentuemer(self, config, grundstueck_info, rechte, personen,
+                            grundstuecke, recursive, memo=None):
         """Collect nested Berechtigte.
 
+        Owner infos of berechtigte Grundstuecke are requested together
+        before collecting the Berechtigte.
+
+        :param PlotOwnerConfig config: Compiled PlotOwner config
         :param obj grundstueck_info: Grundstueck info for EGRID
         :param list[obj] rechte: List of Recht for EGRID
         :param obj personen: Lookup for Person info by Nummer
         :param obj grundstuecke: Lookup for Grundstueck info by Nummer
         :param bool recursive: Recursively get owner info of berechtigte
                                Grundstuecke if set
+        :param LRUCache memo: Optional memo of owner infos by EGRID
         """
         eigentumsform = None
         eigentum_art = None
@@ -452,22 +895,30 @@ class PlotOwner:
 
         grundstuecksarten = set()
 
+        sub_owner_infos = {}
+        if recursive:
+            # get owner infos of berechtigte Grundstuecke
+            sub_egrids = [
+                recht.berechtigter.egrid for recht in rechte
+                if isinstance(recht.berechtigter, Grundstueck)
+            ]
+            sub_owner_infos = self.get_owner_infos(
+                config, list(dict.fromkeys(sub_egrids)), memo
+            )
+
         for recht in rechte:
-            eigentumsform = recht.get('eigentumsform')
-            berechtigte_id = recht.get('berechtigte')
+            eigentumsform = recht.eigentumsform
+            berechtigter = recht.berechtigter
 
-            person = personen.get(berechtigte_id)
-            if person:
-                if 'teilhaber' in person:
+            if isinstance(berechtigter, (Person, Gemeinschaft)):
+                person = berechtigter
+                if isinstance(person, Gemeinschaft):
                     # Berechtigte is Gemeinschaft
                     # flatten mitglieder
-                    mitglieder = self.flatten_mitglieder(person, personen)
+                    mitglieder = self.flatten_mitglieder(person)
                     # sort
                     mitglieder.sort(
-                        key=lambda l: (
-                            l.get('vornamen') or '',
-                            l.get('name'), l.get('strasse')
-                        )
+                        key=lambda l: (l.vornamen or '', l.name, l.strasse)
                     )
 
                     # collect unique addresses
@@ -488,17 +939,15 @@ class PlotOwner:
                     eigentuemer.append({
                         'berechtigte': [self.format_adresse(person)]
                     })
-            elif grundstuecke.get(berechtigte_id):
+            elif isinstance(berechtigter, Grundstueck):
                 # Berechtigte is Grundstueck
-                grundstueck = grundstuecke.get(berechtigte_id)
-                grundstuecksarten.add(grundstueck.get('art'))
+                grundstueck = berechtigter
+                grundstuecksarten.add(grundstueck.art)
 
                 berechtigte = []
                 if recursive:
                     # collect Berechtigte of Grundstueck
-                    sub_owner_info = self.get_owner_info(
-                        grundstueck.get('egrid')
-                    )
+                    sub_owner_info = sub_owner_infos[grundstueck.egrid]
                     if 'error' in sub_owner_info:
                         # mark as error
                         self.logger.error(sub_owner_info['error'])
@@ -508,7 +957,7 @@ class PlotOwner:
                         sub_personen = sub_owner_info.get('personen')
                         sub_rechte = sub_owner_info.get('rechte')
                         sub_eigentuemer = self.collect_eigentuemer(
-                            grundstueck, sub_rechte, sub_personen,
+                            config, grundstueck, sub_rechte, sub_personen,
                             sub_grundstuecke, False
                         )
 
@@ -526,8 +975,7 @@ class PlotOwner:
                                     'GewoehnlichesMiteigentum'
                                 )
                             )
-                        elif (grundstueck.get('art') ==
-                                'GewoehnlichesMiteigentum'):
+                        elif grundstueck.art == 'GewoehnlichesMiteigentum':
                             # flatten Berechtigte of GewoehnlichesMiteigentum
                             sub_berechtigte = []
                             sub_grundstuecke = []
@@ -557,12 +1005,10 @@ class PlotOwner:
 
                 # sort keys
                 try:
-                    sort_nummer = int(grundstueck.get('nummer') or 0)
+                    sort_nummer = int(grundstueck.nummer or 0)
                 except ValueError:
                     sort_nummer = 0
-                sort_nummer_zusatz = int(
-                    grundstueck.get('nummer_zusatz') or 0
-                )
+                sort_nummer_zusatz = int(grundstueck.nummer_zusatz or 0)
 
                 sub_eigentum = {
                     'grundstueck': self.format_grundstueck(grundstueck),
@@ -572,19 +1018,14 @@ class PlotOwner:
                 }
                 sub_eigentum['berechtigte'] = berechtigte
 
-                if (
-                    grundstueck.get('art') == 'StockwerksEinheit'
-                    and 'beschreibung' in grundstueck
-                ):
+                if grundstueck.art == 'StockwerksEinheit':
                     # add StockwerksEinheit Beschreibung
-                    sub_eigentum['beschreibung'] = grundstueck.get(
-                        'beschreibung'
-                    )
+                    sub_eigentum['beschreibung'] = grundstueck.beschreibung
 
                 eigentuemer.append(sub_eigentum)
             else:
                 self.logger.error(
-                    "Could not find Berechtigte %s" % berechtigte_id
+                    "Could not find Berechtigte %s" % recht.berechtigte
                 )
 
         # sort eigentuemer by GB-Nr. and first Berechtigte
@@ -615,67 +1056,79 @@ class PlotOwner:
             'eigentum_art': eigentum_art,
             'eigentuemer': eigentuemer
         }
-        if (
-            grundstueck_info.get('art') == 'StockwerksEinheit'
-            and 'beschreibung' in grundstueck_info
-        ):
+        if grundstueck_info.art == 'StockwerksEinheit':
             # add StockwerksEinheit Beschreibung
-            eigentum['beschreibung'] = grundstueck_info.get('beschreibung')
+            eigentum['beschreibung'] = grundstueck_info.beschreibung
 
         return eigentum
 
-    def flatten_mitglieder(self, gemeinschaft, personen):
-        """Recursively collect flattened list of Mitglieder of Gemeinschaft.
+    def flatten_mitglieder(self, gemeinschaft):
+        """Collect flattened list of Personen of Gemeinschaft and its nested
+        Gemeinschaften.
 
-        :param obj gemeinschaft: Gemeinschaft info
-        :param obj personen: Lookup for Person info by Nummer
+        Gemeinschaften already being flattened are skipped, to avoid cycles.
+
+        :param Gemeinschaft gemeinschaft: Gemeinschaft
         """
         mitglieder = []
 
-        for teilhaber_id in gemeinschaft.get('teilhaber', []):
-            mitglied = personen.get(teilhaber_id)
-            if mitglied:
-                if 'teilhaber' in mitglied:
-                    # Gemeinschaft
-                    mitglieder += self.flatten_mitglieder(mitglied, personen)
-                else:
-                    # Person
-                    mitglieder.append(mitglied)
+        # iterators over Mitglieder of nested Gemeinschaften
+        stack = [iter(gemeinschaft.mitglieder)]
+        path = [gemeinschaft]
+        while stack:
+            mitglied = next(stack[-1], None)
+            if mitglied is None:
+                # all Mitglieder of Gemeinschaft done
+                stack.pop()
+                path.pop()
+            elif isinstance(mitglied, Gemeinschaft):
+                if mitglied in path:
+                    self.logger.error(
+                        "Skipping cyclic Gemeinschaft %s" % mitglied.name
+                    )
+                    continue
+                stack.append(iter(mitglied.mitglieder))
+                path.append(mitglied)
             else:
-                self.logger.error("Could not find Mitglied %s" % teilhaber_id)
+                # Person
+                mitglieder.append(mitglied)
 
         return mitglieder
 
     def format_adresse(self, person):
         """Return fomatted address for a Person.
 
-        :param obj person: Person info
+        The formatted address is memoized in the Person.
+
+        :param Person person: Person
         """
+        if person.adresse is not None:
+            return person.adresse
+
         name = (' ').join(
-            filter(None, [person.get('vornamen'), person.get('name')])
+            filter(None, [person.vornamen, person.name])
         )
         strasse = (' ').join(
-            filter(None, [person.get('strasse'), person.get('hausnummer')])
+            filter(None, [person.strasse, person.hausnummer])
         )
-        ort = (' ').join(filter(None, [person.get('plz'), person.get('ort')]))
-        land = person.get('land')
+        ort = (' ').join(filter(None, [person.plz, person.ort]))
+        land = person.land
         if land == 'Schweiz':
             # skip default country
             land = None
 
-        return (', ').join(filter(None, [name, strasse, ort, land]))
+        person.adresse = (', ').join(filter(None, [name, strasse, ort, land]))
+        return person.adresse
 
     def format_grundstueck(self, grundstueck):
         """Return fomatted name for a Grundstueck.
 
-        :param obj person: Grundstueck info
+        :param Grundstueck grundstueck: Grundstueck
         """
         nummer = ('-').join(
-            filter(None, [
-                grundstueck.get('nummer'), grundstueck.get('nummer_zusatz')
-            ])
+            filter(None, [grundstueck.nummer, grundstueck.nummer_zusatz])
         )
-        return "GB-Nr. %s %s" % (nummer, grundstueck.get('municipality_name'))
+        return "GB-Nr. %s %s" % (nummer, grundstueck.municipality_name)
 
     def lookup_eigentumsform(self, eigentumsform):
         """Lookup text for eigentumsform or -art
@@ -684,55 +1137,240 @@ class PlotOwner:
         """
         return self.EIGENTUMSFORM_LOOKUP.get(eigentumsform, eigentumsform)
 
+    def rss(self):
+        """Return current resident set size of worker process in bytes, or
+        None if not available."""
+        try:
+            with open('/proc/self/statm') as f:
+                pages = int(f.read().split()[1])
+            return pages * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError, AttributeError):
+            # not available on this platform
+            return None
+
+    def rss_change(self, rss_before):
+        """Return formatted change of resident set size of worker process
+        since a previous value.
+
+        :param int rss_before: Previous resident set size in bytes or None
+        """
+        rss = self.rss()
+        if rss is None or rss_before is None:
+            return "n/a"
+        return "%+.1f MB" % ((rss - rss_before) / 1024 / 1024)
+
+    def max_rss(self):
+        """Return formatted peak resident set size over the lifetime of
+        the worker process."""
+        if resource is None:
+            return "n/a"
+
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != 'darwin':
+            # in kilobytes on Linux
+            max_rss *= 1024
+        return "%.1f MB" % (max_rss / 1024 / 1024)
+
     # XML parse helpers
 
-    def find(self, parent, path):
-        """Find first subnode of parent node matching path.
+    def local_name(self, tag):
+        """Return tag name without namespace.
 
-        XML namespaces are ignored.
+        :param str tag: Element tag
+        """
+        return tag.rsplit('}', 1)[-1]
+
+
+class PlotOwnerConfig:
+    """PlotOwnerConfig class
+
+    Compiled PlotOwner config for a tenant.
+    """
+
+    def __init__(self, config, tenant, registry, upstream_client):
+        """Constructor
 
-        :param obj parent: Parent node
-        :param str path: Path to subnode (use `//` for any sublevel)
+        :param RuntimeConfig config: Tenant config
+        :param str tenant: Tenant name
+        :param TenantRegistry registry: Registry for shared memos and
+                                        captcha tickets
+        :param UpstreamClient upstream_client: Shared upstream HTTP sessions
         """
-        match = parent
-        any_level = False
-        for part in path.split("/"):
-            if part == '':
-                # mark as any level
-                any_level = True
-                continue
+        self.session = upstream_client.session(config)
+        self.gbdbs_service_url = config.get('gbdbs_service_url')
+        self.gbdbs_timeout = float(config.get('gbdbs_timeout', 60))
+        # max size of GBDBS responses in bytes (0 for no limit)
+        self.gbdbs_max_response_size = int(
+            float(config.get('gbdbs_max_response_size', 100)) * 1024 * 1024
+        )
+        # max number of EGRIDs of berechtigte Grundstuecke per GBDBS request
+        self.gbdbs_batch_size = max(int(config.get('gbdbs_batch_size', 1)), 1)
+        # max number of concurrent GBDBS requests for berechtigte
+        # Grundstuecke per request
+        self.gbdbs_concurrency = max(
+            int(config.get('gbdbs_concurrency', 1)), 1
+        )
+        self.recaptcha_timeout = float(config.get('recaptcha_timeout', 60))
+        self.hide_owner_addresses = config.get('hide_owner_addresses', False)
+        self.bezug_inhalt = config.get('bezug_inhalt', 'IndexMitEigentum')
+        # in-process memo of GBDBS owner infos, for each request or shared
+        self.gbdbs_memo_size = int(config.get('gbdbs_memo_size', 100))
+        self.gbdbs_memo_ttl = float(config.get('gbdbs_memo_ttl', 60))
+        self.gbdbs_memo = None
+        if config.get('gbdbs_memo_shared', False):
+            self.gbdbs_memo = registry.get(
+                tenant, 'gbdbs_memo', [
+                    self.gbdbs_memo_size, self.gbdbs_memo_ttl,
+                    self.gbdbs_service_url, self.bezug_inhalt,
+                    self.hide_owner_addresses
+                ],
+                lambda: LRUCache(self.gbdbs_memo_size, self.gbdbs_memo_ttl)
+            )
+        self.site_key = config.get('recaptcha_site_key', '')
+        self.secret_key = config.get('recaptcha_secret_key', '')
+        self.min_score = config.get('recaptcha_min_score', 0.5)
+        # tickets for skipping captcha verification after a successful
+        # verification
+        self.captcha_tickets = None
+        ticket_ttl = float(config.get('recaptcha_ticket_ttl', 0))
+        if ticket_ttl > 0 and self.site_key != '':
+            ticket_secret = (
+                config.get('recaptcha_ticket_secret') or self.secret_key
+            )
+            if not ticket_secret:
+                # do not sign tickets with an empty secret
+                raise Exception(
+                    "Captcha tickets require RECAPTCHA_TICKET_SECRET or "
+                    "RECAPTCHA_SECRET_KEY"
+                )
+            ticket_max_uses = int(config.get('recaptcha_ticket_max_uses', 10))
+            self.captcha_tickets = registry.get(
+                tenant, 'captcha_tickets',
+                [ticket_secret, ticket_ttl, ticket_max_uses],
+                lambda: CaptchaTickets(
+                    ticket_secret, ticket_ttl, ticket_max_uses
+                )
+            )
+        # number of EGRIDs resolved together for bulk plot owner infos
+        self.owner_batch_chunk_size = max(
+            int(config.get('owner_batch_chunk_size', 50)), 1
+        )
 
-            if any_level:
-                # find child on any sublevel
-                any_level = False
-                for node in match.getElementsByTagNameNS('*', part):
-                    match = node
-                    break
-                else:
-                    # no match
-                    return None
-            else:
-                # find child node
-                for node in match.childNodes:
-                    if node.nodeName.split(':')[-1] == part:
-                        match = node
-                        break
-                else:
-                    # no match
-                    return None
 
-        return match
+class CaptchaTickets:
+    """CaptchaTickets class
 
-    def node_value(self, parent, path):
-        """Get value of first subnode of parent node matching path.
+    Issue and verify signed tickets for skipping the captcha verification
+    of a client for a limited time and number of uses.
 
-        XML namespaces are ignored.
+    A ticket contains its ID, expiry time and the reCAPTCHA score, signed
+    with HMAC-SHA256 together with the client identifier. Uses of tickets
+    are counted per process, so the max number of uses is best-effort.
+    """
+
+    # max number of tickets with counted uses
+    MAX_TICKETS = 10000
+
+    def __init__(self, secret, ttl, max_uses):
+        """Constructor
 
-        :param obj parent: Parent node
-        :param str path: Path to subnode (use `//` for any sublevel)
+        :param str secret: Secret key for signing tickets
+        :param float ttl: Time in seconds until expiry of a ticket
+        :param int max_uses: Max number of uses of a ticket
         """
-        value = None
-        node = self.find(parent, path)
-        if node and node.firstChild:
-            value = node.firstChild.nodeValue
-        return value
+        self.secret = secret.encode('utf-8')
+        self.ttl = ttl
+        self.max_uses = max_uses
+        # number of uses by ticket ID
+        self.uses = LRUCache(self.MAX_TICKETS, ttl)
+        self.lock = Lock()
+
+    def issue(self, client, score):
+        """Return new ticket for client.
+
+        :param str client: Client identifier
+        :param float score: reCAPTCHA score
+        """
+        payload = "%s:%d:%.2f" % (
+            uuid.uuid4().hex, time.time() + self.ttl, score
+        )
+        return "%s:%s" % (payload, self.signature(payload, client))
+
+    def use(self, ticket, client, min_score=None):
+        """Return whether ticket is valid for client, and count its use.
+
+        :param str ticket: Ticket
+        :param str client: Client identifier
+        :param float min_score: Min reCAPTCHA score, or None to skip check
+        """
+        parts = ticket.split(':')
+        if len(parts) != 4:
+            return False
+
+        ticket_id, expires, score, signature = parts
+        payload = ':'.join(parts[:3])
+        if not hmac.compare_digest(
+            signature, self.signature(payload, client)
+        ):
+            return False
+
+        try:
+            if int(expires) <= time.time():
+                # ticket expired
+                return False
+            if min_score is not None and float(score) < min_score:
+                # score too low
+                return False
+        except ValueError:
+            return False
+
+        with self.lock:
+            uses = self.uses.get(ticket_id) or 0
+            if uses >= self.max_uses:
+                # ticket used up
+                return False
+            self.uses.set(ticket_id, uses + 1)
+
+        return True
+
+    def signature(self, payload, client):
+        """Return signature of ticket payload for client.
+
+        :param str payload: Ticket payload
+        :param str client: Client identifier
+        """
+        return hmac.new(
+            self.secret, ("%s|%s" % (payload, client)).encode('utf-8'),
+            hashlib.sha256
+        ).hexdigest()
+
+
+class GbdbsResponseReader:
+    """GbdbsResponseReader class
+
+    File-like wrapper for reading a streamed GBDBS response body, which
+    counts the bytes read and aborts if they exceed a max size.
+    """
+
+    def __init__(self, stream, max_size):
+        """Constructor
+
+        :param file stream: Response body stream
+        :param int max_size: Max number of bytes (0 for no limit)
+        """
+        self.stream = stream
+        self.max_size = max_size
+        self.size = 0
+
+    def read(self, size=-1):
+        """Read up to size bytes.
+
+        :param int size: Max number of bytes to read
+        """
+        data = self.stream.read(size if size >= 0 else None)
+        self.size += len(data)
+        if self.max_size > 0 and self.size > self.max_size:
+            raise Exception(
+                "GBDBS response exceeds max size of %d bytes" % self.max_size
+            )
+        return data
@@ -1,15 +1,17 @@
 import os
 
-from flask import Flask, jsonify
-from flask_restx import reqparse, Resource
+from flask import Flask, json, jsonify, request
+from flask_restx import inputs, reqparse, Resource
+from werkzeug.middleware.proxy_fix import ProxyFix
 
+from geometry import GeometryFormat
 from oereb_info import OerebInfo
 from plot_info import PlotInfo
 from plot_owner import PlotOwner
 from land_reg import LandRegExtract
+from upstream_client import UpstreamClient
 
 from qwc_services_core.api import Api, CaseInsensitiveArgument
-from qwc_services_core.app import app_nocache
 from qwc_services_core.auth import auth_manager, optional_auth, get_identity
 from qwc_services_core.database import DatabaseEngine
 from qwc_services_core.runtime_config import RuntimeConfig
@@ -18,7 +20,6 @@ from qwc_services_core.runtime_config import RuntimeConfig
 # Flask application
 app = Flask(__name__)
 app.config['RESTX_NO_DEFAULT_ROOT_RULE'] = True
-app_nocache(app)
 api = Api(app, version='1.0', title='PlotInfo service API',
           description="""API for SO!MAP PlotInfo service.
 
@@ -36,30 +37,116 @@ app.config.SWAGGER_UI_DOC_EXPANSION = 'list'
 # disable verbose 404 error message
 app.config['ERROR_404_HELP'] = False
 
+# number of trusted reverse proxies in front of the service, whose
+# X-Forwarded-For headers determine the client address
+trusted_proxies = int(os.environ.get('TRUSTED_PROXIES', 0))
+if trusted_proxies > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies)
+
+
+# path prefixes of routes whose responses must never be stored
+NO_STORE_PATHS = ('/plot_owner', '/landreg/')
+
+
+@app.after_request
+def add_cache_headers(response):
+    """Disable caching of responses, but allow revalidation of responses
+    with an ETag by the client.
+
+    Responses of plot owner and land register routes are never stored.
+    """
+    if (
+        response.headers.get('ETag') and
+        not request.path.startswith(NO_STORE_PATHS)
+    ):
+        # allow revalidation, but not storing in shared caches
+        response.headers["Cache-Control"] = "private, no-cache"
+    else:
+        response.headers["Cache-Control"] = \
+            "no-cache, no-store, must-revalidate, max-age=0"
+        response.headers["Pragma"] = "no-cache"
+        response.headers["Expires"] = "0"
+    return response
+
+
 # setup the Flask-JWT-Extended extension
 jwt = auth_manager(app)
 
 config_handler = RuntimeConfig("plotinfo", app.logger)
 db_engine = DatabaseEngine()
+upstream_client = UpstreamClient()
 
 # create plot info
 plot_info = PlotInfo(config_handler, db_engine, app.logger)
 # create ÖREB info
-oereb_info = OerebInfo(config_handler, app.logger)
+oereb_info = OerebInfo(config_handler, upstream_client, app.logger)
 # create plot owner info
-plot_owner = PlotOwner(config_handler, db_engine, app.logger)
+plot_owner = PlotOwner(
+    config_handler, db_engine, upstream_client, app.logger
+)
 # create land register extract
-land_reg = LandRegExtract(config_handler, db_engine, app.logger)
-
-# request parser
-pos_parser = reqparse.RequestParser(argument_class=CaseInsensitiveArgument)
+land_reg = LandRegExtract(
+    config_handler, db_engine, upstream_client, app.logger
+)
+
+
+def non_negative_float(value):
+    """Return value as float, if it is not negative."""
+    value = float(value)
+    if not value >= 0:
+        raise ValueError("Invalid argument: %s. Must be >= 0" % value)
+    return value
+
+
+# request parsers
+geom_parser = reqparse.RequestParser(argument_class=CaseInsensitiveArgument)
+geom_parser.add_argument(
+    'geom_format', choices=GeometryFormat.FORMATS, default='wkt',
+    location='args', help="Geometry encoding (wkt, geojson or polyline)"
+)
+geom_parser.add_argument(
+    'geom_precision', type=inputs.int_range(0, GeometryFormat.MAX_PRECISION),
+    location='args', help="Number of decimal places of geometry coordinates"
+)
+geom_parser.add_argument(
+    'geom_tolerance', type=non_negative_float, location='args',
+    help="Geometry simplification tolerance in map units"
+)
+
+pos_parser = geom_parser.copy()
 pos_parser.add_argument('x', type=float, required=True)
 pos_parser.add_argument('y', type=float, required=True)
 
-plot_owner_parser = reqparse.RequestParser(argument_class=CaseInsensitiveArgument)
+plot_owner_parser = reqparse.RequestParser(
+    argument_class=CaseInsensitiveArgument
+)
 plot_owner_parser.add_argument('token')
 
 
+def geom_format():
+    """Return geometry output format from request params."""
+    args = geom_parser.parse_args()
+    return GeometryFormat(
+        args['geom_format'], args['geom_precision'], args['geom_tolerance']
+    )
+
+
+def request_items():
+    """Return list or iterator of items in a JSON array or NDJSON request
+    body, or None if the request body is invalid.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        # stream items from NDJSON lines
+        return (
+            json.loads(line) for line in request.stream if line.strip()
+        )
+
+    items = request.get_json(force=True, silent=True)
+    if not isinstance(items, list):
+        return None
+    return items
+
+
 # routes
 @api.route('/', endpoint='root')
 class QueryPos(Resource):
@@ -72,18 +159,60 @@ class QueryPos(Resource):
         Return basic plot information at coordinates.
         """
         args = pos_parser.parse_args()
-        return plot_info.basic_info(args['x'], args['y'])
+        return plot_info.basic_info(args['x'], args['y'], geom_format())
+
+
+@api.route('/batch')
+class QueryPosBatch(Resource):
+    @api.expect(geom_parser, [[float]])
+    def post(self):
+        """Basic plot info for multiple positions
+
+        Return basic plot information at multiple coordinates as NDJSON,
+        in input order.
+
+        Request body is a JSON array or NDJSON of coordinates in LV95 as
+        `[x, y]` or `{"x": x, "y": y}`.
+        """
+        positions = request_items()
+        if positions is None:
+            return {
+                'error': "Invalid request body",
+                'success': False
+            }, 400
+        return plot_info.basic_info_batch(positions, geom_format())
+
+
+@api.route('/query')
+class QueryEgridBatch(Resource):
+    @api.expect(geom_parser, [str])
+    def post(self):
+        """Basic plot info for multiple EGRIDs
+
+        Return basic plot information for multiple EGRIDs as NDJSON,
+        in input order.
+
+        Request body is a JSON array or NDJSON of EGRIDs.
+        """
+        egrids = request_items()
+        if egrids is None:
+            return {
+                'error': "Invalid request body",
+                'success': False
+            }, 400
+        return plot_info.basic_info_egrid_batch(egrids, geom_format())
 
 
 @api.route('/query/<egrid>')
 class QueryEgrid(Resource):
     @api.param('egrid', 'EGRID', required=True)
+    @api.expect(geom_parser)
     def get(self, egrid):
         """Basic plot info
 
         Return basic plot information by egrid.
         """
-        return plot_info.basic_info_egrid(egrid)
+        return plot_info.basic_info_egrid(egrid, geom_format())
 
 
 @api.route('/plot/<egrid>')
@@ -141,6 +270,33 @@ class PlotOwnerCaptcha(Resource):
         return plot_owner.captcha(egrid)
 
 
+@api.route('/plot_owner')
+class PlotOwnerBatch(Resource):
+    @api.doc(body=[str])
+    @optional_auth
+    def post(self):
+        """Plot owner for multiple EGRIDs
+
+        Return additional plot owner information for multiple EGRIDs as
+        NDJSON, in input order. Only available for signed in users.
+
+        Request body is a JSON array or NDJSON of EGRIDs.
+        """
+        if get_identity() is None:
+            return {
+                'error': "Authentication required",
+                'success': False
+            }, 401
+
+        egrids = request_items()
+        if egrids is None:
+            return {
+                'error': "Invalid request body",
+                'success': False
+            }, 400
+        return plot_owner.info_batch(egrids)
+
+
 @api.route('/plot_owner/<egrid>')
 @api.param('egrid', 'EGRID')
 class PlotOwner(Resource):
@@ -184,6 +340,13 @@ def ready():
     return jsonify({"status": "OK"})
 
 
+""" upstream connection pool metrics endpoint, if enabled """
+if os.environ.get('UPSTREAM_METRICS', 'false').lower() in ('1', 'true'):
+    @app.route("/metrics/upstream", methods=['GET'])
+    def upstream_metrics():
+        return jsonify(upstream_client.stats())
+
+
 """ liveness probe endpoint """
 @app.route("/healthz", methods=['GET'])
 def healthz():
@@ -193,4 +356,7 @@ def healthz():
 # local webserver
 if __name__ == '__main__':
     print("Starting PlotInfo service...")
-    app.run(host='localhost', port=os.environ.get("FLASK_RUN_PORT", 5000), debug=True)
+    app.run(
+        host='localhost', port=os.environ.get("FLASK_RUN_PORT", 5000),
+        debug=True
+    )
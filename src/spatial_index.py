@@ -0,0 +1,210 @@
+from array import array
+import math
+from threading import Lock, Thread
+import time
+
+
+class PackedRTree:
+    """PackedRTree class
+
+    Static array-backed R-tree of bounding boxes, packed with the
+    Sort-Tile-Recursive (STR) algorithm.
+    """
+
+    def __init__(self, boxes, node_size=16):
+        """Constructor
+
+        :param list boxes: Bounding boxes as (xmin, ymin, xmax, ymax)
+        :param int node_size: Max number of children per node
+        """
+        self.node_size = node_size
+        self.num_items = len(boxes)
+
+        # node boxes as flat [xmin, ymin, xmax, ymax, ...], with leaf nodes
+        # first and parent nodes level by level up to the root node
+        self.boxes = array('d')
+        # item index for leaf nodes, position of first child for parent nodes
+        self.indices = array('q')
+        # end positions of each level
+        self.level_bounds = []
+
+        if self.num_items == 0:
+            return
+
+        for i in self.str_order(boxes):
+            self.boxes.extend(boxes[i])
+            self.indices.append(i)
+        self.level_bounds.append(self.num_items)
+
+        # build parent levels
+        start = 0
+        end = self.num_items
+        while end - start > 1:
+            for pos in range(start, end, node_size):
+                child_end = min(pos + node_size, end)
+                xmin = ymin = math.inf
+                xmax = ymax = -math.inf
+                for child in range(pos, child_end):
+                    offset = child * 4
+                    xmin = min(xmin, self.boxes[offset])
+                    ymin = min(ymin, self.boxes[offset + 1])
+                    xmax = max(xmax, self.boxes[offset + 2])
+                    ymax = max(ymax, self.boxes[offset + 3])
+                self.boxes.extend((xmin, ymin, xmax, ymax))
+                self.indices.append(pos)
+            start = end
+            end = len(self.indices)
+            self.level_bounds.append(end)
+
+    def str_order(self, boxes):
+        """Return item indices in Sort-Tile-Recursive order.
+
+        :param list boxes: Bounding boxes as (xmin, ymin, xmax, ymax)
+        """
+        centers = [
+            ((b[0] + b[2]) * 0.5, (b[1] + b[3]) * 0.5) for b in boxes
+        ]
+        order = sorted(range(len(boxes)), key=lambda i: centers[i][0])
+
+        # sort vertical slices by y
+        num_leaves = math.ceil(len(boxes) / self.node_size)
+        slice_size = math.ceil(math.sqrt(num_leaves)) * self.node_size
+        result = []
+        for start in range(0, len(order), slice_size):
+            tile = order[start:start + slice_size]
+            tile.sort(key=lambda i: centers[i][1])
+            result += tile
+
+        return result
+
+    def search(self, xmin, ymin, xmax, ymax):
+        """Return indices of items whose bounding box intersects bbox.
+
+        :param float xmin: Min X of bbox
+        :param float ymin: Min Y of bbox
+        :param float xmax: Max X of bbox
+        :param float ymax: Max Y of bbox
+        """
+        results = []
+        if self.num_items == 0:
+            return results
+
+        boxes = self.boxes
+        stack = [(len(self.indices) - 1, len(self.level_bounds) - 1)]
+        while stack:
+            pos, level = stack.pop()
+            offset = pos * 4
+            if (
+                boxes[offset] > xmax or boxes[offset + 1] > ymax
+                or boxes[offset + 2] < xmin or boxes[offset + 3] < ymin
+            ):
+                # no intersection
+                continue
+
+            if level == 0:
+                # leaf node
+                results.append(self.indices[pos])
+            else:
+                start = self.indices[pos]
+                end = min(start + self.node_size, self.level_bounds[level - 1])
+                for child in range(start, end):
+                    stack.append((child, level - 1))
+
+        return results
+
+
+class PlotIndex:
+    """PlotIndex class
+
+    In-process spatial index of plot bounding boxes of a tenant.
+
+    The index is loaded from the DB in a background thread on first use and
+    is refreshed periodically, while the previous index is still in use.
+    """
+
+    def __init__(self, db, sql, refresh_interval, logger):
+        """Constructor
+
+        :param Engine db: Database engine
+        :param TextClause sql: SQL for plot index query
+                               (output: egrid, xmin, ymin, xmax, ymax,
+                               optional geom)
+        :param float refresh_interval: Time in seconds until index refresh
+        :param Logger logger: Application logger
+        """
+        self.db = db
+        self.sql = sql
+        self.refresh_interval = refresh_interval
+        self.logger = logger
+
+        # current index as (PackedRTree, EGRIDs, geometries or None)
+        self.index = None
+        self.loaded_at = None
+        self.loading = False
+        self.lock = Lock()
+
+    def candidates(self, xmin, ymin, xmax, ymax):
+        """Return list of (EGRID, geometry WKT or None) of plots whose
+        bounding box intersects bbox, or None if index is not yet loaded.
+
+        :param float xmin: Min X of bbox
+        :param float ymin: Min Y of bbox
+        :param float xmax: Max X of bbox
+        :param float ymax: Max Y of bbox
+        """
+        self.check_refresh()
+
+        index = self.index
+        if index is None:
+            return None
+
+        tree, egrids, geoms = index
+        return [
+            (egrids[i], geoms[i] if geoms is not None else None)
+            for i in tree.search(xmin, ymin, xmax, ymax)
+        ]
+
+    def check_refresh(self):
+        """Start loading index in background if not loaded or expired."""
+        with self.lock:
+            if self.loading:
+                return
+            if (
+                self.loaded_at is not None and
+                time.monotonic() - self.loaded_at < self.refresh_interval
+            ):
+                return
+            self.loading = True
+
+        Thread(target=self.load, name='plot_index', daemon=True).start()
+
+    def load(self):
+        """Load plot bounding boxes from DB and build index."""
+        try:
+            self.logger.info("Loading spatial plot index")
+            egrids = []
+            boxes = []
+            geoms = None
+            with self.db.connect() as conn:
+                result = conn.execute(self.sql)
+                if 'geom' in result.keys():
+                    geoms = []
+                for row in result:
+                    egrids.append(row.egrid)
+                    boxes.append((
+                        float(row.xmin), float(row.ymin),
+                        float(row.xmax), float(row.ymax)
+                    ))
+                    if geoms is not None:
+                        geoms.append(row.geom)
+
+            self.index = (PackedRTree(boxes), egrids, geoms)
+            self.logger.info(
+                "Loaded spatial plot index with %d plots" % len(egrids)
+            )
+        except Exception as e:
+            self.logger.error("Could not load spatial plot index:\n%s" % e)
+        finally:
+            with self.lock:
+                self.loaded_at = time.monotonic()
+                self.loading = False
@@ -0,0 +1,48 @@
+from threading import Lock
+
+
+class TenantRegistry:
+    """TenantRegistry class
+
+    Registry of stateful objects of tenants, like caches and indexes.
+
+    Compiled tenant configs are rebuilt whenever the tenant config changes,
+    or on every request if there is no tenant config file. Objects in the
+    registry are kept across these rebuilds, and are only replaced if their
+    own settings have changed.
+    """
+
+    def __init__(self):
+        """Constructor"""
+        # objects as {(<tenant>, <name>): (<settings>, <object>)}
+        self.entries = {}
+        self.lock = Lock()
+
+    def get(self, tenant, name, settings, factory):
+        """Return registered object of tenant, or create and register a new
+        object if none exists or its settings have changed.
+
+        :param str tenant: Tenant name
+        :param str name: Object name
+        :param obj settings: Comparable settings the object depends on
+        :param func factory: Function returning a new object
+        """
+        key = (tenant, name)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == settings:
+                return entry[1]
+
+            obj = factory()
+            self.entries[key] = (settings, obj)
+            return obj
+
+
+def config_values(config, keys):
+    """Return list of values of tenant config for keys, for use in
+    registry settings.
+
+    :param RuntimeConfig config: Tenant config
+    :param list[str] keys: Config keys
+    """
+    return [config.get(key) for key in keys]
@@ -0,0 +1,528 @@
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError,
+    wait
+)
+import http.cookiejar
+import math
+import os
+from threading import BoundedSemaphore, Lock
+import time
+from urllib.parse import urlsplit
+
+from flask import request, Response, stream_with_context
+import requests
+from requests.adapters import HTTPAdapter
+from werkzeug.wsgi import wrap_file
+
+
+# max number of upstream requests run concurrently by worker threads for
+# hedged requests (per process)
+UPSTREAM_HEDGE_MAX_WORKERS = int(
+    os.environ.get('UPSTREAM_HEDGE_MAX_WORKERS', 8)
+)
+
+
+class UpstreamUnavailable(Exception):
+    """Exception for requests rejected by an open circuit breaker."""
+    pass
+
+
+class UpstreamClient:
+    """UpstreamClient class
+
+    Shared HTTP sessions for requests to upstream services, with
+    per-host pools of keep-alive connections, and a circuit breaker with
+    latency tracking per host and request type.
+
+    Sessions are shared by all tenants with the same pool size.
+    """
+
+    # chunk size in bytes for relaying response bodies
+    CHUNK_SIZE = 65536
+
+    # headers of upstream responses which are always forwarded if present
+    FORWARD_HEADERS = ['etag', 'last-modified']
+
+    def __init__(self):
+        """Constructor"""
+        # sessions as {<pool size>: Session}
+        self.sessions = {}
+        # circuit breakers as {<host>: CircuitBreaker}
+        self.breakers = {}
+        self.lock = Lock()
+
+        # thread pool for hedged requests
+        self.executor = ThreadPoolExecutor(
+            max_workers=UPSTREAM_HEDGE_MAX_WORKERS,
+            thread_name_prefix='upstream_hedge'
+        )
+        # guard for available worker slots, to skip hedging instead of
+        # queueing requests
+        self.worker_slots = BoundedSemaphore(UPSTREAM_HEDGE_MAX_WORKERS)
+
+    def session(self, config):
+        """Return UpstreamSession with tenant settings.
+
+        :param RuntimeConfig config: Tenant config
+        """
+        return UpstreamSession(
+            self, self.pooled_session(config.get('upstream_pool_size', 10)),
+            int(config.get('upstream_breaker_failures', 5)),
+            float(config.get('upstream_breaker_reset_timeout', 30)),
+            config.get('upstream_hedge_requests', False)
+        )
+
+    def pooled_session(self, pool_size):
+        """Return shared session with connection pools of pool size.
+
+        :param int pool_size: Max number of keep-alive connections per host
+        """
+        pool_size = max(int(pool_size), 1)
+        with self.lock:
+            session = self.sessions.get(pool_size)
+            if session is None:
+                session = requests.Session()
+                # do not keep cookies of upstream responses, as the session
+                # is shared by all tenants and users
+                session.cookies.set_policy(
+                    http.cookiejar.DefaultCookiePolicy(allowed_domains=[])
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=pool_size, pool_maxsize=pool_size
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.sessions[pool_size] = session
+            return session
+
+    def breaker(self, url):
+        """Return circuit breaker for host of URL.
+
+        :param str url: Request URL
+        """
+        parts = urlsplit(url)
+        port = parts.port or {'http': 80, 'https': 443}.get(parts.scheme)
+        host = "%s://%s:%s" % (parts.scheme, parts.hostname, port)
+        with self.lock:
+            breaker = self.breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker()
+                self.breakers[host] = breaker
+            return breaker
+
+    def request(self, upstream, method, url, latency_key=None, **kwargs):
+        """Send request to upstream service and return response.
+
+        Raise UpstreamUnavailable if the circuit breaker for its host is
+        open. GET requests with a latency key are hedged if enabled: a
+        second request is sent if the first one takes longer than the p95
+        latency of requests with the same key to the host. Requests are not
+        hedged if all worker threads are busy.
+
+        :param UpstreamSession upstream: Upstream session with settings
+        :param str method: HTTP method
+        :param str url: Request URL
+        :param str latency_key: Optional key of request type for tracking
+                                latencies, e.g. the document format
+        :param obj kwargs: Request options
+        """
+        breaker = self.breaker(url)
+        if not breaker.allow(
+            upstream.breaker_failures, upstream.breaker_reset_timeout
+        ):
+            raise UpstreamUnavailable(
+                "Upstream service %s is unavailable" % urlsplit(url).netloc
+            )
+
+        delay = None
+        if (
+            upstream.hedge_requests and method == 'GET' and
+            latency_key is not None
+        ):
+            delay = breaker.latency_percentile(latency_key, 95)
+        first = None
+        if delay is not None:
+            first = self.send_async(
+                upstream, breaker, method, url, latency_key, **kwargs
+            )
+        if first is None:
+            return self.send(
+                upstream, breaker, method, url, latency_key, **kwargs
+            )
+
+        # hedged request
+        try:
+            return first.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+
+        second = self.send_async(
+            upstream, breaker, method, url, latency_key, **kwargs
+        )
+        if second is None:
+            # no free worker slots
+            return first.result()
+        breaker.record_hedge()
+        pending = {first, second}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None or not pending:
+                    for other in pending:
+                        # close response of slower request
+                        other.add_done_callback(self.close_response)
+                    return future.result()
+
+    def send(self, upstream, breaker, method, url, latency_key, **kwargs):
+        """Send request and record its result in circuit breaker.
+
+        :param UpstreamSession upstream: Upstream session with settings
+        :param CircuitBreaker breaker: Circuit breaker of host
+        :param str method: HTTP method
+        :param str url: Request URL
+        :param str latency_key: Optional key of request type
+        :param obj kwargs: Request options
+        """
+        start = time.monotonic()
+        try:
+            response = upstream.session.request(method, url, **kwargs)
+        except Exception:
+            breaker.record(
+                False, time.monotonic() - start, upstream.breaker_failures,
+                latency_key
+            )
+            raise
+
+        breaker.record(
+            response.status_code < 500, time.monotonic() - start,
+            upstream.breaker_failures, latency_key
+        )
+        return response
+
+    def send_async(self, upstream, breaker, method, url, latency_key,
+                   **kwargs):
+        """Send request in a worker thread and return Future for response,
+        or None if there are no free worker slots.
+
+        :param UpstreamSession upstream: Upstream session with settings
+        :param CircuitBreaker breaker: Circuit breaker of host
+        :param str method: HTTP method
+        :param str url: Request URL
+        :param str latency_key: Optional key of request type
+        :param obj kwargs: Request options
+        """
+        if not self.worker_slots.acquire(blocking=False):
+            return None
+        try:
+            return self.executor.submit(
+                self.run_worker, self.send, upstream, breaker, method, url,
+                latency_key, **kwargs
+            )
+        except Exception:
+            self.worker_slots.release()
+            raise
+
+    def run_worker(self, func, *args, **kwargs):
+        """Run function and release worker slot afterwards.
+
+        :param func func: Function
+        :param obj args: Function arguments
+        :param obj kwargs: Function keyword arguments
+        """
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.worker_slots.release()
+
+    def close_response(self, future):
+        """Close response of a finished request Future.
+
+        :param Future future: Future for response
+        """
+        if future.exception() is None:
+            future.result().close()
+
+    def stats(self):
+        """Return connection pool and circuit breaker stats per host.
+
+        Pool hits are requests which reused a keep-alive connection,
+        pool misses are requests which opened a new connection.
+        """
+        stats = {}
+        with self.lock:
+            sessions = list(self.sessions.values())
+            breakers = dict(self.breakers)
+
+        for host, breaker in breakers.items():
+            stats[host] = breaker.stats()
+
+        for session in sessions:
+            adapters = set(session.adapters.values())
+            for adapter in adapters:
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is None:
+                        # pool has been evicted
+                        continue
+
+                    host = "%s://%s:%s" % (pool.scheme, pool.host, pool.port)
+                    host_stats = stats.setdefault(host, {})
+                    for key in ['requests', 'hits', 'misses']:
+                        host_stats.setdefault(key, 0)
+                    host_stats['requests'] += pool.num_requests
+                    host_stats['misses'] += pool.num_connections
+                    host_stats['hits'] += max(
+                        pool.num_requests - pool.num_connections, 0
+                    )
+
+        return stats
+
+    def proxy_headers(self, req, header_names):
+        """Return headers of upstream response to forward.
+
+        :param Response req: Upstream response
+        :param list header_names: Names of additional headers to forward
+        """
+        return {
+            name: req.headers[name]
+            for name in header_names + self.FORWARD_HEADERS
+            if name in req.headers
+        }
+
+    def proxy_response(self, req, header_names, chunks=None):
+        """Return response relaying the body of a streamed upstream
+        response.
+
+        Unencoded bodies are relayed as file via the server's file wrapper
+        if available, so the server reads them in large blocks without
+        a Python loop over chunks.
+
+        :param Response req: Upstream response with stream=True
+        :param list header_names: Names of additional headers to forward
+        :param iter chunks: Optional body chunks to stream instead of
+                            upstream response body
+        """
+        headers = self.proxy_headers(req, header_names)
+        encoded = 'content-encoding' in req.headers
+        if not encoded and 'content-length' in req.headers:
+            # body is relayed unchanged
+            headers['content-length'] = req.headers['content-length']
+
+        if chunks is not None:
+            response = Response(
+                stream_with_context(chunks), status=req.status_code
+            )
+        elif encoded:
+            # decode body
+            response = Response(
+                req.iter_content(chunk_size=self.CHUNK_SIZE),
+                status=req.status_code
+            )
+        else:
+            response = Response(
+                wrap_file(
+                    request.environ, UpstreamBody(req), self.CHUNK_SIZE
+                ),
+                status=req.status_code, direct_passthrough=True
+            )
+
+        for name, value in headers.items():
+            response.headers[name] = value
+        return response
+
+
+class UpstreamSession:
+    """UpstreamSession class
+
+    Shared session for requests to upstream services with tenant settings
+    for circuit breaker and hedged requests.
+    """
+
+    def __init__(self, client, session, breaker_failures,
+                 breaker_reset_timeout, hedge_requests):
+        """Constructor
+
+        :param UpstreamClient client: Upstream client
+        :param Session session: Shared requests session
+        :param int breaker_failures: Number of consecutive failures until
+                                     circuit breaker opens (0 to disable)
+        :param float breaker_reset_timeout: Time in seconds until a request
+                                            is allowed again after circuit
+                                            breaker opened
+        :param bool hedge_requests: Whether to hedge GET requests
+        """
+        self.client = client
+        self.session = session
+        self.breaker_failures = breaker_failures
+        self.breaker_reset_timeout = breaker_reset_timeout
+        self.hedge_requests = hedge_requests
+
+    def get(self, url, latency_key=None, **kwargs):
+        """Send GET request and return response.
+
+        :param str url: Request URL
+        :param str latency_key: Optional key of request type for tracking
+                                latencies, required for hedging
+        :param obj kwargs: Request options
+        """
+        return self.client.request(self, 'GET', url, latency_key, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Send POST request and return response.
+
+        :param str url: Request URL
+        :param obj kwargs: Request options
+        """
+        return self.client.request(self, 'POST', url, **kwargs)
+
+
+class CircuitBreaker:
+    """CircuitBreaker class
+
+    Track failures and latencies per request type of requests to an
+    upstream host. Requests are rejected after too many consecutive
+    failures, until a single trial request after a reset timeout decides
+    whether the breaker closes again.
+    """
+
+    # number of recent latencies used for percentiles
+    LATENCY_SAMPLES = 100
+    # min number of latencies required for percentiles
+    MIN_LATENCY_SAMPLES = 20
+
+    def __init__(self):
+        """Constructor"""
+        self.lock = Lock()
+        # number of consecutive failures
+        self.failures = 0
+        # time when breaker opened, or None if closed
+        self.opened_at = None
+        # whether a trial request is pending while breaker is open
+        self.trial = False
+        # recent latencies as {<latency key>: deque}
+        self.latencies = {}
+
+        # counters for stats
+        self.total = 0
+        self.errors = 0
+        self.rejected = 0
+        self.hedged = 0
+
+    def allow(self, max_failures, reset_timeout):
+        """Return whether a request is allowed.
+
+        :param int max_failures: Number of consecutive failures until
+                                 breaker opens (0 to disable)
+        :param float reset_timeout: Time in seconds until a trial request
+                                    is allowed after breaker opened
+        """
+        with self.lock:
+            if self.opened_at is None or max_failures <= 0:
+                return True
+            if (
+                not self.trial and
+                time.monotonic() - self.opened_at >= reset_timeout
+            ):
+                # allow trial request
+                self.trial = True
+                return True
+
+            self.rejected += 1
+            return False
+
+    def record(self, success, latency, max_failures, latency_key=None):
+        """Record result of a request.
+
+        :param bool success: Whether request succeeded
+        :param float latency: Request duration in seconds
+        :param int max_failures: Number of consecutive failures until
+                                 breaker opens (0 to disable)
+        :param str latency_key: Optional key of request type, latencies
+                                are only recorded if set
+        """
+        with self.lock:
+            self.total += 1
+            if latency_key is not None:
+                latencies = self.latencies.get(latency_key)
+                if latencies is None:
+                    latencies = deque(maxlen=self.LATENCY_SAMPLES)
+                    self.latencies[latency_key] = latencies
+                latencies.append(latency)
+            self.trial = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.errors += 1
+                self.failures += 1
+                if max_failures > 0 and (
+                    self.failures >= max_failures
+                    or self.opened_at is not None
+                ):
+                    # open breaker or restart reset timeout
+                    self.opened_at = time.monotonic()
+
+    def record_hedge(self):
+        """Record a hedged request."""
+        with self.lock:
+            self.hedged += 1
+
+    def latency_percentile(self, latency_key, percentile):
+        """Return latency percentile in seconds of requests with latency key,
+        or None if there are not enough samples.
+
+        :param str latency_key: Key of request type
+        :param float percentile: Percentile (0 - 100)
+        """
+        with self.lock:
+            latencies = self.latencies.get(latency_key, ())
+            if len(latencies) < self.MIN_LATENCY_SAMPLES:
+                return None
+            latencies = sorted(latencies)
+
+        index = max(math.ceil(len(latencies) * percentile / 100) - 1, 0)
+        return latencies[index]
+
+    def stats(self):
+        """Return request and circuit breaker stats."""
+        with self.lock:
+            latency_keys = list(self.latencies.keys())
+        p95 = {
+            key: self.latency_percentile(key, 95) for key in latency_keys
+        }
+        with self.lock:
+            return {
+                'breaker': 'open' if self.opened_at is not None else 'closed',
+                'upstream_requests': self.total,
+                'errors': self.errors,
+                'rejected': self.rejected,
+                'hedged': self.hedged,
+                'latency_p95': p95
+            }
+
+
+class UpstreamBody:
+    """UpstreamBody class
+
+    File-like wrapper for the raw body of a streamed upstream response.
+    """
+
+    def __init__(self, req):
+        """Constructor
+
+        :param Response req: Upstream response with stream=True
+        """
+        self.req = req
+
+    def read(self, size=-1):
+        """Read up to size bytes from upstream response body.
+
+        :param int size: Max number of bytes to read
+        """
+        return self.req.raw.read(size)
+
+    def close(self):
+        """Close upstream response and release its connection."""
+        self.req.close()
@@ -0,0 +1,113 @@
+import logging
+
+import pytest
+
+from lru_cache import LRUCache
+from plot_info import PlotInfo
+
+
+def square_plot(egrid, xmin, ymin, size):
+    xmax = xmin + size
+    ymax = ymin + size
+    return {
+        'egrid': egrid,
+        'bbox': [xmin, ymin, xmax, ymax],
+        'geom': 'POLYGON((%s %s,%s %s,%s %s,%s %s,%s %s))' % (
+            xmin, ymin, xmax, ymin, xmax, ymax, xmin, ymax, xmin, ymin
+        )
+    }
+
+
+PLOTS = [
+    square_plot('CH1', 0, 0, 10),
+    square_plot('CH2', 10, 0, 10)
+]
+
+
+class FakeDb:
+    def connect(self):
+        return self
+
+    def close(self):
+        pass
+
+
+class Config:
+    db = FakeDb()
+    basic_info_sql = None
+    basic_info_cache_cell_size = 20
+
+    def __init__(self, max_vertices):
+        self.basic_info_cache = LRUCache(10, 60)
+        self.basic_info_plot_cache = LRUCache(
+            max_vertices, 60,
+            lambda cached: 1 + sum(len(ring) for ring in cached[1])
+        )
+
+
+@pytest.fixture
+def plot_info(monkeypatch):
+    plot_info = PlotInfo(None, None, logging.getLogger('test'))
+    plot_info.queries = []
+
+    def execute(sql, params):
+        plot_info.queries.append(('cell', None))
+        return PLOTS
+
+    def query_by_egrids(config, egrids, conn):
+        plot_info.queries.append(('egrids', egrids))
+        return [plot for plot in PLOTS if plot['egrid'] in egrids]
+
+    FakeDb.execute = staticmethod(execute)
+    monkeypatch.setattr(
+        plot_info, 'query_basic_info_by_egrids', query_by_egrids
+    )
+    monkeypatch.setattr(
+        plot_info, 'format_basic_info',
+        lambda config, result, conn: [dict(plot) for plot in result]
+    )
+    return plot_info
+
+
+def egrids(plots):
+    return [plot['egrid'] for plot in plots]
+
+
+def test_cell_references_shared_plots(plot_info):
+    config = Config(100)
+
+    assert egrids(plot_info.get_basic_info_cached(config, 5, 5)) == ['CH1']
+    assert egrids(plot_info.get_basic_info_cached(config, 15, 5)) == ['CH2']
+
+    assert plot_info.queries == [('cell', None)]
+    assert config.basic_info_cache.get((0, 0)) == ('CH1', 'CH2')
+    # 5 vertices and 1 per plot
+    assert config.basic_info_plot_cache.size == 12
+
+
+def test_evicted_plots_are_queried_by_egrid(plot_info):
+    # room for a single plot
+    config = Config(6)
+
+    plot_info.get_basic_info_cached(config, 5, 5)
+    assert egrids(plot_info.get_basic_info_cached(config, 5, 5)) == ['CH1']
+
+    assert plot_info.queries == [('cell', None), ('egrids', ['CH1'])]
+
+
+def test_unparsable_geometry_matched_by_bbox(plot_info):
+    config = Config(100)
+    PLOTS.append(dict(square_plot('CH3', 0, 10, 5), geom='CURVEPOLYGON()'))
+    try:
+        assert egrids(plot_info.get_basic_info_cached(config, 2, 12)) == [
+            'CH3'
+        ]
+        assert egrids(plot_info.get_basic_info_cached(config, 5, 5)) == [
+            'CH1'
+        ]
+    finally:
+        PLOTS.pop()
+
+    # no DB query at position, cell is not cached
+    assert plot_info.queries == [('cell', None), ('cell', None)]
+    assert config.basic_info_cache.get((0, 0)) is None
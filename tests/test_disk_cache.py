@@ -0,0 +1,184 @@
+import logging
+import os
+import time
+
+from flask import Flask
+
+from disk_cache import DiskCache
+from oereb_info import OerebInfo
+from upstream_client import UpstreamClient
+
+
+def store(cache, key, data, ttl=60, headers={}):
+    writer = cache.writer(key, ttl, {'headers': headers})
+    writer.write(data)
+    writer.commit()
+
+
+def read(cache, key):
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    data, meta = entry
+    with data:
+        return data.read()
+
+
+def files(cache, suffix):
+    return [
+        name for name in os.listdir(cache.cache_dir) if name.endswith(suffix)
+    ]
+
+
+def test_round_trip(tmp_path):
+    cache = DiskCache(str(tmp_path), 1024)
+    store(cache, 'a', b'data', headers={'etag': '"1"'})
+
+    data, meta = cache.get('a')
+    with data:
+        assert data.tell() == 0
+        assert data.read() == b'data'
+    assert meta['key'] == 'a'
+    assert meta['headers'] == {'etag': '"1"'}
+    assert cache.get('b') is None
+
+
+def test_discarded_writer_stores_nothing(tmp_path):
+    cache = DiskCache(str(tmp_path), 1024)
+    writer = cache.writer('a', 60, {})
+    writer.write(b'data')
+    writer.discard()
+
+    assert cache.get('a') is None
+    assert os.listdir(cache.cache_dir) == []
+
+
+def test_replace_and_remove_update_size(tmp_path):
+    cache = DiskCache(str(tmp_path), 1024)
+    store(cache, 'a', b'x' * 100)
+    store(cache, 'a', b'y' * 50)
+
+    assert read(cache, 'a') == b'y' * 50
+    assert cache.size == 50
+    assert len(files(cache, '.data')) == 1
+
+    cache.remove('a')
+    assert cache.get('a') is None
+    assert cache.size == 0
+    assert files(cache, '.data') == []
+
+
+def test_open_entry_survives_replace(tmp_path):
+    cache = DiskCache(str(tmp_path), 1024)
+    store(cache, 'a', b'old')
+
+    data, meta = cache.get('a')
+    store(cache, 'a', b'new')
+    with data:
+        assert data.read() == b'old'
+    assert read(cache, 'a') == b'new'
+
+
+def test_expired_and_stale_entries(tmp_path):
+    cache = DiskCache(str(tmp_path), 1024, max_stale=60)
+    store(cache, 'stale', b'data', ttl=-30)
+    store(cache, 'expired', b'data', ttl=-90)
+
+    data, meta = cache.get('stale')
+    data.close()
+    assert meta['expires'] < time.time()
+    assert cache.get('expired') is None
+    assert len(files(cache, '.data')) == 1
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path), 350)
+    for i, key in enumerate(['a', 'b', 'c']):
+        store(cache, key, b'x' * 100)
+        # distinct access times
+        past = time.time() - 100 + i
+        os.utime(cache.path(key), (past, past))
+    # mark 'a' as most recently used
+    read(cache, 'a')
+
+    store(cache, 'd', b'x' * 100)
+
+    assert cache.get('b') is None
+    assert read(cache, 'a') is not None
+    assert read(cache, 'c') is not None
+    assert read(cache, 'd') is not None
+    assert cache.size == 300
+    assert len(files(cache, '.data')) == 3
+
+
+def test_entry_larger_than_max_size_is_skipped(tmp_path):
+    cache = DiskCache(str(tmp_path), 10)
+    store(cache, 'a', b'x' * 11)
+
+    assert cache.get('a') is None
+    assert os.listdir(cache.cache_dir) == []
+
+
+def test_scan_removes_stale_unreferenced_files(tmp_path):
+    cache = DiskCache(str(tmp_path), 1024)
+    past = time.time() - cache.STALE_TMP_AGE - 1
+    for name in ['old.tmp', 'old.data', 'new.tmp']:
+        path = os.path.join(cache.cache_dir, name)
+        with open(path, 'wb') as f:
+            f.write(b'x')
+        if name.startswith('old'):
+            os.utime(path, (past, past))
+
+    store(cache, 'a', b'data')
+
+    assert files(cache, '.tmp') == ['new.tmp']
+    assert 'old.data' not in files(cache, '.data')
+    assert len(files(cache, '.data')) == 1
+    assert read(cache, 'a') == b'data'
+
+
+class OffsetZeroFileWrapper:
+    """wsgi.file_wrapper which sends the whole file from offset 0,
+    like sendfile of uWSGI."""
+
+    def __init__(self, file, buffer_size=8192):
+        self.file = file
+
+    def __iter__(self):
+        offset = 0
+        while True:
+            chunk = os.pread(self.file.fileno(), 8192, offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            yield chunk
+
+    def close(self):
+        self.file.close()
+
+
+def test_served_response_sends_data_from_offset_zero(tmp_path):
+    cache = DiskCache(str(tmp_path), 1024)
+    store(cache, 'a', b'%PDF-1.4 data', headers={
+        'content-type': 'application/pdf',
+        'content-disposition': 'attachment; filename="a.pdf"'
+    })
+    oereb_info = OerebInfo(
+        None, UpstreamClient(), logging.getLogger('test')
+    )
+
+    app = Flask(__name__)
+    app.add_url_rule('/a', 'a', lambda: oereb_info.file_response(
+        *cache.get('a')
+    ))
+    response = app.test_client().get(
+        '/a', environ_base={'wsgi.file_wrapper': OffsetZeroFileWrapper}
+    )
+
+    assert response.status_code == 200
+    assert response.data == b'%PDF-1.4 data'
+    assert response.content_length == len(b'%PDF-1.4 data')
+    assert response.headers['content-type'] == 'application/pdf'
+    assert response.headers['content-disposition'] == (
+        'attachment; filename="a.pdf"'
+    )
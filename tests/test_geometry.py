@@ -0,0 +1,171 @@
+import math
+import random
+
+import pytest
+
+from geometry import (
+    encode_polyline, is_valid_ring, simplify_ring, GeometryFormat
+)
+
+
+def decode_polyline(encoded, precision):
+    coords = []
+    values = []
+    value = shift = 0
+    for char in encoded:
+        byte = ord(char) - 63
+        value |= (byte & 0x1f) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+
+    x = y = 0
+    for dx, dy in zip(values[0::2], values[1::2]):
+        x += dx
+        y += dy
+        coords.append((x / 10 ** precision, y / 10 ** precision))
+    return coords
+
+
+def segment_distance(x, y, a, b):
+    dx = b[0] - a[0]
+    dy = b[1] - a[1]
+    length_sq = dx * dx + dy * dy
+    t = 0.0
+    if length_sq > 0:
+        t = max(
+            0.0, min(1.0, ((x - a[0]) * dx + (y - a[1]) * dy) / length_sq)
+        )
+    return math.hypot(a[0] + t * dx - x, a[1] + t * dy - y)
+
+
+def noisy_ring(rnd, count, radius=100.0, noise=5.0):
+    ring = []
+    for i in range(count):
+        angle = 2 * math.pi * i / count
+        r = radius + rnd.uniform(-noise, noise)
+        ring.append((
+            2600000 + r * math.cos(angle), 1200000 + r * math.sin(angle)
+        ))
+    return ring + [ring[0]]
+
+
+def wkt(rings):
+    return "POLYGON(%s)" % ",".join(
+        "(%s)" % ",".join("%r %r" % coord for coord in ring)
+        for ring in rings
+    )
+
+
+def test_encode_polyline():
+    # example of the encoded polyline algorithm format
+    coords = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+    assert encode_polyline(coords, 5) == '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+
+
+@pytest.mark.parametrize('precision', [0, 2, 5])
+def test_encode_polyline_round_trip(precision):
+    rnd = random.Random(precision)
+    coords = [
+        (rnd.uniform(2480000, 2840000), rnd.uniform(1070000, 1300000))
+        for i in range(50)
+    ] + [(-1.5, -0.25), (0, 0)]
+
+    decoded = decode_polyline(encode_polyline(coords, precision), precision)
+
+    assert len(decoded) == len(coords)
+    for (x, y), (dx, dy) in zip(coords, decoded):
+        assert dx == pytest.approx(round(x, precision), abs=1e-9)
+        assert dy == pytest.approx(round(y, precision), abs=1e-9)
+
+
+def test_wkt_precision():
+    geom = 'POLYGON((0 0,10.04 0,10.06 10.06,0 10,0 0))'
+
+    assert GeometryFormat('wkt', 1).encode(geom) == (
+        'POLYGON((0.0 0.0,10.0 0.0,10.1 10.1,0.0 10.0,0.0 0.0))'
+    )
+    assert GeometryFormat('wkt', 0).encode(geom) == (
+        'POLYGON((0 0,10 0,10 10,0 10,0 0))'
+    )
+    # unchanged without precision and tolerance
+    assert GeometryFormat().encode(geom) == geom
+
+
+def test_polyline_format():
+    geom = 'MULTIPOLYGON(((0 0,1 0,1 1,0 0)),((5 5,6 5,6 6,5 5)))'
+
+    result = GeometryFormat('polyline').encode(geom)
+
+    assert result['type'] == 'MultiPolygon'
+    assert result['precision'] == GeometryFormat.DEFAULT_POLYLINE_PRECISION
+    assert [
+        decode_polyline(ring, result['precision'])
+        for rings in result['coordinates'] for ring in rings
+    ] == [
+        [(0, 0), (1, 0), (1, 1), (0, 0)],
+        [(5, 5), (6, 5), (6, 6), (5, 5)]
+    ]
+
+
+def test_simplify_ring_within_tolerance():
+    rnd = random.Random(1)
+    for count in (4, 10, 100, 1000):
+        ring = noisy_ring(rnd, count)
+        tolerance = 2.0
+
+        simplified = simplify_ring(ring, tolerance)
+
+        assert simplified[0] == ring[0] and simplified[-1] == ring[-1]
+        assert set(simplified) <= set(ring)
+        for x, y in ring:
+            assert min(
+                segment_distance(x, y, a, b)
+                for a, b in zip(simplified[:-1], simplified[1:])
+            ) <= tolerance + 1e-9
+
+
+def test_simplify_ring_removes_collinear_points():
+    ring = [(0, 0), (5, 0), (10, 0), (10, 5), (10, 10), (0, 10), (0, 0)]
+
+    assert simplify_ring(ring, 0.01) == [
+        (0, 0), (10, 0), (10, 10), (0, 10), (0, 0)
+    ]
+
+
+@pytest.mark.parametrize('tolerance', [0.5, 5.0, 20.0, 80.0])
+def test_simplified_geometries_are_valid(tolerance):
+    rnd = random.Random(tolerance)
+    for i in range(20):
+        shell = noisy_ring(rnd, 200, noise=30.0)
+        hole = list(reversed(noisy_ring(rnd, 50, radius=20.0, noise=5.0)))
+
+        result = GeometryFormat('geojson', 2, tolerance).encode(
+            wkt([shell, hole])
+        )
+
+        rings = [
+            [tuple(coord) for coord in ring]
+            for ring in result['coordinates']
+        ]
+        assert rings, "polygon must not be dropped"
+        for ring in rings:
+            assert is_valid_ring(ring)
+        for hole in rings[1:]:
+            assert GeometryFormat().ring_inside(hole, rings[0])
+
+
+def test_self_intersecting_simplification_falls_back_to_rounding():
+    # narrow comb whose teeth would cross after simplification
+    ring = [(0, 0), (10, 0), (10, 1), (1, 1.1), (10, 1.2), (10, 2), (0, 2),
+            (0, 0)]
+    assert is_valid_ring(ring)
+    assert not is_valid_ring(simplify_ring(ring, 5))
+
+    result = GeometryFormat('geojson', 1, 5).encode(wkt([ring]))
+
+    shell = [tuple(coord) for coord in result['coordinates'][0]]
+    assert is_valid_ring(shell)
+    assert shell == [(float(x), float(y)) for x, y in ring]
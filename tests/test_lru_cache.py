@@ -0,0 +1,48 @@
+from lru_cache import LRUCache
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(2, 60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_weighted_size():
+    cache = LRUCache(10, 60, len)
+    cache.set('a', 'x' * 4)
+    cache.set('b', 'x' * 4)
+    assert cache.size == 8
+
+    # replacing an entry only counts its new size
+    cache.set('a', 'x' * 2)
+    assert cache.size == 6
+
+    cache.set('c', 'x' * 5)
+    assert cache.get('b') is None
+    assert cache.size == 7
+
+    cache.remove('a')
+    assert cache.size == 5
+
+
+def test_value_larger_than_max_size_is_not_stored():
+    cache = LRUCache(3, 60, len)
+    cache.set('a', 'x')
+    cache.set('a', 'x' * 4)
+
+    assert cache.get('a') is None
+    assert cache.size == 0
+
+
+def test_expired_entry():
+    cache = LRUCache(10, -1, len)
+    cache.set('a', 'x')
+
+    assert cache.get('a') is None
+    assert cache.size == 0
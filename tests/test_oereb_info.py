@@ -0,0 +1,88 @@
+import logging
+import threading
+import time
+
+from flask import Flask
+import pytest
+
+from oereb_info import OerebInfo, OerebInfoConfig
+from tenant_registry import TenantRegistry
+from upstream_client import UpstreamClient
+
+
+class FakeResponse:
+    def __init__(self, url):
+        self.status_code = 404 if 'missing' in url else 200
+        self.headers = {'content-type': 'application/pdf'}
+
+    def iter_content(self, chunk_size):
+        yield b'body of %d' % self.status_code
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        # keep request pending until all clients are waiting
+        time.sleep(0.2)
+        return FakeResponse(url)
+
+
+@pytest.fixture
+def oereb_info(tmp_path):
+    session = FakeSession()
+    upstream_client = UpstreamClient()
+    upstream_client.session = lambda config: session
+    config = OerebInfoConfig({
+        'oereb_json_url': 'http://localhost/json/{egrid}',
+        'oereb_xml_url': 'http://localhost/xml/{egrid}',
+        'oereb_pdf_url': 'http://localhost/pdf/{egrid}',
+        'oereb_cache_dir': str(tmp_path)
+    }, 'test', TenantRegistry(), upstream_client)
+
+    oereb_info = OerebInfo(None, upstream_client, logging.getLogger('test'))
+    oereb_info.load_config = lambda: config
+    return oereb_info, session
+
+
+def concurrent_pdfs(oereb_info, egrid, count=4):
+    app = Flask(__name__)
+    results = []
+
+    def run():
+        with app.test_request_context():
+            response = oereb_info.pdf(egrid)
+            response.direct_passthrough = False
+            results.append((response.status_code, response.get_data()))
+
+    threads = [threading.Thread(target=run) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_requests_share_upstream_request(oereb_info):
+    oereb_info, session = oereb_info
+
+    results = concurrent_pdfs(oereb_info, 'CH1')
+
+    assert results == [(200, b'body of 200')] * 4
+    assert len(session.urls) == 1
+    assert oereb_info.fetches == {}
+
+
+def test_concurrent_requests_share_unsuccessful_response(oereb_info):
+    oereb_info, session = oereb_info
+
+    results = concurrent_pdfs(oereb_info, 'missing')
+
+    assert results == [(404, b'body of 404')] * 4
+    assert len(session.urls) == 1
+    assert oereb_info.fetches == {}
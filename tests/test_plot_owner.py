@@ -0,0 +1,119 @@
+import io
+import logging
+
+from flask import Flask
+import pytest
+
+from plot_owner import CaptchaTickets, PlotOwner, PlotOwnerConfig
+from tenant_registry import TenantRegistry
+from upstream_client import UpstreamClient
+
+
+EGRID = 'CH100000000000'
+NUMMER = '%s:1000::2407:' % EGRID
+
+RESPONSE_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<soapenv:Envelope
+    xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"
+    xmlns:ns="http://schemas.geo.admin.ch/BJ/TGBV/GBDBS/2.1">
+<soapenv:Body>
+<ns:GetParcelsByIdResponse>
+%s
+<ns:Grundstueck><ns:Liegenschaft>
+<ns:Nummer>{nummer}</ns:Nummer>
+<ns:municipalityName>Solothurn</ns:municipalityName>
+</ns:Liegenschaft></ns:Grundstueck>
+<ns:Person><ns:NatuerlichePersonGB>
+<ns:Nummer>P0</ns:Nummer>
+<ns:InhaltNatuerlichePersonGB>
+<ns:Name>Muster</ns:Name><ns:Vornamen>Hans</ns:Vornamen>
+</ns:InhaltNatuerlichePersonGB>
+</ns:NatuerlichePersonGB></ns:Person>
+<ns:Recht><ns:EigentumAnteil>
+<ns:Nummer>R0</ns:Nummer>
+<ns:belastetesGrundstueck>{nummer}</ns:belastetesGrundstueck>
+<ns:InhaltEigentumAnteil>
+<ns:Eigentumsform>AlleinEigentum</ns:Eigentumsform>
+</ns:InhaltEigentumAnteil>
+<ns:Berechtigte>P0</ns:Berechtigte>
+</ns:EigentumAnteil></ns:Recht>
+</ns:GetParcelsByIdResponse>
+</soapenv:Body>
+</soapenv:Envelope>
+""".replace('{nummer}', NUMMER)
+
+
+@pytest.fixture
+def plot_owner():
+    logger = logging.getLogger('test')
+    return PlotOwner(None, None, UpstreamClient(), logger)
+
+
+@pytest.fixture
+def config():
+    return PlotOwnerConfig({}, 'test', TenantRegistry(), UpstreamClient())
+
+
+def parse(plot_owner, config, xml):
+    return plot_owner.parse_response(
+        config, io.BytesIO(xml.encode('utf-8')), [EGRID]
+    )
+
+
+@pytest.mark.parametrize('leading', [
+    '',
+    '<ns:transactionId>1234</ns:transactionId>',
+    '<ns:Status><ns:Code>OK</ns:Code></ns:Status>'
+])
+def test_parse_response_collects_all_records(plot_owner, config, leading):
+    grundstuecke, personen, rechte = parse(
+        plot_owner, config, RESPONSE_XML % leading
+    )
+
+    assert list(grundstuecke.keys()) == [NUMMER]
+    assert list(personen.keys()) == ['P0']
+    assert len(rechte[EGRID]) == 1
+
+
+def test_parse_response_without_response_element(plot_owner, config):
+    xml = RESPONSE_XML.replace('GetParcelsByIdResponse', 'OtherResponse')
+
+    with pytest.raises(Exception, match="GetParcelsByIdResponse not found"):
+        parse(plot_owner, config, xml % '')
+
+
+@pytest.mark.parametrize('secrets', [
+    {},
+    {'recaptcha_secret_key': ''},
+    {'recaptcha_secret_key': '', 'recaptcha_ticket_secret': ''}
+])
+def test_captcha_tickets_require_secret(secrets):
+    config = dict(
+        secrets, recaptcha_site_key='site', recaptcha_ticket_ttl=60
+    )
+
+    with pytest.raises(Exception, match="Captcha tickets require"):
+        PlotOwnerConfig(config, 'test', TenantRegistry(), UpstreamClient())
+
+
+def test_captcha_ticket_bound_to_peer_address(plot_owner):
+    app = Flask(__name__)
+    tickets = CaptchaTickets('secret', 60, 10)
+    headers = {'User-Agent': 'test'}
+
+    with app.test_request_context(
+        headers=headers, environ_base={'REMOTE_ADDR': '10.0.0.1'}
+    ):
+        ticket = tickets.issue(plot_owner.captcha_client(), 0.9)
+
+    # spoofed X-Forwarded-For header from another address
+    with app.test_request_context(
+        headers=dict(headers, **{'X-Forwarded-For': '10.0.0.1'}),
+        environ_base={'REMOTE_ADDR': '10.0.0.2'}
+    ):
+        assert not tickets.use(ticket, plot_owner.captcha_client())
+
+    with app.test_request_context(
+        headers=headers, environ_base={'REMOTE_ADDR': '10.0.0.1'}
+    ):
+        assert tickets.use(ticket, plot_owner.captcha_client())
@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from spatial_index import PackedRTree
+
+
+def random_boxes(rnd, count):
+    boxes = []
+    for i in range(count):
+        x = rnd.uniform(0, 1000)
+        y = rnd.uniform(0, 1000)
+        boxes.append((x, y, x + rnd.uniform(0, 50), y + rnd.uniform(0, 50)))
+    return boxes
+
+
+def brute_force(boxes, xmin, ymin, xmax, ymax):
+    return sorted(
+        i for i, b in enumerate(boxes)
+        if not (b[0] > xmax or b[1] > ymax or b[2] < xmin or b[3] < ymin)
+    )
+
+
+@pytest.mark.parametrize('count, node_size', [
+    (1, 16), (15, 4), (16, 16), (17, 16), (1000, 16), (2500, 8)
+])
+def test_search_matches_brute_force(count, node_size):
+    rnd = random.Random(count)
+    boxes = random_boxes(rnd, count)
+    tree = PackedRTree(boxes, node_size)
+
+    for i in range(200):
+        x = rnd.uniform(-50, 1050)
+        y = rnd.uniform(-50, 1050)
+        bbox = (x, y, x + rnd.uniform(0, 100), y + rnd.uniform(0, 100))
+        assert sorted(tree.search(*bbox)) == brute_force(boxes, *bbox)
+
+
+def test_search_point_on_box_edges():
+    boxes = [(0, 0, 10, 10), (10, 0, 20, 10)]
+    tree = PackedRTree(boxes)
+
+    assert sorted(tree.search(10, 5, 10, 5)) == [0, 1]
+    assert tree.search(20.5, 5, 20.5, 5) == []
+
+
+def test_search_empty_tree():
+    assert PackedRTree([]).search(0, 0, 10, 10) == []
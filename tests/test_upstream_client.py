@@ -0,0 +1,167 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+import pytest
+
+from upstream_client import (
+    CircuitBreaker, UpstreamClient, UpstreamSession,
+    UPSTREAM_HEDGE_MAX_WORKERS
+)
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.cookies.append(self.headers.get('Cookie'))
+        self.send_response(200)
+        self.send_header('Set-Cookie', 'session=secret; Path=/')
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.cookies = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_pooled_session_does_not_keep_cookies(server):
+    session = UpstreamClient().pooled_session(1)
+    url = 'http://127.0.0.1:%d/' % server.server_address[1]
+
+    for i in range(2):
+        response = session.get(url, timeout=5)
+        assert response.cookies.get('session') == 'secret'
+
+    assert server.cookies == [None, None]
+    assert len(session.cookies) == 0
+
+
+def test_breaker_opens_and_half_opens(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('upstream_client.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker()
+
+    for i in range(3):
+        assert breaker.allow(3, 30)
+        breaker.record(False, 0.1, 3)
+    assert not breaker.allow(3, 30)
+    assert breaker.stats()['breaker'] == 'open'
+
+    # single trial request after reset timeout
+    now[0] += 30
+    assert breaker.allow(3, 30)
+    assert not breaker.allow(3, 30)
+
+    # failed trial restarts reset timeout
+    breaker.record(False, 0.1, 3)
+    assert not breaker.allow(3, 30)
+    now[0] += 30
+    assert breaker.allow(3, 30)
+
+    # successful trial closes breaker
+    breaker.record(True, 0.1, 3)
+    assert breaker.allow(3, 30)
+    assert breaker.allow(3, 30)
+    assert breaker.stats()['breaker'] == 'closed'
+    assert breaker.stats()['rejected'] == 3
+
+
+def test_breaker_disabled():
+    breaker = CircuitBreaker()
+    for i in range(10):
+        breaker.record(False, 0.1, 0)
+    assert breaker.allow(0, 30)
+
+
+URL = 'http://upstream.test/doc'
+
+
+class FakeResponse:
+    def __init__(self, name):
+        self.name = name
+        self.status_code = 200
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+
+class FakeSession:
+    """Session whose first request is slow."""
+
+    def __init__(self, slow=0.5):
+        self.slow = slow
+        self.responses = []
+        self.lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        with self.lock:
+            response = FakeResponse(
+                'slow' if not self.responses else 'fast'
+            )
+            self.responses.append(response)
+        if response.name == 'slow':
+            time.sleep(self.slow)
+        return response
+
+
+def hedged_session(client, session):
+    upstream = UpstreamSession(client, session, 5, 30, True)
+    breaker = client.breaker(URL)
+    for i in range(CircuitBreaker.MIN_LATENCY_SAMPLES):
+        breaker.record(True, 0.01, 5, 'key')
+    return upstream, breaker
+
+
+def test_hedged_request_closes_slower_response():
+    client = UpstreamClient()
+    session = FakeSession()
+    upstream, breaker = hedged_session(client, session)
+
+    response = upstream.get(URL, latency_key='key')
+
+    assert response.name == 'fast'
+    slow = session.responses[0]
+    assert slow.closed.wait(5)
+    assert not response.closed.is_set()
+    assert breaker.stats()['hedged'] == 1
+
+
+def test_no_hedge_if_workers_saturated():
+    client = UpstreamClient()
+    session = FakeSession(slow=0.2)
+    upstream, breaker = hedged_session(client, session)
+
+    # leave a single worker slot for the first request
+    for i in range(UPSTREAM_HEDGE_MAX_WORKERS - 1):
+        client.worker_slots.acquire()
+    try:
+        response = upstream.get(URL, latency_key='key')
+    finally:
+        for i in range(UPSTREAM_HEDGE_MAX_WORKERS - 1):
+            client.worker_slots.release()
+
+    assert response.name == 'slow'
+    assert len(session.responses) == 1
+    assert breaker.stats()['hedged'] == 0
+
+
+def test_no_hedge_without_latency_key():
+    client = UpstreamClient()
+    session = FakeSession(slow=0.1)
+    upstream, breaker = hedged_session(client, session)
+
+    response = upstream.get(URL)
+
+    assert response.name == 'slow'
+    assert len(session.responses) == 1